@@ -97,9 +97,14 @@ def main():
 
     log.info("Creating runners")
 
+    dn_app = datanode.create_app(loop)
+    sn_app = servicenode.create_app(loop)
+    # chunk reads and writes from the SN call the DN directly
+    sn_app["local_dn"] = dn_app
+
     head_runner = web.AppRunner(headnode.create_app(loop))
-    dn_runner = web.AppRunner(datanode.create_app(loop))
-    sn_runner = web.AppRunner(servicenode.create_app(loop))
+    dn_runner = web.AppRunner(dn_app)
+    sn_runner = web.AppRunner(sn_app)
 
     log.info('Runners created')
 
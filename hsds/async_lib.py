@@ -125,13 +125,17 @@ def scanRootCallback(app, s3keys):
             log.info(f"not s3obj key, ignoring: {s3key}")
             continue
         objid = getObjId(s3key)
+        # the binary chunk table of a dataset maps to the dataset id, but the
+        # domain checksum uses the etag of the dataset json
+        is_chunk_table = s3key.endswith(".chunks.bin")
         etag = None
         obj_size = None
         lastModified = None
         item = s3keys[s3key]
         if "ETag" in item:
             etag = item["ETag"]
-            checksums[objid] = etag
+            if not is_chunk_table:
+                checksums[objid] = etag
         if "Size" in item:
             obj_size = item["Size"]
         if "LastModified" in item:
@@ -13,17 +13,19 @@
 # attribute methods for SN
 #
 
+import json
 import numpy as np
 from aiohttp.web_exceptions import HTTPBadRequest, HTTPInternalServerError
 from aiohttp.web import StreamResponse
 
-from .util.httpUtil import  http_get, http_put, http_delete, getHref, getAcceptType, jsonResponse
+from .util.httpUtil import  http_get, http_put, http_delete, getHref, getAcceptType, jsonResponse, writeResponseBody
+from .util.httpUtil import scanJsonBody
 from .util.idUtil import   isValidUuid, getDataNodeUrl
 from .util.authUtil import getUserPasswordFromRequest, validateUserPassword
 from .util.domainUtil import  getDomainFromRequest, isValidDomain, getBucketForDomain
 from .util.attrUtil import  validateAttributeName, getRequestCollectionName
 from .util.hdf5dtype import validateTypeItem, getBaseTypeJson, createDataType, getItemSize
-from .util.arrayUtil import jsonToArray, getShapeDims, getNumElements, bytesArrayToList
+from .util.arrayUtil import jsonToArray, jsonTextToArray, getShapeDims, getNumElements, bytesArrayToList
 from .servicenode_lib import getDomainJson, getObjectJson, validateAction
 from . import hsds_logger as log
 from . import config
@@ -474,7 +476,13 @@ async def GET_AttributeValue(request):
     params = {}
     if bucket:
         params["bucket"] = bucket
-    dn_json = await http_get(app, req, params=params)
+    dn_rsp = await http_get(app, req, params=params, format="binary")
+    # keep the value as JSON text so it isn't decoded and encoded again
+    try:
+        dn_json, raw_json = scanJsonBody(dn_rsp.decode('utf8'), raw_keys=("value",))
+    except ValueError:
+        log.error(f"Unexpected attribute json from dn for obj_id: {obj_id}")
+        raise HTTPInternalServerError()
     log.debug("got attributes json from dn for obj_id: " + str(dn_json))
 
     attr_shape = dn_json["shape"]
@@ -499,7 +507,13 @@ async def GET_AttributeValue(request):
         arr_dtype = createDataType(type_json)  # np datatype
         np_shape = getShapeDims(shape_json)
         try:
-            arr = jsonToArray(np_shape, arr_dtype, dn_json["value"])
+            arr = None
+            if "value" in raw_json:
+                arr = jsonTextToArray(raw_json["value"], np_shape, arr_dtype)
+                if arr is None:
+                    dn_json["value"] = json.loads(raw_json["value"])
+            if arr is None:
+                arr = jsonToArray(np_shape, arr_dtype, dn_json["value"])
         except ValueError:
             msg = "Bad Request: input data doesn't match selection"
             log.warn(msg)
@@ -511,14 +525,12 @@ async def GET_AttributeValue(request):
         try:
             resp = StreamResponse()
             resp.content_type = "application/octet-stream"
-            resp.content_length = len(output_data)
             # allow CORS
             if cors_domain:
                 resp.headers['Access-Control-Allow-Origin'] = cors_domain
                 resp.headers['Access-Control-Allow-Methods'] = "GET, POST, DELETE, PUT, OPTIONS"
                 resp.headers['Access-Control-Allow-Headers'] = "Content-Type, api_key, Authorization"
-            await resp.prepare(request)
-            await resp.write(output_data)
+            await writeResponseBody(request, resp, output_data)
         except Exception as e:
             log.error(f"Got exception: {e}")
             raise HTTPInternalServerError()
@@ -537,7 +549,7 @@ async def GET_AttributeValue(request):
         hrefs.append({'rel': 'home', 'href': getHref(request, '/')})
         hrefs.append({'rel': 'owner', 'href': getHref(request, obj_uri)})
         resp_json["hrefs"] = hrefs
-        resp = await jsonResponse(request, resp_json)
+        resp = await jsonResponse(request, resp_json, encoded=raw_json)
         log.response(request, resp=resp)
     return resp
 
@@ -15,6 +15,10 @@
 import asyncio
 import sys
 import os
+import signal
+import socket
+import multiprocessing
+from multiprocessing.connection import wait as wait_for_processes
 from asyncio import TimeoutError
 import time
 import random
@@ -81,6 +85,9 @@ async def register(app):
     else:
         outside_port = app["node_port"]
         body = {"id": app["id"], "port": outside_port, "node_type": app["node_type"]}
+        if app["node_socket"]:
+            # nodes on the same host can use this instead of tcp
+            body["socket"] = app["node_socket"]
     app['register_time'] = int(time.time())
     try:
         log.debug(f"register req: {req_reg} body: {body}")
@@ -89,6 +96,7 @@ async def register(app):
             log.debug(f"register response: {rsp_json}")
             app["node_number"] = rsp_json["node_number"]
             app["node_count"] = rsp_json["node_count"]
+            app["membership_epoch"] = -1  # get the node list on the next health check
             log.info("setting node_state to WAITING")
             app["node_state"] = "WAITING"  # wait for other nodes to be active
     except HTTPInternalServerError:
@@ -374,8 +382,12 @@ async def k8s_register(app):
                                 log.info("setting node_state to waiting while cache is flushing")
                                 app["node_state"] = "WAITING"
                         else:
-                            meta_cache.clearCache()
-                            chunk_cache.clearCache()
+                            if "on_renumber" in app:
+                                # let the DN hand off the cache entries it no longer owns
+                                new_dn_urls = {}
+                                for number in range(node_count):
+                                    new_dn_urls[number] = f"http://{pod_ips[number]}:{dn_port}"
+                                app["on_renumber"](app, new_dn_urls, node_number)
                             log.info(f"node number was: {old_number} setting to: {node_number}")
                             app["node_number"] = node_number
                             app['register_time'] = time.time()
@@ -422,6 +434,7 @@ async def healthCheck(app):
 
     while True:
         log.info("node_state: {}".format(app["node_state"]))
+        long_poll = False
         if "oio_proxy" in app:
             # for OIO post registration request every time interval
             await oio_register(app)
@@ -435,64 +448,79 @@ async def healthCheck(app):
             head_url = getHeadUrl(app)
             req_node = f"{head_url}/nodestate"
             log.debug(f"health check req {req_node}")
+            # only get the node list if the membership epoch has changed, waiting
+            # up to sleep_secs for a change
+            params = {"epoch": app["membership_epoch"], "wait": sleep_secs}
             try:
-                rsp_json = await http_get(app, req_node)
+                rsp_json = await http_get(app, req_node, params=params)
                 if rsp_json is None or not isinstance(rsp_json, dict):
                     log.warn(f"invalid health check response: type: {type(rsp_json)} text: {rsp_json}")
                 else:
+                    long_poll = "epoch" in rsp_json  # head node waited for a change
                     cluster_state = rsp_json["cluster_state"]
                     log.debug(f"cluster_state: {cluster_state}")
                     if cluster_state != "READY" and app["node_state"] == "READY":
                         log.info("changing node_state to WAITING")
                         app["node_state"] = "WAITING"
 
-                    # save the url's to each of the active nodes'
-                    sn_urls = {}
-                    dn_urls = {}
-                    #  or rsp_json["host"] is None or rsp_json["id"] != app["id"]
-                    this_node = None
-                    for node in rsp_json["nodes"]:
-                        if node["node_type"] == app["node_type"] and node["node_number"] == app["node_number"]:
-                            # this should be this node
-
-                            if node["id"] != app["id"]:
-                                # flag - to re-register
-                                log.warn("mis-match node ids, app: {} vs head: {} - re-initializing".format(node["id"], app["id"]))
-                                app["node_state"] = "INITIALIZING"
-                                app["node_number"] = -1
-                                break
+                    if "nodes" not in rsp_json:
+                        # membership hasn't changed since our last check
+                        log.debug(f"membership epoch {app['membership_epoch']} unchanged")
+                    else:
+                        app["membership_epoch"] = rsp_json.get("epoch", -1)
+                        # save the url's to each of the active nodes'
+                        sn_urls = {}
+                        dn_urls = {}
+                        node_sockets = {}
+                        #  or rsp_json["host"] is None or rsp_json["id"] != app["id"]
+                        this_node = None
+                        for node in rsp_json["nodes"]:
+                            if node["node_type"] == app["node_type"] and node["node_number"] == app["node_number"]:
+                                # this should be this node
+
+                                if node["id"] != app["id"]:
+                                    # flag - to re-register
+                                    log.warn("mis-match node ids, app: {} vs head: {} - re-initializing".format(node["id"], app["id"]))
+                                    app["node_state"] = "INITIALIZING"
+                                    app["node_number"] = -1
+                                    break
+                                if not node["host"]:
+                                    # flag - to re-register
+                                    log.warn(f"host not set for this node  - re-initializing for node {id['id']}")
+
+                                    app["node_state"] = "INITIALIZING"
+                                    app["node_number"] = -1
+                                    break
                             if not node["host"]:
-                                # flag - to re-register
-                                log.warn(f"host not set for this node  - re-initializing for node {id['id']}")
-
-                                app["node_state"] = "INITIALIZING"
-                                app["node_number"] = -1
-                                break
-                        if not node["host"]:
-                            continue  # not online
-                        this_node = copy(node)
-                        url = "http://" + node["host"] + ":" + str(node["port"])
-                        node_number = node["node_number"]
+                                continue  # not online
+                            this_node = copy(node)
+                            url = "http://" + node["host"] + ":" + str(node["port"])
+                            node_number = node["node_number"]
+                            if isLocalSocket(app, node.get("socket")):
+                                node_sockets[url] = node["socket"]
+                            if node["node_type"] == "dn":
+                                dn_urls[node_number] = url
+                            elif node["node_type"] == "sn":
+                                sn_urls[node_number] = url
+                            else:
+                                log.error(f"Unexpected node_type for node: {node}")
                         if node["node_type"] == "dn":
-                            dn_urls[node_number] = url
+                            app["node_count"] = len(dn_urls)
                         elif node["node_type"] == "sn":
-                            sn_urls[node_number] = url
-                        else:
-                            log.error(f"Unexpected node_type for node: {node}")
-                    if node["node_type"] == "dn":
-                        app["node_count"] = len(dn_urls)
-                    elif node["node_type"] == "sn":
-                        app["node_count"] = len(sn_urls)
-
-                    app["sn_urls"] = sn_urls
-                    log.debug(f"sn_urls: {sn_urls}")
-                    app["dn_urls"] = dn_urls
-                    log.debug(f"dn_urls: {dn_urls}")
-
-                    if this_node is None and cluster_state != "READY":
-                        log.warn("this node not found, re-initialize")
-                        app["node_state"] = "INITIALIZING"
-                        app["node_number"] = -1
+                            app["node_count"] = len(sn_urls)
+
+                        app["sn_urls"] = sn_urls
+                        log.debug(f"sn_urls: {sn_urls}")
+                        app["dn_urls"] = dn_urls
+                        log.debug(f"dn_urls: {dn_urls}")
+                        app["node_sockets"] = node_sockets
+                        log.debug(f"node_sockets: {node_sockets}")
+                        await closeSocketClients(app)
+
+                        if this_node is None and cluster_state != "READY":
+                            log.warn("this node not found, re-initialize")
+                            app["node_state"] = "INITIALIZING"
+                            app["node_number"] = -1
 
                     if app["node_state"] == "WAITING" and cluster_state == "READY" and app["node_number"] >= 0:
                         log.info("setting node_state to READY, node_number: {}".format(app["node_number"]))
@@ -520,7 +548,8 @@ async def healthCheck(app):
         num_tasks = len(asyncio.Task.all_tasks())
         active_tasks = len([task for task in asyncio.Task.all_tasks() if not task.done()])
         log.debug(f"health check sleep: {sleep_secs}, vm: {svmem.percent} num tasks: {num_tasks} active tasks: {active_tasks}")
-        await asyncio.sleep(sleep_secs)
+        if not long_poll:
+            await asyncio.sleep(sleep_secs)
 
 async def preStop(request):
     """ HTTP Method used by K8s to signal the container is shutting down """
@@ -630,7 +659,7 @@ async def info(request):
     answer["meta_cache_stats"] = mc_stats
     cc_stats = {}
     if "chunk_cache" in app:
-        cc = app["chunk_cache"]  # only DN nodes have this
+        cc = app["chunk_cache"]  # SN nodes use this for read-only domains
         cc_stats["count"] = len(cc)
         cc_stats["dirty_count"] = cc.dirtyCount
         cc_stats["utililization_per"] = cc.cacheUtilizationPercent
@@ -646,12 +675,116 @@ async def info(request):
         dc_stats["mem_used"] = dc.memUsed
         dc_stats["mem_target"] = dc.memTarget
     answer["domain_cache_stats"] = dc_stats
+    if "chunk_executor" in app:
+        answer["chunk_executor_stats"] = app["chunk_executor"].stats  # only SN nodes have this
+    if "value_cache" in app:
+        answer["value_cache_stats"] = app["value_cache"].stats  # only SN nodes have this
+    if "chunk_table_cache" in app:
+        answer["chunk_table_cache_stats"] = app["chunk_table_cache"].stats  # only SN nodes have this
+    if "hot_chunk_tracker" in app:
+        answer["hot_chunk_stats"] = app["hot_chunk_tracker"].stats  # only SN nodes have this
 
     resp = await jsonResponse(request, answer)
     log.response(request, resp=resp)
     return resp
 
 
+def getNodeSocketPath(node_id):
+    """ Return the path of the Unix domain socket the node listens on
+    (in addition to its port) or None if node_socket_dir isn't set """
+    socket_dir = config.get("node_socket_dir")
+    if not socket_dir:
+        return None
+    return os.path.join(socket_dir, f"{node_id}.sock")
+
+def isLocalSocket(app, socket_path):
+    """ Return True if another node's socket can be used from here, i.e. the
+    node is on this host and shares the node_socket_dir """
+    if not socket_path or not app["node_socket"]:
+        return False
+    if socket_path == app["node_socket"]:
+        return False  # this node
+    if os.path.dirname(socket_path) != os.path.dirname(app["node_socket"]):
+        return False
+    return os.path.exists(socket_path)
+
+async def closeSocketClients(app):
+    """ Close the http clients for sockets of nodes no longer in node_sockets """
+    socket_clients = app["socket_clients"]
+    socket_paths = set(app["node_sockets"].values())
+    for socket_path in list(socket_clients.keys()):
+        if socket_path not in socket_paths:
+            log.info(f"closing client for {socket_path}")
+            client = socket_clients.pop(socket_path)
+            await client.close()
+
+async def removeNodeSocket(app):
+    """ on_cleanup handler to remove this node's socket file """
+    socket_path = app["node_socket"]
+    if socket_path and os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+def getWorkerCount(node_type):
+    """ Return the number of worker processes to run for the node type.
+    Each worker registers with the head node as a separate node.
+    """
+    workers = int(config.get(node_type + "_workers"))
+    if workers > 1 and ("KUBERNETES_SERVICE_HOST" in os.environ or "MARATHON_APP_ID" in os.environ):
+        log.warn(f"{node_type}_workers not supported for kubernetes or DCOS, using one worker")
+        workers = 1
+    return max(workers, 1)
+
+def createListenSocket(port, reuse_port=False):
+    """ Return a socket listening on the given port.  With reuse_port, each
+    worker process binds its own socket to the port and the kernel spreads
+    connections over them.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.listen(128)
+    sock.setblocking(False)
+    return sock
+
+def runWorkers(node_type, run_worker):
+    """ Call run_worker(worker_index) in each of the worker processes for the
+    node type, or in this process if there is only one.  Exits when any worker
+    does, so the container gets restarted as it would for a single process.
+    """
+    workers = getWorkerCount(node_type)
+    if workers == 1:
+        run_worker(0)
+        return
+    log.info(f"starting {workers} {node_type} workers")
+    ctx = multiprocessing.get_context("fork")
+    processes = []
+    for worker in range(workers):
+        process = ctx.Process(target=run_worker, args=(worker,), name=f"{node_type}_worker_{worker}")
+        process.start()
+        processes.append(process)
+
+    def stop_workers(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    # pass on stop requests to the workers
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    wait_for_processes([process.sentinel for process in processes])
+    exitcode = 0
+    for process in processes:
+        if process.exitcode not in (None, 0, -signal.SIGTERM):
+            log.warn(f"{process.name} exited with code: {process.exitcode}")
+            exitcode = 1
+    stop_workers(None, None)
+    for process in processes:
+        process.join()
+    sys.exit(exitcode)
+
 def baseInit(loop, node_type):
     """Intitialize application and return app object"""
 
@@ -666,8 +799,15 @@ def baseInit(loop, node_type):
     node_port = config.get(node_type + "_port")
     app["node_port"] = config.get(node_type + "_port")
     log.info(f"baseInit - node_id: {node_id} node_port: {node_port}")
+    app["node_socket"] = getNodeSocketPath(node_id)
+    if app["node_socket"]:
+        log.info(f"baseInit - node_socket: {app['node_socket']}")
+        app.on_cleanup.append(removeNodeSocket)
+    app["node_sockets"] = {}  # map of node urls to sockets of nodes on this host
+    app["socket_clients"] = {}  # map of socket paths to http clients
     app["node_number"] = -1
     app["node_count"] = -1
+    app["membership_epoch"] = -1  # head node membership epoch of dn_urls and sn_urls
     app["start_time"] = int(time.time())  # seconds after epoch
     app['register_time'] = 0
     bucket_name = config.get("bucket_name")
@@ -684,6 +824,7 @@ def baseInit(loop, node_type):
     counter["POST"] = 0
     counter["DELETE"] = 0
     counter["num_tasks"] = 0
+    counter["dn_busy"] = 0  # requests turned away by the SN for overloaded DNs
     app["req_count"] = counter
     counter = {}
     counter["DEBUG"] = 0
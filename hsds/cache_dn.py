@@ -0,0 +1,84 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# cache_dn.py
+#
+# handoff of cache entries between data nodes
+#
+import io
+import numpy as np
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPConflict, HTTPServiceUnavailable
+from aiohttp.web import json_response
+
+from .util.httpUtil import request_read
+from .util.idUtil import isObjId, isValidChunkId, getObjPartition
+from . import hsds_logger as log
+
+
+async def PUT_CacheItem(request):
+    """HTTP PUT method to add a clean cache entry sent by a data node that
+    no longer owns it (see handoff_cache).  Entries already in the cache are
+    left as is, since they may be newer.
+    """
+    log.request(request)
+    app = request.app
+    params = request.rel_url.query
+    obj_id = params.get("id")
+    if not obj_id or not isObjId(obj_id):
+        msg = f"Invalid id for cache handoff: {obj_id}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if not request.has_body:
+        msg = "PUT_CacheItem with no body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if app["node_state"] in ("INITIALIZING", "TERMINATING"):
+        log.info(f"PUT_CacheItem - node_state is {app['node_state']}, not accepting {obj_id}")
+        raise HTTPServiceUnavailable()
+    # the sender's view of membership may be ahead of ours
+    try:
+        node_count = int(params.get("node_count", len(app["dn_urls"])))
+        node_number = int(params.get("node_number", app["node_number"]))
+    except ValueError:
+        msg = "Invalid node_count or node_number for cache handoff"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if node_count < 1 or getObjPartition(obj_id, node_count) != node_number:
+        log.info(f"PUT_CacheItem - {obj_id} not in partition {node_number} of {node_count}")
+        raise HTTPConflict()
+
+    if isValidChunkId(obj_id):
+        cache = app["chunk_cache"]
+        data = await request_read(request)
+        try:
+            value = np.load(io.BytesIO(data), allow_pickle=False)
+        except ValueError as ve:
+            msg = f"Unable to read handoff data for {obj_id}: {ve}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+    else:
+        cache = app["meta_cache"]
+        value = await request.json()
+        if not isinstance(value, dict):
+            msg = f"Expected dict for handoff of {obj_id}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+
+    if obj_id in cache or obj_id in app["deleted_ids"]:
+        log.debug(f"PUT_CacheItem - ignoring {obj_id}")
+    else:
+        log.debug(f"PUT_CacheItem - adding {obj_id}")
+        cache[obj_id] = value
+
+    resp = json_response({}, status=201)
+    log.response(request, resp=resp)
+    return resp
@@ -14,21 +14,27 @@
 # handles regauests to read/write chunk data
 #
 #
+import asyncio
+import json
+import time
 import numpy as np
 from aiohttp.web_exceptions import HTTPBadRequest, HTTPInternalServerError, HTTPNotFound
 from aiohttp.web import json_response, StreamResponse
 
-from .util.httpUtil import  request_read
+from .util.httpUtil import  request_read, getWireResponseBody, isEncodedRequest
 from .util.arrayUtil import bytesToArray, arrayToBytes
 from .util.idUtil import getS3Key, validateInPartition, isValidUuid
 from .util.storUtil import  isStorObj, deleteStorObj
 from .util.hdf5dtype import createDataType
-from .util.dsetUtil import  getSliceQueryParam, getChunkLayout, getSelectionShape
-from .util.chunkUtil import getChunkIndex, getDatasetId, chunkQuery
+from .util.dsetUtil import  getSliceQueryParam, getChunkLayout, getSelectionShape, getFillValue
+from .util.dsetUtil import CHUNK_FILTERS_HEADER
+from .util.chunkUtil import getChunkIndex, getDatasetId, getChunkIdForIndex, getChunkIdForPartition, chunkQuery
 from .util.chunkUtil import chunkWriteSelection, chunkReadSelection
 from .util.chunkUtil import chunkWritePoints, chunkReadPoints
-from .datanode_lib import get_metadata_obj, get_chunk, save_chunk
+from .datanode_lib import get_metadata_obj, get_chunk, get_chunk_range, save_chunk, get_replica_chunk, add_replica, invalidate_replicas
+from .datanode_lib import get_chunk_bytes, put_chunk_bytes
 
+from . import config
 from . import hsds_logger as log
 
 """
@@ -69,6 +75,15 @@ async def PUT_Chunk(request):
     else:
         bucket = None
 
+    if "raw" in params:
+        # store pre-filtered bytes for the whole chunk (checked by the SN)
+        validateInPartition(app, chunk_id)
+        chunk_bytes = await request_read(request)
+        await put_chunk_bytes(app, chunk_id, chunk_bytes, bucket=bucket)
+        resp = json_response({}, status=201)
+        log.response(request, resp=resp)
+        return resp
+
     if query:
         expected_content_type = "text/plain; charset=utf-8"
         chunk_init = False  # don't initalize new chunks on query update
@@ -164,17 +179,23 @@ async def PUT_Chunk(request):
             log.debug(f"expect content_length: {num_elements*itemsize}")
         log.debug(f"actual content_length: {request.content_length}")
 
-        if itemsize != 'H5T_VARIABLE' and (num_elements * itemsize) != request.content_length:
+        # compressed bodies can only be checked once read
+        encoded = isEncodedRequest(request)
+        if not encoded and itemsize != 'H5T_VARIABLE' and (num_elements * itemsize) != request.content_length:
             msg = f"Expected content_length of: {num_elements*itemsize}, but got: {request.content_length}"
             log.error(msg)
             raise HTTPBadRequest(reason=msg)
 
         # create a numpy array for incoming data
         input_bytes = await request_read(request)  # TBD - will it cause problems when failures are raised before reading data?
-        if len(input_bytes) != request.content_length:
+        if not encoded and len(input_bytes) != request.content_length:
             msg = f"Read {len(input_bytes)} bytes, expecting: {request.content_length}"
             log.error(msg)
             raise HTTPInternalServerError()
+        if encoded and itemsize != 'H5T_VARIABLE' and (num_elements * itemsize) != len(input_bytes):
+            msg = f"Expected {num_elements*itemsize} bytes, but got: {len(input_bytes)} after decompressing"
+            log.error(msg)
+            raise HTTPBadRequest(reason=msg)
 
         input_arr = bytesToArray(input_bytes, dt, mshape)
 
@@ -184,6 +205,7 @@ async def PUT_Chunk(request):
         resp = {}
     if is_dirty:
         save_chunk(app, chunk_id, bucket=bucket)
+        await invalidate_replicas(app, chunk_id)
         status_code = 201
     else:
         status_code = 200
@@ -211,7 +233,9 @@ async def GET_Chunk(request):
         log.warn(msg)
         raise HTTPBadRequest(reason=msg)
 
-    validateInPartition(app, chunk_id)
+    replica = "replica" in params  # read of a hot chunk owned by another DN
+    if not replica:
+        validateInPartition(app, chunk_id)
     log.debug(f"request params: {params.keys()}")
 
     bucket = None
@@ -252,6 +276,25 @@ async def GET_Chunk(request):
 
     log.debug(f"dset_json: {dset_json}")
 
+    if "raw" in params:
+        # return the chunk as stored
+        if s3path or query or replica:
+            msg = "raw chunk reads are only supported for chunks stored by the DN"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        chunk_bytes, filters = await get_chunk_bytes(app, chunk_id, dset_json, bucket=bucket)
+        if chunk_bytes is None:
+            log.warn(f"chunk {chunk_id} not found")
+            raise HTTPNotFound()
+        resp = StreamResponse()
+        resp.headers['Content-Type'] = "application/octet-stream"
+        resp.headers[CHUNK_FILTERS_HEADER] = json.dumps(filters)
+        resp.content_length = len(chunk_bytes)
+        await resp.prepare(request)
+        await resp.write(chunk_bytes)
+        await resp.write_eof()
+        return resp
+
     # get chunk selection from query params
     selection = []
     for i in range(rank):
@@ -260,7 +303,16 @@ async def GET_Chunk(request):
     selection = tuple(selection)
     log.debug(f"got selection: {selection}")
 
-    chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size, chunk_init=False)
+    select = None
+    if not query and "replica_url" not in params:
+        select = selection  # linked chunks may be read just for the selection
+    if replica:
+        chunk_arr = await get_replica_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size)
+    else:
+        chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size, chunk_init=False, select=select)
+    if chunk_arr is not None and "replica_url" in params:
+        # another DN is fetching this chunk to serve as a replica
+        add_replica(app, chunk_id, params["replica_url"])
     if chunk_arr is None:
         msg = f"chunk {chunk_id} not found"
         log.warn(msg)
@@ -288,6 +340,7 @@ async def GET_Chunk(request):
         try:
             resp = StreamResponse()
             resp.headers['Content-Type'] = "application/octet-stream"
+            read_resp = await getWireResponseBody(request, resp, read_resp)
             resp.content_length = len(read_resp)
             await resp.prepare(request)
             await resp.write(read_resp)
@@ -365,7 +418,13 @@ async def POST_Chunk(request):
         log.warn(msg)
         raise HTTPBadRequest(reason=msg)
 
-    validateInPartition(app, chunk_id)
+    replica = "replica" in params  # read of a hot chunk owned by another DN
+    if replica and put_points:
+        msg = "replica can not be used with put points POST request"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if not replica:
+        validateInPartition(app, chunk_id)
     log.debug(f"request params: {list(params.keys())}")
     if "dset" in params:
         msg = "Unexpected dset in POST request"
@@ -397,7 +456,7 @@ async def POST_Chunk(request):
 
     # create a numpy array for incoming points
     input_bytes = await request_read(request)
-    if len(input_bytes) != request.content_length:
+    if not isEncodedRequest(request) and len(input_bytes) != request.content_length:
         msg = f"Read {len(input_bytes)} bytes, expecting: {request.content_length}"
         log.error(msg)
         raise HTTPInternalServerError()
@@ -420,7 +479,13 @@ async def POST_Chunk(request):
 
     point_arr = bytesToArray(input_bytes, point_dt, point_shape)
 
-    chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size, chunk_init=chunk_init)
+    read_points = None
+    if not put_points:
+        read_points = point_arr  # linked chunks may be read just for the given points
+    if replica:
+        chunk_arr = await get_replica_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size)
+    else:
+        chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size, chunk_init=chunk_init, points=read_points)
     if chunk_arr is None:
         log.warn(f"chunk {chunk_id} not found")
         raise HTTPNotFound()
@@ -436,6 +501,7 @@ async def POST_Chunk(request):
         resp = json_response({})
 
         save_chunk(app, chunk_id, bucket=bucket) # lazily write chunk to storage
+        await invalidate_replicas(app, chunk_id)
     else:
         # read points
         try:
@@ -448,6 +514,7 @@ async def POST_Chunk(request):
         try:
             resp = StreamResponse()
             resp.headers['Content-Type'] = "application/octet-stream"
+            output_data = await getWireResponseBody(request, resp, output_data)
             resp.content_length = len(output_data)
             await resp.prepare(request)
             await resp.write(output_data)
@@ -459,6 +526,154 @@ async def POST_Chunk(request):
 
     return resp
 
+"""
+Return data for a point selection that spans multiple chunks held by this node
+"""
+async def POST_Chunks(request):
+    log.request(request)
+    app = request.app
+    params = request.rel_url.query
+
+    if "count" not in params:
+        log.warn("expected count param")
+        raise HTTPBadRequest()
+    num_points = int(params["count"])
+    if "dset_id" not in params:
+        log.warn("expected dset_id param")
+        raise HTTPBadRequest()
+    dset_id = params["dset_id"]
+    if not isValidUuid(dset_id, "Dataset"):
+        msg = f"Invalid dataset id: {dset_id}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if "bucket" in params:
+        bucket = params["bucket"]
+    else:
+        bucket = None
+    log.info(f"POST chunks for dset: {dset_id} - num_points: {num_points}")
+
+    if not request.has_body:
+        msg = "POST Chunks with no body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    dset_json = await get_metadata_obj(app, dset_id, bucket=bucket)
+    dims = getChunkLayout(dset_json)
+    rank = len(dims)
+
+    type_json = dset_json["type"]
+    dset_dtype = createDataType(type_json)
+
+    input_bytes = await request_read(request)
+    if not isEncodedRequest(request) and len(input_bytes) != request.content_length:
+        msg = f"Read {len(input_bytes)} bytes, expecting: {request.content_length}"
+        log.error(msg)
+        raise HTTPInternalServerError()
+    point_arr = bytesToArray(input_bytes, np.dtype('uint64'), (num_points, rank))
+
+    # group the points by chunk
+    chunk_keys, chunk_inverse = np.unique(point_arr // np.array(dims, dtype='uint64'), axis=0, return_inverse=True)
+    chunk_inverse = chunk_inverse.reshape(-1)
+    # indices of the points in each chunk, found with one sort rather than a
+    # scan of all the points per chunk
+    point_order = np.argsort(chunk_inverse, kind='stable')
+    chunk_counts = np.bincount(chunk_inverse, minlength=len(chunk_keys))
+    chunk_points = np.split(point_order, np.cumsum(chunk_counts)[:-1])
+    chunk_ids = []
+    for chunk_key in chunk_keys:
+        chunk_id = getChunkIdForPartition(getChunkIdForIndex(dset_id, chunk_key), dset_json)
+        validateInPartition(app, chunk_id)
+        chunk_ids.append(chunk_id)
+    log.debug(f"POST chunks - {len(chunk_ids)} chunks")
+
+    output_arr = np.zeros((num_points,), dtype=dset_dtype)
+    fill_value = getFillValue(dset_json)
+    if fill_value:
+        output_arr[...] = fill_value
+
+    # bound the number of chunks (and storage reads) in flight for the request
+    read_limit = asyncio.Semaphore(int(config.get("max_request_tasks")))
+
+    async def read_points(i):
+        chunk_id = chunk_ids[i]
+        async with read_limit:
+            chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, chunk_init=False)
+        if chunk_arr is None:
+            log.debug(f"chunk {chunk_id} not found, using fill value")
+            return
+        point_index = chunk_points[i]
+        try:
+            output_arr[point_index] = chunkReadPoints(chunk_id=chunk_id, chunk_layout=dims, chunk_arr=chunk_arr, point_arr=point_arr[point_index])
+        except ValueError as ve:
+            log.warn(f"got value error from chunkReadPoints: {ve}")
+            raise HTTPBadRequest()
+
+    await asyncio.gather(*[read_points(i) for i in range(len(chunk_ids))])
+
+    output_data = arrayToBytes(output_arr)
+    # write response
+    try:
+        resp = StreamResponse()
+        resp.headers['Content-Type'] = "application/octet-stream"
+        output_data = await getWireResponseBody(request, resp, output_data)
+        resp.content_length = len(output_data)
+        await resp.prepare(request)
+        await resp.write(output_data)
+    except Exception as e:
+        log.error(f"Exception during binary data write: {e}")
+        raise HTTPInternalServerError()
+    finally:
+        await resp.write_eof()
+
+    return resp
+
+"""
+Read a byte range holding several linked chunks into the chunk cache
+"""
+async def POST_ChunkRange(request):
+    log.request(request)
+    app = request.app
+    params = request.rel_url.query
+
+    if "dset_id" not in params:
+        log.warn("expected dset_id param")
+        raise HTTPBadRequest()
+    dset_id = params["dset_id"]
+    if not isValidUuid(dset_id, "Dataset"):
+        msg = f"Invalid dataset id: {dset_id}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if "bucket" in params:
+        bucket = params["bucket"]
+    else:
+        bucket = None
+
+    if not request.has_body:
+        msg = "POST ChunkRange with no body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    chunk_range = await request.json()
+    for key in ("s3path", "s3offset", "s3size", "chunks"):
+        if key not in chunk_range:
+            msg = f"expected {key} key in POST ChunkRange body"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+    for item in chunk_range["chunks"]:
+        chunk_id = item[0]
+        if not isValidUuid(chunk_id, "Chunk") or getDatasetId(chunk_id) != dset_id:
+            msg = f"Invalid chunk id: {chunk_id}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+        validateInPartition(app, chunk_id)
+    log.info(f"POST chunk range for dset: {dset_id} - {len(chunk_range['chunks'])} chunks")
+
+    dset_json = await get_metadata_obj(app, dset_id, bucket=bucket)
+    count = await get_chunk_range(app, dset_json, chunk_range)
+
+    resp = json_response({"count": count})
+    log.response(request, resp=resp)
+    return resp
+
 async def DELETE_Chunk(request):
     """HTTP DELETE method for /chunks/
     Note: clients (i.e. SN nodes) don't directly delete chunks.  This method should
@@ -491,6 +706,7 @@ async def DELETE_Chunk(request):
 
     if chunk_id in chunk_cache:
         del chunk_cache[chunk_id]
+    await invalidate_replicas(app, chunk_id)
 
     deflate_map = app["deflate_map"]
     shuffle_map = app["shuffle_map"]
@@ -513,3 +729,38 @@ async def DELETE_Chunk(request):
     resp = json_response(resp_json)
     log.response(request, resp=resp)
     return resp
+
+
+async def DELETE_ChunkReplica(request):
+    """HTTP DELETE method for /replicas/
+    Drop this node's replica of a hot chunk.  Called by the owning DN when
+    the chunk is modified.  The chunk itself is not deleted.
+    """
+    log.request(request)
+    app = request.app
+    chunk_id = request.match_info.get('id')
+    if not chunk_id or not isValidUuid(chunk_id, "Chunk"):
+        msg = f"Invalid chunk id: {chunk_id}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    now = time.time()
+    replica_invalidations = app["replica_invalidations"]
+    replica_invalidations[chunk_id] = now
+    if len(replica_invalidations) > 1000:
+        # only needed while a replica fetch may be in flight
+        for key in list(replica_invalidations.keys()):
+            if now - replica_invalidations[key] > 60:
+                del replica_invalidations[key]
+
+    replica_ids = app["replica_ids"]
+    if chunk_id in replica_ids:
+        del replica_ids[chunk_id]
+    chunk_cache = app["chunk_cache"]
+    if chunk_id in chunk_cache and not chunk_cache.isDirty(chunk_id):
+        log.debug(f"DELETE_ChunkReplica - removing {chunk_id}")
+        del chunk_cache[chunk_id]
+
+    resp = json_response({})
+    log.response(request, resp=resp)
+    return resp
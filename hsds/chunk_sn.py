@@ -13,28 +13,43 @@
 # value operations
 # handles dataset /value requests
 #
-import asyncio
+import functools
+import itertools
 import json
+import random
 import time
+import zlib
 from asyncio import CancelledError
 import base64
 import numpy as np
-from aiohttp.web_exceptions import HTTPBadRequest, HTTPNotFound, HTTPRequestEntityTooLarge, HTTPConflict, HTTPInternalServerError, HTTPServiceUnavailable
+from aiohttp.web_exceptions import HTTPException, HTTPBadRequest, HTTPNotFound, HTTPForbidden, HTTPRequestEntityTooLarge, HTTPConflict, HTTPInternalServerError, HTTPServiceUnavailable
 from aiohttp.client_exceptions import ClientError
 from aiohttp.web import StreamResponse
 
-from .util.httpUtil import  getHref, getAcceptType, get_http_client, http_put, request_read, jsonResponse
-from .util.idUtil import   isValidUuid, getDataNodeUrl
-from .util.domainUtil import  getDomainFromRequest, isValidDomain, getBucketForDomain
+from .util.httpUtil import  getHref, getAcceptType, get_http_client, getWireBody, writeResponseBody, http_put, http_put_binary, http_post, request_read, jsonResponse
+from .util.httpUtil import getJsonBody
+from .util.idUtil import   isValidUuid, getDataNodeUrl, getChunkTableKey, getObjPartition
+from .util.domainUtil import  getDomainFromRequest, isValidDomain, getBucketForDomain, isReadOnlyDomain
 from .util.hdf5dtype import getItemSize, createDataType
 from .util.dsetUtil import getSliceQueryParam, setSliceQueryParam, getFillValue, isExtensible
 from .util.dsetUtil import getSelectionShape, getDsetMaxDims, getChunkLayout, getDeflateLevel
-from .util.chunkUtil import getNumChunks, getChunkIds, getChunkId, getChunkIndex, getChunkSuffix
-from .util.chunkUtil import getChunkCoverage, getDataCoverage, getChunkIdForPartition
-from .util.arrayUtil import bytesArrayToList, jsonToArray, getShapeDims, getNumElements, arrayToBytes, bytesToArray
+from .util.dsetUtil import getFilters, getShuffleSize, CHUNK_FILTERS_HEADER, CHUNK_SHAPE_HEADER
+from .util.chunkUtil import getNumChunks, getChunkIds, iterChunkIds, getChunkId, getChunkIndex, getChunkSuffix
+from .util.chunkUtil import getChunkCoverage, getDataCoverage, getChunkIdForPartition, getChunkIdForIndex
+from .util.chunkUtil import getSelectionPoints, getStridedReadMode, getChunkRanges, getChunkTableRegion, chunkReadPoints
+from .util.chunkUtil import CHUNK_TABLE_DT, getChunkGrid, getChunkTableGrid, getChunkTableItems, getChunkTableDict
+from .util.arrayUtil import arrayToJson, jsonToArray, jsonTextToArray, getShapeDims, getNumElements, arrayToBytes, bytesToArray
 from .util.authUtil import getUserPasswordFromRequest, validateUserPassword
 from .util.awsLambdaClient import getLambdaClient, lambdaInvoke
+from .util.chunkExecutor import ChunkExecutor
+from .util.valueCache import ValueCache
+from .util.chunkTableCache import ChunkTableCache
+from .util.hotChunkTracker import HotChunkTracker
+from .util.storUtil import getStorBytes, isDeflated, splitS3Path
+from .util.loadUtil import updateDataNodeLoad, checkDataNodeLoad
 from .servicenode_lib import getObjectJson, validateAction
+from .datanode_lib import get_chunk, get_chunk_range
+from .datanode_lib import read_chunk_selection, write_chunk_selection
 from . import config
 from . import hsds_logger as log
 
@@ -91,12 +106,17 @@ async def write_chunk_hyperslab(app, chunk_id, dset_json, slices, deflate_level,
     log.debug(f"data_sel: {data_sel}")
     log.debug(f"arr.shape: {arr.shape}")
     arr_chunk = arr[data_sel]
+    dn_app = getLocalDataNode(app, chunk_id)
+    if dn_app is not None:
+        # DN is in this process, pass it the array rather than make a request
+        await write_chunk_selection(dn_app, chunk_id, tuple(chunk_sel), arr_chunk, bucket=bucket)
+        return
     req = getDataNodeUrl(app, chunk_id)
     req += "/chunks/" + chunk_id
 
     log.debug(f"PUT chunk req: {req}")
-    client = get_http_client(app)
-    data = arrayToBytes(arr_chunk)
+    client = get_http_client(app, url=req)
+    data, headers = await getWireBody(arrayToBytes(arr_chunk))
     # pass itemsize, type, dimensions, and selection as query params
     params = {}
     setSliceQueryParam(params, chunk_sel)
@@ -104,8 +124,9 @@ async def write_chunk_hyperslab(app, chunk_id, dset_json, slices, deflate_level,
         params["bucket"] = bucket
 
     try:
-        async with client.put(req, data=data, params=params) as rsp:
+        async with client.put(req, data=data, params=params, headers=headers) as rsp:
             log.debug(f"req: {req} status: {rsp.status}")
+            updateDataNodeLoad(app, req, rsp.headers)
             if rsp.status == 200:
                 log.debug(f"http_put({req}) <200> Ok")
             elif rsp.status == 201:
@@ -127,7 +148,145 @@ async def write_chunk_hyperslab(app, chunk_id, dset_json, slices, deflate_level,
 """
 Read data from given chunk_id.  Pass in type, dims, and selection area.
 """
-async def read_chunk_hyperslab(app, chunk_id, dset_json, slices, np_arr, chunk_map=None, bucket=None, serverless=False):
+def getChunkExecutor(app):
+    """ Return the executor that bounds the number of in-flight DN requests
+    """
+    if "chunk_executor" not in app:
+        max_node_tasks = int(config.get("max_node_tasks"))
+        max_request_tasks = int(config.get("max_request_tasks"))
+        log.info(f"creating ChunkExecutor - max_node_tasks: {max_node_tasks} max_request_tasks: {max_request_tasks}")
+        app["chunk_executor"] = ChunkExecutor(max_node_tasks=max_node_tasks, max_request_tasks=max_request_tasks)
+    return app["chunk_executor"]
+
+def getValueCache(app):
+    """ Return the cache used to coalesce identical GET value requests
+    """
+    if "value_cache" not in app:
+        ttl = float(config.get("value_cache_ttl"))
+        mem_target = int(config.get("value_cache_size"))
+        log.info(f"creating ValueCache - ttl: {ttl} mem_target: {mem_target}")
+        app["value_cache"] = ValueCache(ttl=ttl, mem_target=mem_target)
+    return app["value_cache"]
+
+def getChunkTableCache(app):
+    """ Return the cache of chunk table regions for indirect reference layouts
+    """
+    if "chunk_table_cache" not in app:
+        ttl = float(config.get("chunk_table_cache_ttl"))
+        mem_target = int(config.get("chunk_table_cache_size"))
+        log.info(f"creating ChunkTableCache - ttl: {ttl} mem_target: {mem_target}")
+        app["chunk_table_cache"] = ChunkTableCache(ttl=ttl, mem_target=mem_target)
+    return app["chunk_table_cache"]
+
+def getHotChunkTracker(app):
+    """ Return the tracker of frequently read chunks, or None if hot chunk
+    replication is disabled
+    """
+    threshold = float(config.get("hot_chunk_threshold"))
+    if threshold <= 0:
+        return None
+    if "hot_chunk_tracker" not in app:
+        log.info(f"creating HotChunkTracker - threshold: {threshold}")
+        app["hot_chunk_tracker"] = HotChunkTracker(threshold)
+    return app["hot_chunk_tracker"]
+
+def getChunkReadUrl(app, chunk_id):
+    """ Return the url of the DN to read the given (partition) chunk id from.
+    Reads of hot chunks are spread over the owning DN and the hot_chunk_replicas-1
+    nodes that follow it, which fetch the chunk from the owner.
+    """
+    tracker = getHotChunkTracker(app)
+    if tracker is None or not tracker.record(chunk_id):
+        return getDataNodeUrl(app, chunk_id)
+    dn_urls = app["dn_urls"]
+    node_count = len(dn_urls)
+    replica_count = min(int(config.get("hot_chunk_replicas")), node_count)
+    if replica_count <= 1:
+        return getDataNodeUrl(app, chunk_id)
+    owner = getObjPartition(chunk_id, node_count)
+    return dn_urls[(owner + random.randrange(replica_count)) % node_count]
+
+def invalidateDatasetValues(app, dset_id):
+    """ Drop cached GET value results for the dataset (and cached regions if
+    the dataset is a chunk table) after a write
+    """
+    getValueCache(app).invalidate(dset_id)
+    getChunkTableCache(app).invalidate(dset_id)
+
+def getChunkNode(app, chunk_id, dset_json, serverless=False, direct=False, read=False):
+    """ Return the node a request for the given chunk will be sent to.
+    For reads, this may be a DN holding a replica of a hot chunk.
+    Raises HTTPServiceUnavailable if the DN is overloaded.
+    """
+    if serverless:
+        return "lambda"
+    if direct:
+        return "storage"
+    chunk_id = getChunkIdForPartition(chunk_id, dset_json)
+    if read:
+        dn_url = getChunkReadUrl(app, chunk_id)
+    else:
+        dn_url = getDataNodeUrl(app, chunk_id)
+    # fail fast rather than queue work on a DN that's reported it's overloaded
+    checkDataNodeLoad(app, dn_url)
+    return dn_url
+
+def isReadOnly(domain):
+    """ Return True if the domain is configured as read-only.  SNs read chunks
+    for these domains directly from storage (the SN chunk cache doesn't see
+    writes made through the DNs), so value writes are not permitted.
+    """
+    # comma-separated string, split by isReadOnlyDomain
+    return isReadOnlyDomain(domain, config.get("read_only_domains"))
+
+def getLocalDataNode(app, chunk_id, dn_url=None):
+    """ Return the DN app if requests for the chunk (to dn_url, or the owning
+    DN if None) go to a DN running in this process, as with the standalone
+    app.  Otherwise return None and the request should be made over HTTP.
+    """
+    dn_app = app.get("local_dn")
+    if dn_app is None:
+        return None
+    if dn_url is None:
+        dn_url = getDataNodeUrl(app, chunk_id)
+    if app["dn_urls"].get(dn_app["node_number"]) != dn_url:
+        return None
+    return dn_app
+
+def getDataNodeReq(app, chunk_id, dn_url, params):
+    """ Return the chunk read request url for the given DN (or the owning
+    DN if dn_url is None), flagging reads from replicas in params
+    """
+    owner_url = getDataNodeUrl(app, chunk_id)
+    if dn_url is not None and dn_url != owner_url:
+        params["replica"] = 1
+    else:
+        dn_url = owner_url
+    return dn_url + "/chunks/" + chunk_id
+
+async def read_direct_chunk(app, chunk_id, dset_json, chunk_map=None, bucket=None, select=None, points=None):
+    """ read the chunk from storage (or the SN chunk cache) rather than the DN.
+    Returns None if the chunk has not been written.  select and points are
+    passed to get_chunk to allow partial reads of linked chunks.
+    """
+    s3path = None
+    s3offset = 0
+    s3size = 0
+    if chunk_map and chunk_id in chunk_map:
+        chunk_info = chunk_map[chunk_id]
+        s3path = chunk_info["s3path"]
+        s3offset = chunk_info["s3offset"]
+        s3size = chunk_info["s3size"]
+    log.debug(f"read_direct_chunk - chunk_id: {chunk_id}, s3path: {s3path}")
+    chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size,
+        chunk_init=False, select=select, points=points)
+    if chunk_arr is None and s3path:
+        # external HDF5 file, should exist
+        log.warn(f"s3path: {s3path} for S3 range get not found")
+        raise HTTPNotFound()
+    return chunk_arr
+
+async def read_chunk_hyperslab(app, chunk_id, dset_json, slices, np_arr, chunk_map=None, bucket=None, serverless=False, direct=False, dn_url=None):
     """ read the chunk selection from the DN
     chunk_id: id of chunk to write to
     chunk_sel: chunk-relative selection to read from
@@ -136,10 +295,12 @@ async def read_chunk_hyperslab(app, chunk_id, dset_json, slices, np_arr, chunk_m
         chunk_offset: location of chunk with the s3 object
         chunk_size: size of chunk within the s3 object (or 0 if the entire object)
     bucket: s3 bucket to read from
+    direct: read the chunk from storage rather than the DN
+    dn_url: DN to read from (from getChunkNode), defaults to the chunk owner
     """
     if not bucket:
         bucket = config.get("bucket_name")
-    msg = f"read_chunk_hyperslab, chunk_id: {chunk_id}, slices: {slices}, bucket: {bucket}, serverless: {serverless}"
+    msg = f"read_chunk_hyperslab, chunk_id: {chunk_id}, slices: {slices}, bucket: {bucket}, serverless: {serverless}, direct: {direct}"
     log.info(msg)
     if chunk_map and chunk_id not in chunk_map:
         log.warn(f"expected to find {chunk_id} in chunk_map")
@@ -192,9 +353,19 @@ async def read_chunk_hyperslab(app, chunk_id, dset_json, slices, np_arr, chunk_m
         # bucket only applied when s3path is not defined
         params["bucket"] = bucket
 
+    dn_app = None
+    if chunk_arr is None and not direct and not serverless:
+        dn_app = getLocalDataNode(app, chunk_id, dn_url)
+
     if chunk_arr is None:
 
-        if serverless:
+        if direct:
+            chunk_arr = await read_direct_chunk(app, chunk_id, dset_json, chunk_map=chunk_map, bucket=bucket, select=tuple(chunk_sel))
+            if chunk_arr is None:
+                chunk_arr = defaultChunk()
+            else:
+                chunk_arr = chunk_arr[tuple(chunk_sel)]
+        elif serverless:
             lambda_function = config.get("aws_lambda_chunkread_function")
             # extra params for lambda function
             params["chunk_id"] = chunk_id
@@ -241,11 +412,21 @@ async def read_chunk_hyperslab(app, chunk_id, dset_json, slices, np_arr, chunk_m
                     msg = f"lambda invoke to {lambda_function} failed with code: {status_code}"
                     log.error(msg)
                     raise HTTPInternalServerError()
+        elif dn_app is not None:
+            # DN is in this process, get the array without a request
+            chunk_arr = await read_chunk_selection(dn_app, chunk_id, tuple(chunk_sel), bucket=params.get("bucket"),
+                s3path=params.get("s3path"), s3offset=params.get("s3offset", 0), s3size=params.get("s3size", 0))
+            if chunk_arr is None:
+                if "s3path" in params:
+                    # external HDF5 file, should exist
+                    log.warn(f"s3path: {params['s3path']} for S3 range get not found")
+                    raise HTTPNotFound()
+                # no data, return zero array
+                chunk_arr = defaultChunk()
         else:
-            req = getDataNodeUrl(app, chunk_id)
-            req += "/chunks/" + chunk_id
+            req = getDataNodeReq(app, chunk_id, dn_url, params)
             log.debug("GET chunk req: " + req)
-            client = get_http_client(app)
+            client = get_http_client(app, url=req)
             try:
                 rsp = await client.get(req, params=params)
             except ClientError as ce:
@@ -256,6 +437,7 @@ async def read_chunk_hyperslab(app, chunk_id, dset_json, slices, np_arr, chunk_m
                 return
 
             log.debug(f"http_get {req} status: <{rsp.status}>")
+            updateDataNodeLoad(app, req, rsp.headers)
             if rsp.status == 200:
                 array_data = await rsp.read()  # read response as bytes
             elif rsp.status == 404:
@@ -301,9 +483,9 @@ point_list: array of points to read
 point_index: index of arr element to update for a given point
 arr: numpy array to store read bytes
 """
-async def read_point_sel(app, chunk_id, dset_json, point_list, point_index, np_arr, chunk_map=None, bucket=None, serverless=False):
+async def read_point_sel(app, chunk_id, dset_json, point_list, point_index, np_arr, chunk_map=None, bucket=None, serverless=False, direct=False, dn_url=None):
 
-    msg = f"read_point_sel, chunk_id: {chunk_id}, serverless: {serverless}"
+    msg = f"read_point_sel, chunk_id: {chunk_id}, serverless: {serverless}, direct: {direct}"
     log.info(msg)
 
     partition_chunk_id = getChunkIdForPartition(chunk_id, dset_json)
@@ -358,7 +540,19 @@ async def read_point_sel(app, chunk_id, dset_json, point_list, point_index, np_a
 
     if np_arr_rsp is None:
 
-        if serverless:
+        if direct:
+            point_arr = np_arr_points.reshape((num_points, -1))
+            chunk_arr = await read_direct_chunk(app, chunk_id, dset_json, chunk_map=chunk_map, bucket=bucket, points=point_arr)
+            if chunk_arr is None:
+                np_arr_rsp = defaultArray()
+            else:
+                layout = getChunkLayout(dset_json)
+                try:
+                    np_arr_rsp = chunkReadPoints(chunk_id=chunk_id, chunk_layout=layout, chunk_arr=chunk_arr, point_arr=point_arr)
+                except ValueError as ve:
+                    log.warn(f"chunkReadPoints ValueError: {ve}")
+                    raise HTTPBadRequest()
+        elif serverless:
             lambda_function = config.get("aws_lambda_chunkread_function")
             client = getLambdaClient(app)
             # extra params for lambda function
@@ -420,13 +614,14 @@ async def read_point_sel(app, chunk_id, dset_json, point_list, point_index, np_a
                 raise HTTPInternalServerError()
         else:
             # non-serverless = make request to DN node
-            req = getDataNodeUrl(app, chunk_id)
-            req += "/chunks/" + chunk_id
+            req = getDataNodeReq(app, chunk_id, dn_url, params)
             log.debug(f"GET chunk req: {req}")
-            client = get_http_client(app)
+            client = get_http_client(app, url=req)
+            post_data, headers = await getWireBody(post_data)
             try:
-                async with client.post(req, params=params, data=post_data) as rsp:
+                async with client.post(req, params=params, data=post_data, headers=headers) as rsp:
                     log.debug(f"http_post {req} status: <{rsp.status}>")
+                    updateDataNodeLoad(app, req, rsp.headers)
                     if rsp.status == 200:
                         rsp_data = await rsp.read()  # read response as bytes
                         np_arr_rsp = bytesToArray(rsp_data, dt, (num_points,))
@@ -465,6 +660,85 @@ async def read_point_sel(app, chunk_id, dset_json, point_list, point_index, np_a
         index = point_index[i]
         np_arr[index] = np_arr_rsp[i]
 
+"""
+Read points held by one data node, possibly across many chunks
+"""
+async def read_node_points(app, dn_url, dset_json, point_arr, np_arr, bucket=None):
+    dset_id = dset_json["id"]
+    num_points = len(point_arr)
+    msg = f"read_node_points, dn_url: {dn_url}, dset_id: {dset_id}, num_points: {num_points}"
+    log.info(msg)
+
+    params = {}
+    params["dset_id"] = dset_id
+    params["count"] = num_points
+    if bucket:
+        params["bucket"] = bucket
+    post_data = point_arr.tobytes()
+    dt = np_arr.dtype
+
+    req = dn_url + "/chunks"
+    client = get_http_client(app, url=req)
+    post_data, headers = await getWireBody(post_data)
+    try:
+        async with client.post(req, params=params, data=post_data, headers=headers) as rsp:
+            log.debug(f"http_post {req} status: <{rsp.status}>")
+            updateDataNodeLoad(app, req, rsp.headers)
+            if rsp.status == 200:
+                rsp_data = await rsp.read()  # read response as bytes
+                np_arr_rsp = bytesToArray(rsp_data, dt, (num_points,))
+            else:
+                msg = f"request to {req} failed with code: {rsp.status}"
+                log.error(msg)
+                raise HTTPInternalServerError()
+    except ClientError as ce:
+        log.error(f"Error for http_post({req}): {ce} ")
+        raise HTTPInternalServerError()
+    except CancelledError as cle:
+        log.warn(f"CancelledError for http_post({req}): {cle}")
+        return None
+
+    return np_arr_rsp
+
+"""
+Read a strided selection with one point request per data node rather than
+one hyperslab request per chunk
+"""
+async def read_strided_points(app, dset_json, slices, np_arr, bucket=None):
+    dset_id = dset_json["id"]
+    layout = getChunkLayout(dset_json)
+    points = getSelectionPoints(slices)
+    num_points = len(points)
+    log.info(f"read_strided_points - {num_points} points")
+
+    # find the data node for each chunk, then for each point
+    chunk_keys, chunk_inverse = np.unique(points // np.array(layout, dtype='uint64'), axis=0, return_inverse=True)
+    chunk_inverse = chunk_inverse.reshape(-1)
+    dn_urls = {}  # dn url to node index
+    chunk_nodes = np.zeros((len(chunk_keys),), dtype='i4')
+    for i in range(len(chunk_keys)):
+        chunk_id = getChunkIdForPartition(getChunkIdForIndex(dset_id, chunk_keys[i]), dset_json)
+        dn_url = getDataNodeUrl(app, chunk_id)
+        if dn_url not in dn_urls:
+            dn_urls[dn_url] = len(dn_urls)
+        chunk_nodes[i] = dn_urls[dn_url]
+    point_nodes = chunk_nodes[chunk_inverse]
+    log.debug(f"read_strided_points - {len(chunk_keys)} chunks on {len(dn_urls)} nodes")
+
+    # points are in row-major order, so can be placed in a flat view of the array
+    flat_arr = np_arr.reshape((num_points,))
+
+    async def read_node(dn_url, node_index):
+        mask = point_nodes == node_index
+        arr_rsp = await read_node_points(app, dn_url, dset_json, points[mask], np_arr, bucket=bucket)
+        if arr_rsp is not None:
+            flat_arr[mask] = arr_rsp
+
+    jobs = []
+    for dn_url in dn_urls:
+        jobs.append((dn_url, functools.partial(read_node, dn_url, dn_urls[dn_url])))
+    await getChunkExecutor(app).run(jobs)
+
 """
 Write point selection
 --
@@ -496,7 +770,7 @@ async def write_point_sel(app, chunk_id, dset_json, point_list, point_data, buck
     req = getDataNodeUrl(app, chunk_id)
     req += "/chunks/" + chunk_id
     log.debug("POST chunk req: " + req)
-    client = get_http_client(app)
+    client = get_http_client(app, url=req)
 
     num_points = len(point_list)
     log.debug(f"write_point_sel - {num_points}")
@@ -522,7 +796,7 @@ async def write_point_sel(app, chunk_id, dset_json, point_list, point_data, buck
         np_arr[i] = elem
 
     # TBD - support VLEN data
-    post_data = np_arr.tobytes()
+    post_data, headers = await getWireBody(np_arr.tobytes())
 
     # pass dset_json as query params
     params = {}
@@ -532,8 +806,9 @@ async def write_point_sel(app, chunk_id, dset_json, point_list, point_data, buck
         params["bucket"] = bucket
 
     try:
-        async with client.post(req, params=params, data=post_data) as rsp:
+        async with client.post(req, params=params, data=post_data, headers=headers) as rsp:
             log.debug(f"http_post {req} status: <{rsp.status}>")
+            updateDataNodeLoad(app, req, rsp.headers)
             if rsp.status == 200:
                 log.info(f"req: {req} OK")
             else:
@@ -640,11 +915,12 @@ async def read_chunk_query(app, chunk_id, dset_json, slices, query, limit, rsp_d
         req = getDataNodeUrl(app, chunk_id)
         req += "/chunks/" + chunk_id
         log.debug("GET chunk req: " + req)
-        client = get_http_client(app)
+        client = get_http_client(app, url=req)
         
         try:
             async with client.get(req, params=params) as rsp:
                 log.debug(f"http_get {req} status: <{rsp.status}>")
+                updateDataNodeLoad(app, req, rsp.headers)
                 if rsp.status == 200:
                     chunk_rsp = await rsp.json()  # read response as json
                     log.debug(f"got query data: {chunk_rsp}")
@@ -674,8 +950,7 @@ async def read_chunk_query(app, chunk_id, dset_json, slices, query, limit, rsp_d
 """
 Return list of elements from a dataset
 """
-async def getPointData(app, dset_id, dset_json, points, bucket=None, serverless=False):
-    loop = app["loop"]
+async def getPointData(app, dset_id, dset_json, points, bucket=None, serverless=False, direct=False):
     num_points = len(points)
     log.info(f"getPointData for {num_points} points")
     log.debug(f"dset_json: {dset_json}")
@@ -739,20 +1014,57 @@ async def getPointData(app, dset_id, dset_json, points, bucket=None, serverless=
     # create array to hold response data
     # TBD: initialize to fill value if not 0
     arr_rsp = np.zeros((num_points,), dtype=dset_dtype)
-    tasks = []
+    jobs = []
     for chunk_id in chunk_dict.keys():
         item = chunk_dict[chunk_id]
         point_list = item["points"]
         point_index = item["indices"]
-        task = asyncio.ensure_future(read_point_sel(app, chunk_id, dset_json,
-            point_list, point_index, arr_rsp, chunk_map=chunk_map, bucket=bucket, serverless=serverless))
-        tasks.append(task)
-    await asyncio.gather(*tasks, loop=loop)
+        node = getChunkNode(app, chunk_id, dset_json, serverless=serverless, direct=direct, read=True)
+        job = functools.partial(read_point_sel, app, chunk_id, dset_json,
+            point_list, point_index, arr_rsp, chunk_map=chunk_map, bucket=bucket, serverless=serverless, direct=direct, dn_url=node)
+        jobs.append((node, job))
+    await getChunkExecutor(app).run(jobs)
 
     log.debug(f"arr shape: {arr_rsp.shape}")
     return arr_rsp
 
 
+"""
+Return the binary chunk table of an H5D_CHUNKED_REF dataset (see
+save_chunk_table), from the chunk table cache if present
+"""
+async def getChunkRefTable(app, dset_id, bucket=None):
+    table_cache = getChunkTableCache(app)
+    table_arr = table_cache.getTable(dset_id)
+    if table_arr is None:
+        s3key = getChunkTableKey(dset_id)
+        try:
+            data = await getStorBytes(app, s3key, bucket=bucket)
+        except HTTPNotFound:
+            data = None
+        if data is None:
+            log.error(f"getChunkRefTable - chunk table {s3key} not found")
+            raise HTTPInternalServerError()
+        table_arr = np.frombuffer(data, dtype=CHUNK_TABLE_DT)
+        log.debug(f"getChunkRefTable - read {len(table_arr)} chunk table items for {dset_id}")
+        table_cache.add(dset_id, None, table_arr)
+    return table_arr
+
+"""
+Return the layout of an H5D_CHUNKED_REF dataset as clients gave it, with the
+chunks dict rather than the chunk_count of a binary chunk table
+"""
+async def getChunkRefLayout(app, dset_json, bucket=None):
+    layout = dset_json["layout"]
+    if "chunks" in layout:
+        return layout
+    table_arr = await getChunkRefTable(app, dset_json["id"], bucket=bucket)
+    chunk_grid = getChunkTableGrid(layout, getShapeDims(dset_json["shape"]))
+    client_layout = {key: layout[key] for key in layout if key not in ("chunk_count", "chunk_table_grid")}
+    client_layout["chunks"] = getChunkTableDict(table_arr, chunk_grid)
+    return client_layout
+
+
 """
 Get info for chunk locations (for reference layouts)
 """
@@ -810,6 +1122,16 @@ async def getChunkInfoMap(app, dset_id, dset_json, chunk_ids, bucket=None):
             if s3offset > layout["offset"] + layout["size"]:
                 log.warn(f"range get of s3offset: {s3offset} s3size: {s3size} extends beyond end of contiguous dataset for chunk_id: {chunk_id}")
             chunkinfo_map[chunk_id] = {"s3path": s3path, "s3offset": s3offset, "s3size": chunk_size}
+    elif layout["class"] == 'H5D_CHUNKED_REF' and "chunks" not in layout:
+        # chunk table is kept in a binary object
+        s3path = layout["file_uri"]
+        table_arr = await getChunkRefTable(app, dset_id, bucket=bucket)
+        chunk_indices = np.array([getChunkIndex(chunk_id) for chunk_id in chunk_ids], dtype=np.int64)
+        chunk_indices = chunk_indices.reshape((len(chunk_ids), rank))
+        chunk_grid = getChunkTableGrid(layout, dims)
+        offsets, sizes = getChunkTableItems(table_arr, chunk_indices, chunk_grid)
+        for i, chunk_id in enumerate(chunk_ids):
+            chunkinfo_map[chunk_id] = {"s3path": s3path, "s3offset": int(offsets[i]), "s3size": int(sizes[i])}
     elif layout["class"] == 'H5D_CHUNKED_REF':
         s3path = layout["file_uri"]
         chunks = layout["chunks"]
@@ -839,23 +1161,36 @@ async def getChunkInfoMap(app, dset_id, dset_json, chunk_ids, bucket=None):
             log.warn(msg)
             raise HTTPBadRequest(reason=msg)
 
-        # convert the list of chunk_ids into a set of points to query in the chunk table
+        # convert the list of chunk_ids into a set of points to look up in the chunk table
         num_pts = len(chunk_ids)
-        if rank == 1:
-            arr_points = np.zeros((num_pts,), dtype=np.dtype('u8'))
-        else:
-            arr_points = np.zeros((num_pts,rank), dtype=np.dtype('u8'))
-        for i in range(len(chunk_ids)):
-            chunk_id = chunk_ids[i]
-            log.debug(f"chunk_id for chunktable: {chunk_id}")
-            indx = getChunkIndex(chunk_id)
-            log.debug(f"get chunk indx: {indx}")
-            if rank == 1:
-                log.debug(f"convert: {indx[0]} to {indx}")
-                indx = indx[0]
-            arr_points[i] = indx
-        log.debug(f"got chunktable points: {arr_points}, calling getPointData")
-        point_data = await getPointData(app, chunktable_id, chunktable_json, arr_points, bucket=bucket)
+        indices = np.zeros((num_pts, rank), dtype=np.dtype('i8'))
+        for i in range(num_pts):
+            indices[i] = getChunkIndex(chunk_ids[i])
+        log.debug(f"got chunktable points: {indices}")
+
+        table_cache = getChunkTableCache(app)
+        point_data = table_cache.get(chunktable_id, indices)
+        if point_data is None:
+            # read the region of the chunk table holding the points (and the
+            # rest of the chunk table chunks they fall in) if it isn't too large
+            table_layout = getChunkLayout(chunktable_json)
+            table_dt = createDataType(chunktable_json["type"])
+            max_bytes = int(config.get("chunk_table_cache_size")) // 8
+            region = getChunkTableRegion(indices, chunktable_dims, table_layout, table_dt.itemsize, max_bytes)
+            if region is not None:
+                log.debug(f"reading chunktable region: {region}")
+                table_slices = tuple(slice(start, stop, 1) for start, stop in region)
+                table_ids = iterChunkIds(chunktable_id, table_slices, table_layout)
+                region_arr = await getHyperSlabData(app, table_ids, chunktable_json, table_slices, bucket=bucket)
+                table_cache.add(chunktable_id, region, region_arr)
+                rel_indices = indices - np.array([start for start, stop in region], dtype=indices.dtype)
+                point_data = region_arr[tuple(rel_indices[:, dim] for dim in range(rank))]
+            else:
+                arr_points = indices.astype(np.dtype('u8'))
+                if rank == 1:
+                    arr_points = arr_points.reshape((num_pts,))
+                log.debug("calling getPointData for chunktable points")
+                point_data = await getPointData(app, chunktable_id, chunktable_json, arr_points, bucket=bucket)
         log.debug(f"got chunktable data: {point_data}")
         if "file_uri" in layout:
             s3_layout_path = layout["file_uri"]
@@ -888,6 +1223,66 @@ async def getChunkInfoMap(app, dset_id, dset_json, chunk_ids, bucket=None):
     log.debug(f"returning chunkinfo_map: {chunkinfo_map}")
     return chunkinfo_map
 
+"""
+Read a coalesced byte range of linked chunks into the DN chunk cache (or the
+SN chunk cache for direct reads)
+"""
+async def read_chunk_range(app, dset_json, chunk_range, bucket=None, direct=False):
+    num_chunks = len(chunk_range["chunks"])
+    log.info(f"read_chunk_range - {chunk_range['s3path']} offset: {chunk_range['s3offset']} size: {chunk_range['s3size']} num_chunks: {num_chunks}")
+    try:
+        if direct:
+            count = await get_chunk_range(app, dset_json, chunk_range)
+        else:
+            # chunks in a range all belong to the same DN
+            req = getDataNodeUrl(app, chunk_range["chunks"][0][0])
+            req += "/chunkrange"
+            params = {"dset_id": dset_json["id"]}
+            if bucket:
+                params["bucket"] = bucket
+            rsp_json = await http_post(app, req, data=chunk_range, params=params)
+            count = rsp_json["count"] if rsp_json else 0
+    except HTTPException as he:
+        # the range read is only an optimization - chunks will be read individually
+        log.warn(f"read_chunk_range failed with status {he.status_code}: {he}")
+        return
+    log.debug(f"read_chunk_range - cached {count} of {num_chunks} chunks")
+
+"""
+Merge reads of linked chunks that are close together in the same file into
+larger range requests.  Ranges are planned per node, so each range is read
+by the DN that owns its chunks and the per-chunk reads that follow are
+served from the cache.
+"""
+async def prefetchChunkRanges(app, dset_json, chunk_ids, chunk_map, bucket=None, direct=False):
+    max_size = int(config.get("chunk_range_max_size"))
+    if not chunk_map or max_size <= 0:
+        return
+    max_gap = int(config.get("chunk_range_gap"))
+    node_items = {}
+    for chunk_id in chunk_ids:
+        if chunk_id not in chunk_map:
+            continue
+        chunk_info = chunk_map[chunk_id]
+        if not chunk_info["s3path"]:
+            continue
+        node = getChunkNode(app, chunk_id, dset_json, direct=direct)
+        if node not in node_items:
+            node_items[node] = []
+        partition_chunk_id = getChunkIdForPartition(chunk_id, dset_json)
+        node_items[node].append((partition_chunk_id, chunk_info["s3path"], chunk_info["s3offset"], chunk_info["s3size"]))
+
+    jobs = []
+    for node in node_items:
+        for chunk_range in getChunkRanges(node_items[node], max_gap=max_gap, max_size=max_size):
+            if len(chunk_range["chunks"]) < 2:
+                continue  # nothing gained, read with the chunk request
+            job = functools.partial(read_chunk_range, app, dset_json, chunk_range, bucket=bucket, direct=direct)
+            jobs.append((node, job))
+    if jobs:
+        log.info(f"prefetchChunkRanges - {len(jobs)} range requests for {len(chunk_ids)} chunks")
+        await getChunkExecutor(app).run(jobs)
+
 """
   Update given chunk based on query and query_update value
 """
@@ -908,7 +1303,7 @@ async def write_chunk_query(app, chunk_id, dset_json, slices, query, query_updat
     req = getDataNodeUrl(app, chunk_id)
     req += "/chunks/" + chunk_id
     log.debug("PUT chunk req: " + req)
-    client = get_http_client(app)
+    client = get_http_client(app, url=req)
 
     layout = getChunkLayout(dset_json)
     chunk_sel = getChunkCoverage(chunk_id, slices, layout)
@@ -928,6 +1323,7 @@ async def write_chunk_query(app, chunk_id, dset_json, slices, query, query_updat
     try:
         async with client.put(req, data=json.dumps(query_update), params=params) as rsp:
             log.debug(f"http_put {req} status: <{rsp.status}>")
+            updateDataNodeLoad(app, req, rsp.headers)
             if rsp.status in (200,201):
                 dn_rsp = await rsp.json()  # read response as json
                 log.debug(f"got query data: {dn_rsp}")
@@ -1062,11 +1458,11 @@ async def doPutQuery(request, query_update, dset_json):
 async def PUT_Value(request):
     log.request(request)
     app = request.app
-    loop = app["loop"]
     bucket = None
     body = None
     query = None
     json_data = None
+    json_text = None  # value as JSON text, if it can be parsed straight to an array
     params = request.rel_url.query
     append_rows = None # this is a append update or not
     append_dim = 0
@@ -1118,6 +1514,10 @@ async def PUT_Value(request):
         log.warn(msg)
         raise HTTPBadRequest(reason=msg)
     bucket = getBucketForDomain(domain)
+    if isReadOnly(domain):
+        msg = f"PUT Value not permitted for read-only domain: {domain}"
+        log.warn(msg)
+        raise HTTPForbidden(reason=msg)
 
     request_type = "json"
     if "Content-Type" in request.headers:
@@ -1139,7 +1539,7 @@ async def PUT_Value(request):
         raise HTTPBadRequest(reason=msg)
 
     if request_type == "json":
-        body = await request.json()
+        body, raw_body = await getJsonBody(request, raw_keys=("value",))
         if "append" in body and body["append"]:
             try:
                 append_rows = int(body["append"])
@@ -1199,7 +1599,10 @@ async def PUT_Value(request):
 
     if query:
         # divert here if we are doing a put query
-        put_query_rsp = await doPutQuery(request, body, dset_json)
+        try:
+            put_query_rsp = await doPutQuery(request, body, dset_json)
+        finally:
+            invalidateDatasetValues(app, dset_id)
         resp = await jsonResponse(request, put_query_rsp)
         return resp
 
@@ -1236,7 +1639,9 @@ async def PUT_Value(request):
         body_json = None
 
     if request_type == "json":
-        if "value" in body:
+        if "value" in raw_body:
+            json_text = raw_body["value"]
+        elif "value" in body:
             json_data = body["value"]
         elif "value_base64" in body:
             base64_data = body["value_base64"]
@@ -1353,7 +1758,12 @@ async def PUT_Value(request):
         #
         try:
             msg = "input data doesn't match selection"
-            arr = jsonToArray(np_shape, dset_dtype, json_data)
+            if json_text is not None:
+                arr = jsonTextToArray(json_text, np_shape, dset_dtype)
+                if arr is None:
+                    json_data = json.loads(json_text)
+            if arr is None:
+                arr = jsonToArray(np_shape, dset_dtype, json_data)
         except ValueError:
             log.warn(msg)
             raise HTTPBadRequest(reason=msg)
@@ -1438,28 +1848,22 @@ async def PUT_Value(request):
 
         num_chunks = getNumChunks(slices, layout)
         log.debug(f"num_chunks: {num_chunks}")
-        max_chunks = int(config.get('max_chunks_per_request'))
-        if num_chunks > max_chunks:
-            log.warn(f"PUT value too many chunks: {num_chunks}, {max_chunks}")
-            raise HTTPRequestEntityTooLarge(num_chunks, max_chunks)
 
+        # chunk ids are generated as needed, so there's no limit on the
+        # number of chunks a selection can cover
         try:
-            chunk_ids = getChunkIds(dset_id, slices, layout)
+            chunk_ids = iterChunkIds(dset_id, slices, layout)
         except ValueError:
-            log.warn("getChunkIds failed")
+            log.warn("iterChunkIds failed")
             raise HTTPInternalServerError()
-        log.debug(f"chunk_ids: {chunk_ids}")
 
-        tasks = []
-        task_batch_size = len(app["dn_urls"]) * 10
-        for chunk_id in chunk_ids:
-            task = asyncio.ensure_future(write_chunk_hyperslab(app, chunk_id, dset_json, slices, deflate_level, arr, bucket=bucket))
-            tasks.append(task)
-            if len(tasks) == task_batch_size:
-                await asyncio.gather(*tasks, loop=loop)
-                tasks = []
-        if tasks:
-            await asyncio.gather(*tasks, loop=loop)
+        # jobs are pulled from the generator as DN slots become free
+        jobs = ((getChunkNode(app, chunk_id, dset_json), functools.partial(write_chunk_hyperslab,
+            app, chunk_id, dset_json, slices, deflate_level, arr, bucket=bucket)) for chunk_id in chunk_ids)
+        try:
+            await getChunkExecutor(app).run(jobs)
+        finally:
+            invalidateDatasetValues(app, dset_id)
     else:
         #
         # Do point PUT
@@ -1512,15 +1916,18 @@ async def PUT_Value(request):
             msg = "PUT value request too large"
             log.warn(msg)
             raise HTTPRequestEntityTooLarge(num_chunks, max_chunks)
-        tasks = []
+        jobs = []
         for chunk_id in chunk_dict.keys():
             item = chunk_dict[chunk_id]
             point_list = item["points"]
             point_data = item["values"]
-            task = asyncio.ensure_future(write_point_sel(app, chunk_id, dset_json,
-                point_list, point_data, bucket=bucket))
-            tasks.append(task)
-        await asyncio.gather(*tasks, loop=loop)
+            job = functools.partial(write_point_sel, app, chunk_id, dset_json,
+                point_list, point_data, bucket=bucket)
+            jobs.append((getChunkNode(app, chunk_id, dset_json), job))
+        try:
+            await getChunkExecutor(app).run(jobs)
+        finally:
+            invalidateDatasetValues(app, dset_id)
 
     resp_json = {}
     resp = await jsonResponse(request, resp_json)
@@ -1629,12 +2036,6 @@ async def GET_Value(request):
 
     serverless_threshold =  app["node_count"] * config.get("aws_lambda_threshold")
 
-    max_chunks = int(config.get('max_chunks_per_request'))
-    if num_chunks > max_chunks:
-        msg = "GET value request too large"
-        log.warn(msg)
-        raise HTTPRequestEntityTooLarge(num_chunks, max_chunks)
-
     lambda_function = config.get("aws_lambda_chunkread_function")
     nonstrict = _isNonStrict(params)
     if nonstrict and lambda_function and num_chunks >= serverless_threshold:
@@ -1651,12 +2052,13 @@ async def GET_Value(request):
 
         log.debug(f"not using serverless for read on {num_chunks} chunks - {reason}")
 
-    chunk_ids = getChunkIds(dset_id, slices, layout)
-    # Get information about where chunks are located
-    #   Will be None except for H5D_CHUNKED_REF_INDIRECT type
-    chunkinfo = await getChunkInfoMap(app, dset_id, dset_json, chunk_ids, bucket=bucket)
-    log.debug(f"chunkinfo_map: {chunkinfo}")
+    direct = isReadOnly(domain)
+    if direct:
+        log.info(f"using direct storage read for read-only domain: {domain}")
+        serverless = False
 
+    # chunk ids are generated lazily and consumed in batches by the read functions
+    chunk_ids = iterChunkIds(dset_id, slices, layout)
 
     if request.method == "OPTIONS":
         # skip doing any big data load for options request
@@ -1673,7 +2075,7 @@ async def GET_Value(request):
             resp = await jsonResponse(request, None)  # TBD: what do return if client cancels
     else:
         try:
-            resp = await doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=chunkinfo, bucket=bucket, serverless=serverless)
+            resp = await doHyperSlabRead(request, chunk_ids, dset_json, slices, bucket=bucket, serverless=serverless, direct=direct)
         except CancelledError as ce:
             log.warn(f"Cancelled error on hyperslab read: {ce}")
             resp = await jsonResponse(request, None)  # TBD: what do return if client cancels
@@ -1685,7 +2087,6 @@ async def doQueryRead(request, chunk_ids, dset_json, slices, bucket=None, server
     params = request.rel_url.query
     query = params["query"]
     log.info(f"Query request: {query}")
-    loop = app["loop"]
 
     dset_id = dset_json["id"]
     type_json = dset_json["type"]
@@ -1702,35 +2103,31 @@ async def doQueryRead(request, chunk_ids, dset_json, slices, bucket=None, server
             log.warn(msg)
             raise HTTPBadRequest(reason=msg)
 
-    tasks = []
     node_count = app['node_count']
     log.debug(f"node_count:  {node_count}")
-    chunk_index = 0
     resp_index = []
     resp_value = []
-    num_chunks = len(chunk_ids)
+    num_chunks = 0
     max_lambda_invoke = config.get("aws_lambda_max_invoke")
-    log.info(f"doQueryRead with {num_chunks} chunks")
-    # Get information about where chunks are located
-    #   Will be None except for H5D_CHUNKED_REF_INDIRECT type
-    chunk_map = await getChunkInfoMap(app, dset_id, dset_json, chunk_ids, bucket=bucket)
-    log.debug(f"chunkinfo_map: {chunk_map}")
+    chunk_iter = iter(chunk_ids)
 
-    while chunk_index < num_chunks:
-        if num_chunks - chunk_index < max_lambda_invoke:
-            next_chunks = chunk_ids[chunk_index:]
-            chunk_index = num_chunks
-        else:
-            next_chunks = chunk_ids[chunk_index:(chunk_index+max_lambda_invoke)]
-            chunk_index += max_lambda_invoke
+    while True:
+        next_chunks = list(itertools.islice(chunk_iter, max_lambda_invoke))
+        if not next_chunks:
+            break
+        num_chunks += len(next_chunks)
         log.debug(f"doQueryRead - next batch of chunk ids: {next_chunks}")
-        #log.info*(f"doQueryRead - invoking lambda over {len(next_chunks)} chunks")
+        # Get information about where chunks are located
+        #   Will be None except for H5D_CHUNKED_REF_INDIRECT type
+        chunk_map = await getChunkInfoMap(app, dset_id, dset_json, next_chunks, bucket=bucket)
+        log.debug(f"chunkinfo_map: {chunk_map}")
         # run query on DN nodes
+        jobs = []
         dn_rsp = {} # dictionary keyed by chunk_id
         for chunk_id in next_chunks:
-            task = asyncio.ensure_future(read_chunk_query(app, chunk_id, dset_json, slices, query, limit, dn_rsp, chunk_map=chunk_map, bucket=bucket, serverless=serverless))
-            tasks.append(task)
-        await asyncio.gather(*tasks, loop=loop)
+            job = functools.partial(read_chunk_query, app, chunk_id, dset_json, slices, query, limit, dn_rsp, chunk_map=chunk_map, bucket=bucket, serverless=serverless)
+            jobs.append((getChunkNode(app, chunk_id, dset_json, serverless=serverless), job))
+        await getChunkExecutor(app).run(jobs)
 
         for chunk_id in next_chunks:
             chunk_rsp = dn_rsp[chunk_id]
@@ -1741,16 +2138,71 @@ async def doQueryRead(request, chunk_ids, dset_json, slices, bucket=None, server
             resp_index = resp_index[0:limit]
             resp_value = resp_index[0:limit]
             break  # don't need any more DN queries
+    log.info(f"doQueryRead ran over {num_chunks} chunks")
     resp_json = { "index": resp_index, "value": resp_value}
     resp_json["hrefs"] = get_hrefs(request, dset_json)
     resp = await jsonResponse(request, resp_json)
     return resp
 
-async def doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=None, bucket=None, serverless=False):
+"""
+Read the selection into a new array.  chunk_ids may be any iterable (e.g. the
+generator returned by iterChunkIds).  Chunks are consumed max_chunks_per_request
+at a time so that the chunk ids and chunk map for only one batch are held in
+memory.  If chunk_map is not given, it is looked up for each batch.
+"""
+async def getHyperSlabData(app, chunk_ids, dset_json, slices, chunk_map=None, bucket=None, serverless=False, direct=False):
+    dset_id = dset_json["id"]
+    type_json = dset_json["type"]
+    item_size = getItemSize(type_json)
+    dset_dtype = createDataType(type_json)  # np datatype
+    np_shape = getSelectionShape(slices)
+
+    arr = np.zeros(np_shape, dtype=dset_dtype, order='C')
+
+    read_mode = "hyperslab"
+    if chunk_map is None and not serverless and not direct and dset_json["layout"]["class"] == 'H5D_CHUNKED':
+        # strided selections that touch many chunks with only a few points
+        # each may be cheaper to read with one point request per DN
+        layout = getChunkLayout(dset_json)
+        max_request_size = int(config.get("max_request_size"))
+        read_mode = getStridedReadMode(slices, layout, item_size, len(app["dn_urls"]), max_size=max_request_size)
+    log.debug(f"getHyperSlabData - read_mode: {read_mode}")
+
+    max_chunks = int(config.get('max_chunks_per_request'))
+    executor = getChunkExecutor(app)
+    chunk_iter = iter(chunk_ids)
+    if read_mode == "point":
+        await read_strided_points(app, dset_json, slices, arr, bucket=bucket)
+        chunk_iter = iter(())
+    num_chunks = 0
+    while True:
+        batch = list(itertools.islice(chunk_iter, max_chunks))
+        if not batch:
+            break
+        num_chunks += len(batch)
+        log.debug(f"getHyperSlabData - next batch of chunk ids: {batch}")
+        batch_map = chunk_map
+        if batch_map is None:
+            # Get information about where chunks are located
+            #   Will be None except for reference layouts
+            batch_map = await getChunkInfoMap(app, dset_id, dset_json, batch, bucket=bucket)
+            log.debug(f"chunkinfo_map: {batch_map}")
+        if batch_map and not serverless:
+            # coalesce reads of nearby linked chunks
+            await prefetchChunkRanges(app, dset_json, batch, batch_map, bucket=bucket, direct=direct)
+        jobs = []
+        for chunk_id in batch:
+            node = getChunkNode(app, chunk_id, dset_json, serverless=serverless, direct=direct, read=True)
+            job = functools.partial(read_chunk_hyperslab, app, chunk_id, dset_json, slices, arr, chunk_map=batch_map, bucket=bucket, serverless=serverless, direct=direct, dn_url=node)
+            jobs.append((node, job))
+        await executor.run(jobs)
+
+    log.info(f"getHyperSlabData - read {num_chunks} chunks")
+    return arr
+
+async def doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=None, bucket=None, serverless=False, direct=False):
     app = request.app
-    loop = app["loop"]
-    log.info(f"doHyperSlabRead - number of chunk_ids: {len(chunk_ids)}")
-    log.debug(f"doHyperSlabRead - chunk_ids: {chunk_ids}")
+    dset_id = dset_json["id"]
     cors_domain = config.get("cors_domain")
 
 
@@ -1760,9 +2212,7 @@ async def doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=None,
     type_json = dset_json["type"]
     item_size = getItemSize(type_json)
     log.debug(f"item size: {item_size}")
-    dset_dtype = createDataType(type_json)  # np datatype
 
-    # create array to hold response data
     np_shape = getSelectionShape(slices)
     log.debug(f"selection shape: {np_shape}")
 
@@ -1779,13 +2229,15 @@ async def doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=None,
         log.warn(msg)
         raise HTTPRequestEntityTooLarge(request_size, max_request_size)
 
-    arr = np.zeros(np_shape, dtype=dset_dtype, order='C')
-    tasks = []
-
-    for chunk_id in chunk_ids:
-        task = asyncio.ensure_future(read_chunk_hyperslab(app, chunk_id, dset_json, slices, arr, chunk_map=chunk_map, bucket=bucket, serverless=serverless))
-        tasks.append(task)
-    await asyncio.gather(*tasks, loop=loop)
+    read_func = functools.partial(getHyperSlabData, app, chunk_ids, dset_json, slices,
+        chunk_map=chunk_map, bucket=bucket, serverless=serverless, direct=direct)
+    if chunk_map is None:
+        # identical concurrent reads share one execution (and the result may
+        # be cached for a short time)
+        selection = tuple((s.start, s.stop, s.step) for s in slices)
+        arr = await getValueCache(app).get(dset_id, (bucket, selection), read_func)
+    else:
+        arr = await read_func()
 
     log.debug(f"arr shape: {arr.shape}")
 
@@ -1801,9 +2253,7 @@ async def doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=None,
                 resp.headers['Access-Control-Allow-Origin'] = cors_domain
                 resp.headers['Access-Control-Allow-Methods'] = "GET, POST, DELETE, PUT, OPTIONS"
                 resp.headers['Access-Control-Allow-Headers'] = "Content-Type, api_key, Authorization"
-                resp.content_length = len(output_data)
-            await resp.prepare(request)
-            await resp.write(output_data)
+            await writeResponseBody(request, resp, output_data)
         except Exception as e:
             log.error(f"Exception during binary data write: {e}")
         finally:
@@ -1812,16 +2262,14 @@ async def doHyperSlabRead(request, chunk_ids, dset_json, slices, chunk_map=None,
     else:
         log.debug("GET Value - returning JSON data")
         resp_json = {}
-        data = arr.tolist()
-        json_data = bytesArrayToList(data)
         datashape = dset_json["shape"]
         if datashape["class"] == 'H5S_SCALAR':
             # convert array response to value
-            resp_json["value"] = json_data[0]
+            json_value = arrayToJson(arr[0])
         else:
-            resp_json["value"] = json_data
+            json_value = arrayToJson(arr)
         resp_json["hrefs"] = get_hrefs(request, dset_json)
-        resp = await jsonResponse(request, resp_json)
+        resp = await jsonResponse(request, resp_json, encoded={"value": json_value})
     return resp
 
 
@@ -1962,7 +2410,12 @@ async def POST_Value(request):
 
         log.debug(f"not using serverless for read on {num_points} points - {reason}")
 
-    arr_rsp = await getPointData(app, dset_id, dset_json, points, bucket=bucket, serverless=serverless)
+    direct = isReadOnly(domain)
+    if direct:
+        log.info(f"using direct storage read for read-only domain: {domain}")
+        serverless = False
+
+    arr_rsp = await getPointData(app, dset_id, dset_json, points, bucket=bucket, serverless=serverless, direct=direct)
 
     log.debug(f"arr shape: {arr_rsp.shape}")
 
@@ -1974,20 +2427,251 @@ async def POST_Value(request):
         try:
             resp = StreamResponse()
             resp.headers['Content-Type'] = "application/octet-stream"
-            resp.content_length = len(output_data)
-            await resp.prepare(request)
-            await resp.write(output_data)
+            await writeResponseBody(request, resp, output_data)
         except Exception as e:
             log.error(f"Exception during binary data write: {e}")
         finally:
             await resp.write_eof()
     else:
         log.debug("POST Value - returning JSON data")
-        rsp_json = {}
-        data = arr_rsp.tolist()
-        log.debug(f"got rsp data {len(data)} points")
-        json_data = bytesArrayToList(data)
-        rsp_json["value"] = json_data
-        resp = await jsonResponse(request, rsp_json)
+        log.debug(f"got rsp data {len(arr_rsp)} points")
+        resp = await jsonResponse(request, {}, encoded={"value": arrayToJson(arr_rsp)})
+    log.response(request, resp=resp)
+    return resp
+
+def getRequestChunkId(request, dset_id, dset_json):
+    """ Return the id of the chunk given by the index (chunk coordinates
+    joined by underscores, e.g. "2_3") in the request path
+    """
+    dims = getShapeDims(dset_json["shape"])
+    chunk_grid = getChunkGrid(dims, getChunkLayout(dset_json))
+    index = request.match_info.get('index', '')
+    try:
+        chunk_index = [int(x) for x in index.split('_')]
+    except ValueError:
+        chunk_index = None
+    if not chunk_index or len(chunk_index) != len(chunk_grid):
+        msg = f"Invalid chunk index: {index}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    for n, extent in zip(chunk_index, chunk_grid):
+        if n < 0 or n >= extent:
+            msg = f"Chunk index {index} is out of range"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+    return getChunkIdForIndex(dset_id, chunk_index)
+
+async def getChunkRequestDataset(request, action):
+    """ Checks shared by the raw chunk handlers: validate the dataset id,
+    user, and domain, and that the user can perform the action ("read" or
+    "update") on the dataset.  Returns the dataset json and the bucket.
+    """
+    app = request.app
+    dset_id = request.match_info.get('id')
+    if not dset_id:
+        msg = "Missing dataset id"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if not isValidUuid(dset_id, "Dataset"):
+        msg = f"Invalid dataset id: {dset_id}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    username, pswd = getUserPasswordFromRequest(request)
+    if username is None and app['allow_noauth'] and action == "read":
+        username = "default"
+    else:
+        await validateUserPassword(app, username, pswd)
+
+    domain = getDomainFromRequest(request)
+    if not isValidDomain(domain):
+        msg = f"Invalid domain: {domain}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    bucket = getBucketForDomain(domain)
+    if action != "read" and isReadOnly(domain):
+        msg = f"{request.method} chunk not permitted for read-only domain: {domain}"
+        log.warn(msg)
+        raise HTTPForbidden(reason=msg)
+
+    dset_json = await getObjectJson(app, dset_id, bucket=bucket)
+    await validateAction(app, domain, dset_id, username, action)
+    return dset_json, bucket
+
+def getDecodedSize(chunk_bytes, max_size):
+    """ Return the size of the zlib compressed chunk_bytes when decompressed,
+    or None if they aren't a complete zlib stream of at most max_size bytes.
+    Only max_size + 1 bytes are decompressed at most.
+    """
+    if not isDeflated(chunk_bytes):
+        return None
+    decompressor = zlib.decompressobj()
+    try:
+        decoded_size = len(decompressor.decompress(chunk_bytes, max_size + 1))
+    except zlib.error:
+        return None
+    if not decompressor.eof:
+        return None
+    return decoded_size
+
+"""
+Return the bytes of one chunk as stored, along with the filters applied to them
+"""
+async def GET_DatasetChunk(request):
+    log.request(request)
+    app = request.app
+    dset_id = request.match_info.get('id')
+    dset_json, bucket = await getChunkRequestDataset(request, "read")
+
+    layout_json = dset_json.get("layout", {})
+    layout_class = layout_json.get("class")
+    if layout_class not in ('H5D_CHUNKED', 'H5D_CHUNKED_REF', 'H5D_CHUNKED_REF_INDIRECT'):
+        msg = f"Raw chunk reads are not supported for layout class: {layout_class}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    if getItemSize(dset_json["type"]) == 'H5T_VARIABLE':
+        msg = "Raw chunk reads are not supported for variable length types"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    layout = getChunkLayout(dset_json)
+    chunk_id = getRequestChunkId(request, dset_id, dset_json)
+
+    if layout_class == 'H5D_CHUNKED':
+        chunk_id = getChunkIdForPartition(chunk_id, dset_json)
+        dn_url = getChunkNode(app, chunk_id, dset_json)
+        req = dn_url + "/chunks/" + chunk_id
+        dn_params = {"raw": 1}
+        if bucket:
+            dn_params["bucket"] = bucket
+        client = get_http_client(app, url=req)
+        try:
+            async with client.get(req, params=dn_params) as rsp:
+                log.debug(f"GET_DatasetChunk - http_get {req} status: <{rsp.status}>")
+                updateDataNodeLoad(app, req, rsp.headers)
+                if rsp.status == 404:
+                    log.info(f"chunk {chunk_id} not found")
+                    raise HTTPNotFound()
+                elif rsp.status == 503:
+                    log.warn(f"DN node too busy to handle request: {req}")
+                    raise HTTPServiceUnavailable()
+                elif rsp.status != 200:
+                    log.error(f"request error status: {rsp.status} for {req}: {str(rsp)}")
+                    raise HTTPInternalServerError()
+                chunk_bytes = await rsp.read()
+                filters = rsp.headers.get(CHUNK_FILTERS_HEADER, "[]")
+        except ClientError as ce:
+            log.error(f"Error for http_get({req}): {ce} ")
+            raise HTTPInternalServerError()
+    else:
+        chunk_map = await getChunkInfoMap(app, dset_id, dset_json, [chunk_id], bucket=bucket)
+        chunk_info = chunk_map.get(chunk_id) if chunk_map else None
+        if not chunk_info or not chunk_info["s3path"] or chunk_info["s3size"] == 0:
+            log.info(f"chunk {chunk_id} not allocated")
+            raise HTTPNotFound()
+        s3bucket, s3key = splitS3Path(chunk_info["s3path"])
+        chunk_bytes = await getStorBytes(app, s3key, offset=chunk_info["s3offset"], length=chunk_info["s3size"], bucket=s3bucket)
+        if chunk_bytes is None:
+            log.warn(f"s3path: {chunk_info['s3path']} for S3 range get not found")
+            raise HTTPNotFound()
+        # chunks of linked files are stored with the dataset's filters
+        filters = json.dumps(getFilters(dset_json))
+
+    resp = StreamResponse()
+    resp.headers['Content-Type'] = "application/octet-stream"
+    resp.headers[CHUNK_FILTERS_HEADER] = filters
+    resp.headers[CHUNK_SHAPE_HEADER] = json.dumps(layout)
+    resp.content_length = len(chunk_bytes)
+    await resp.prepare(request)
+    await resp.write(chunk_bytes)
+    await resp.write_eof()
+    log.response(request, resp=resp)
+    return resp
+
+"""
+Store pre-filtered bytes for one whole chunk
+"""
+async def PUT_DatasetChunk(request):
+    log.request(request)
+    app = request.app
+    dset_id = request.match_info.get('id')
+    dset_json, bucket = await getChunkRequestDataset(request, "update")
+
+    if not request.has_body:
+        msg = "PUT chunk with no body"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    content_type = request.headers.get("Content-Type", "application/octet-stream")
+    if content_type != "application/octet-stream":
+        msg = f"Unexpected content_type: {content_type}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    max_request_size = int(config.get("max_request_size"))
+    if isinstance(request.content_length, int) and request.content_length >= max_request_size:
+        log.warn(f"Request size too large: {request.content_length} max: {max_request_size}")
+        raise HTTPRequestEntityTooLarge(request.content_length, max_request_size)
+
+    layout_class = dset_json.get("layout", {}).get("class")
+    if layout_class != 'H5D_CHUNKED':
+        msg = f"Raw chunk writes are not supported for layout class: {layout_class}"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    item_size = getItemSize(dset_json["type"])
+    if item_size == 'H5T_VARIABLE':
+        msg = "Raw chunk writes are not supported for variable length types"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    layout = getChunkLayout(dset_json)
+    chunk_id = getRequestChunkId(request, dset_id, dset_json)
+    chunk_size = item_size
+    for extent in layout:
+        chunk_size *= extent
+
+    # the chunk can be stored unfiltered, or with the dataset's filters as the DN
+    # applies them: shuffle (if the dataset uses it) then deflate
+    try:
+        filters = json.loads(request.headers.get(CHUNK_FILTERS_HEADER, "[]"))
+    except ValueError:
+        filters = None
+    if not isinstance(filters, list) or not all(isinstance(item, dict) for item in filters):
+        msg = f"Invalid {CHUNK_FILTERS_HEADER} header"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+    filter_classes = [item.get("class") for item in filters]
+    if filter_classes:
+        expected = ["H5Z_FILTER_DEFLATE"]
+        if getShuffleSize(dset_json):
+            expected.insert(0, "H5Z_FILTER_SHUFFLE")
+        if filter_classes != expected or getDeflateLevel(dset_json) is None:
+            msg = f"Unsupported filters for raw chunk write: {filters}"
+            log.warn(msg)
+            raise HTTPBadRequest(reason=msg)
+    deflate = len(filters) > 0
+
+    chunk_bytes = await request_read(request)
+    if deflate:
+        loop = app["loop"]
+        decoded_size = await loop.run_in_executor(None, getDecodedSize, chunk_bytes, chunk_size)
+    else:
+        decoded_size = len(chunk_bytes)
+    if decoded_size != chunk_size:
+        msg = f"Expected chunk of {chunk_size} bytes, but got {decoded_size} bytes"
+        if deflate:
+            msg += " after decompressing"
+        log.warn(msg)
+        raise HTTPBadRequest(reason=msg)
+
+    chunk_id = getChunkIdForPartition(chunk_id, dset_json)
+    dn_url = getChunkNode(app, chunk_id, dset_json)
+    req = dn_url + "/chunks/" + chunk_id
+    params = {"raw": 1}
+    if bucket:
+        params["bucket"] = bucket
+    try:
+        await http_put_binary(app, req, data=chunk_bytes, params=params)
+    finally:
+        invalidateDatasetValues(app, dset_id)
+
+    resp = await jsonResponse(request, {}, status=201)
     log.response(request, resp=resp)
     return resp
@@ -18,7 +18,7 @@ from aiohttp.web import run_app
 from . import config
 from .util.lruCache import LruCache
 from .util.idUtil import isValidUuid, isSchema2Id, getCollectionForId, isRootObjId
-from .basenode import healthCheck, baseInit, preStop
+from .basenode import healthCheck, baseInit, preStop, getWorkerCount, runWorkers
 from . import hsds_logger as log
 from .domain_dn import GET_Domain, PUT_Domain, DELETE_Domain, PUT_ACL
 from .group_dn import GET_Group, POST_Group, DELETE_Group, PUT_Group, POST_Root
@@ -26,9 +26,11 @@ from .link_dn import GET_Links, GET_Link, PUT_Link, DELETE_Link
 from .attr_dn import GET_Attributes, GET_Attribute, PUT_Attribute, DELETE_Attribute
 from .ctype_dn import GET_Datatype, POST_Datatype, DELETE_Datatype
 from .dset_dn import GET_Dataset, POST_Dataset, DELETE_Dataset, PUT_DatasetShape
-from .chunk_dn import PUT_Chunk, GET_Chunk, POST_Chunk, DELETE_Chunk
-from .datanode_lib import s3syncCheck
+from .chunk_dn import PUT_Chunk, GET_Chunk, POST_Chunk, POST_Chunks, POST_ChunkRange, DELETE_Chunk, DELETE_ChunkReplica
+from .cache_dn import PUT_CacheItem
+from .datanode_lib import s3syncCheck, flush_dirty, getHandoffItems, handoff_cache
 from .async_lib import scanRoot, removeKeys
+from .util.loadUtil import setLoadHeader
 from aiohttp.web_exceptions import HTTPNotFound, HTTPInternalServerError, HTTPForbidden, HTTPBadRequest
 
 
@@ -73,13 +75,46 @@ async def init(loop):
     app.router.add_route('PUT', '/chunks/{id}', PUT_Chunk)
     app.router.add_route('GET', '/chunks/{id}', GET_Chunk)
     app.router.add_route('POST', '/chunks/{id}', POST_Chunk)
+    app.router.add_route('POST', '/chunks', POST_Chunks)
+    app.router.add_route('POST', '/chunkrange', POST_ChunkRange)
     app.router.add_route('DELETE', '/chunks/{id}', DELETE_Chunk)
+    app.router.add_route('DELETE', '/replicas/{id}', DELETE_ChunkReplica)
     app.router.add_route("POST", '/roots/{id}', POST_Root)
-    app.router.add_route("DELETE", '/prestop', preStop)
+    app.router.add_route('PUT', '/cachehandoff', PUT_CacheItem)
+    app.router.add_route("DELETE", '/prestop', preStopDN)
 
 
     return app
 
+def handoffOnRenumber(app, dn_urls, node_number):
+    """ Called by k8s_register when this node is about to take node_number
+    with the given DNs - drop the cache entries this node will no longer own,
+    handing the hottest of them to their new owners """
+    handoff_items = getHandoffItems(app, dn_urls, node_number)
+    asyncio.ensure_future(handoff_cache(app, dn_urls, handoff_items))
+
+
+async def preStopDN(request):
+    """ preStop for data nodes - write dirty objects to storage and hand off
+    the hottest cache entries to the nodes taking over this node's partition
+    before the container is stopped """
+    app = request.app
+    node_number = app["node_number"]
+    resp = await preStop(request)
+    timeout = config.get("cache_handoff_timeout")
+    if not await flush_dirty(app, timeout):
+        log.warn("preStop - skipping cache handoff with dirty objects")
+        return resp
+    # remaining nodes, numbered as they will be once this node is gone
+    dn_urls = {}
+    for number in sorted(app["dn_urls"]):
+        if number != node_number:
+            dn_urls[len(dn_urls)] = app["dn_urls"][number]
+    handoff_items = getHandoffItems(app, dn_urls, -1)
+    await handoff_cache(app, dn_urls, handoff_items)
+    return resp
+
+
 async def bucketScan(app):
     """ Scan v2 keys and update .info.json
     """
@@ -191,9 +226,11 @@ def create_app(loop):
     :param loop: The asyncio loop to use for the application
     :rtype: aiohttp.web.Application
     """
-    metadata_mem_cache_size = int(config.get("metadata_mem_cache_size"))
+    # cache sizes are per container, so split them between the workers
+    workers = getWorkerCount("dn")
+    metadata_mem_cache_size = int(config.get("metadata_mem_cache_size")) // workers
     log.info("Using metadata memory cache size of: {}".format(metadata_mem_cache_size))
-    chunk_mem_cache_size = int(config.get("chunk_mem_cache_size"))
+    chunk_mem_cache_size = int(config.get("chunk_mem_cache_size")) // workers
     log.info("Using chunk memory cache size of: {}".format(chunk_mem_cache_size))
 
     #create the app object
@@ -211,12 +248,19 @@ def create_app(loop):
     app["root_notify_ids"] = {}   # map of root_id to bucket name used for notify root of changes in domain
     app["root_scan_ids"] = {}   # map of root_id to bucket name for pending root scans
     app["gc_ids"] = set()       # set of root or dataset ids for deletion
+    app["chunk_replicas"] = {}  # map of chunk ids to {url: fetch time} of DNs holding replicas of the (hot) chunk
+    app["replica_ids"] = {}  # map of chunk ids replicated from other DNs to time they were fetched
+    app["replica_invalidations"] = {}  # map of replica chunk ids to time they were last invalidated
     app["objDelete_prefix"] = None  # used by async_lib removeKeys
+    app["on_renumber"] = handoffOnRenumber  # cache handoff when the node number changes
     # TODO - there's nothing to prevent the deflate_map from getting ever larger
     # (though it is only one int per dataset id)
     # add a timestamp and remove at a certain time?
     # delete entire map whenver the synch queue is empty?
 
+    # let SNs know how busy this node is
+    app.on_response_prepare.append(setLoadHeader)
+
     # run background tasks
     app.on_startup.append(start_background_tasks)
 
@@ -227,14 +271,19 @@ def create_app(loop):
 # Main
 #
 
-def main():
-    log.info("datanode start")
+def runWorker(worker):
+    """ Run a DN worker.  Each worker listens on its own port and owns its own partition """
     app = create_app(asyncio.get_event_loop())
 
     # run the app
-    port = int(config.get("dn_port"))
+    port = int(config.get("dn_port")) + worker
+    app["node_port"] = port
     log.info(f"run_app on port: {port}")
-    run_app(app, port=port)
+    run_app(app, port=port, path=app["node_socket"])
+
+def main():
+    log.info("datanode start")
+    runWorkers("dn", runWorker)
 
 if __name__ == '__main__':
     main()
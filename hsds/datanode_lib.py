@@ -13,17 +13,21 @@
 # data node of hsds cluster
 #
 import asyncio
+import io
 import time
 import numpy as np
-from aiohttp.web_exceptions import HTTPGone, HTTPInternalServerError, HTTPBadRequest, HTTPNotFound, HTTPForbidden, HTTPServiceUnavailable
+from aiohttp.web_exceptions import HTTPException, HTTPGone, HTTPInternalServerError, HTTPBadRequest, HTTPNotFound, HTTPForbidden, HTTPServiceUnavailable, HTTPConflict
 from .util.idUtil import validateInPartition, getS3Key, isValidUuid, isValidChunkId, getDataNodeUrl, isSchema2Id, getRootObjId, isRootObjId
-from .util.storUtil import getStorJSONObj, putStorJSONObj, putStorBytes, getStorBytes, isStorObj, deleteStorObj
+from .util.idUtil import getObjPartition, getChunkTableKey
+from .util.storUtil import getStorJSONObj, putStorJSONObj, putStorBytes, getStorBytes, isStorObj, deleteStorObj, decodeStorBytes
+from .util.storUtil import encodeStorBytes, isDeflated, splitS3Path
 from .util.domainUtil import isValidDomain, getBucketForDomain
 from .util.attrUtil import getRequestCollectionName
-from .util.httpUtil import http_post
-from .util.dsetUtil import getChunkLayout, getDeflateLevel, isShuffle, getFillValue
-from .util.chunkUtil import getDatasetId
-from .util.arrayUtil import arrayToBytes, bytesToArray
+from .util.httpUtil import http_get, http_post, http_put, http_put_binary, http_delete
+from .util.dsetUtil import getChunkLayout, getDeflateLevel, getFilters, isShuffle, getShuffleSize, getFillValue
+from .util.chunkUtil import getDatasetId, getChunkByteRanges, getChunkTableGrid, getChunkTableArray
+from .util.chunkUtil import chunkReadSelection, chunkWriteSelection
+from .util.arrayUtil import arrayToBytes, bytesToArray, getShapeDims
 from .util.hdf5dtype import createDataType
 
 from . import config
@@ -175,9 +179,93 @@ async def get_metadata_obj(app, obj_id, bucket=None):
                 log.info(f"s3 read for {s3_key} took {elapsed_time}")
                 del pending_s3_read[obj_id]
             meta_cache[obj_id] = obj_json  # add to cache
+            if isValidUuid(obj_id, "Dataset") and hasLargeChunkTable(obj_id, obj_json):
+                if getObjPartition(obj_id, len(app["dn_urls"])) == app["node_number"]:
+                    # move the chunk table out of datasets we own in the
+                    # background, so that reads don't depend on the writes
+                    asyncio.ensure_future(migrate_chunk_table(app, obj_id, bucket=bucket))
     return obj_json
 
 
+def hasLargeChunkTable(dset_id, dset_json):
+    """ Return True if the dataset has an H5D_CHUNKED_REF layout with more
+    than chunk_table_inline_max chunks in its chunks dict
+    """
+    if "layout" not in dset_json or not isSchema2Id(dset_id):
+        return False
+    layout = dset_json["layout"]
+    if layout.get("class") != 'H5D_CHUNKED_REF' or "chunks" not in layout:
+        return False
+    return len(layout["chunks"]) > int(config.get("chunk_table_inline_max"))
+
+
+async def save_chunk_table(app, dset_id, dset_json, bucket=None):
+    """ For H5D_CHUNKED_REF layouts with more than chunk_table_inline_max chunks,
+    write the chunks dict to a binary chunk table object and replace it in
+    the layout with chunk_count and the chunk_table_grid the table is indexed
+    by.  Returns True if the layout was changed.
+    """
+    if not hasLargeChunkTable(dset_id, dset_json):
+        return False
+    layout = dset_json["layout"]
+    chunks = layout["chunks"]
+    chunk_grid = getChunkTableGrid(layout, getShapeDims(dset_json["shape"]))
+    table_arr = getChunkTableArray(chunks, chunk_grid)
+    s3key = getChunkTableKey(dset_id)
+    log.info(f"save_chunk_table {s3key} - {len(table_arr)} chunks")
+    await putStorBytes(app, s3key, table_arr.tobytes(), bucket=bucket)
+    del layout["chunks"]
+    layout["chunk_count"] = len(table_arr)
+    layout["chunk_table_grid"] = chunk_grid
+    return True
+
+
+async def migrate_chunk_table(app, dset_id, bucket=None):
+    """ Move the large inline chunk table of a dataset loaded by its owning DN
+    to a binary chunk table object (see save_chunk_table).  Run in the
+    background, so write failures (e.g. for a read-only bucket) are logged and
+    the dataset keeps its inline chunk table.  The dataset json is only
+    replaced if it hasn't been modified in the meantime.
+    """
+    meta_cache = app["meta_cache"]
+    pending_s3_write = app["pending_s3_write"]
+    s3key = getS3Key(dset_id)
+
+    def isUnchanged(dset_json):
+        if dset_id not in meta_cache or meta_cache.isDirty(dset_id):
+            return False
+        return meta_cache[dset_id] is dset_json and s3key not in pending_s3_write
+
+    if dset_id not in meta_cache:
+        return
+    dset_json = meta_cache[dset_id]
+    if not isUnchanged(dset_json):
+        return
+    # work on a copy so the cached layout is unchanged until both writes are done
+    migrated_json = dict(dset_json)
+    migrated_json["layout"] = dict(dset_json["layout"])
+    try:
+        if not await save_chunk_table(app, dset_id, migrated_json, bucket=bucket):
+            return
+        if not isUnchanged(dset_json):
+            log.info(f"migrate_chunk_table - {dset_id} changed while the chunk table was written, not migrated")
+            return
+        # keep s3sync from writing the dataset until this write is done
+        pending_s3_write[s3key] = time.time()
+        try:
+            await putStorJSONObj(app, s3key, migrated_json, bucket=bucket)
+        finally:
+            del pending_s3_write[s3key]
+    except HTTPException as he:
+        log.warn(f"migrate_chunk_table - unable to migrate chunk table for {dset_id}: {he}")
+        return
+    if meta_cache.isDirty(dset_id) or dset_id not in meta_cache or meta_cache[dset_id] is not dset_json:
+        log.info(f"migrate_chunk_table - {dset_id} changed while it was written")
+    else:
+        meta_cache[dset_id] = migrated_json
+    log.info(f"migrated chunk table for {dset_id}")
+
+
 async def save_metadata_obj(app, obj_id, obj_json, bucket=None, notify=False, flush=False):
     """ Persist the given object """
     log.info(f"save_metadata_obj {obj_id} bucket={bucket} notify={notify} flush={flush}")
@@ -280,6 +368,12 @@ async def delete_metadata_obj(app, obj_id, notify=True, root_id=None, bucket=Non
     else:
         log.info(f"delete_metadata_obj - key {s3key} not found (never written)?")
 
+    if isValidUuid(obj_id, "Dataset") and isSchema2Id(obj_id):
+        # remove binary chunk table (if any)
+        s3key = getChunkTableKey(obj_id)
+        if await isStorObj(app, s3key, bucket=bucket):
+            await deleteStorObj(app, s3key, bucket=bucket)
+
     if isValidUuid(obj_id) and isSchema2Id(obj_id):
         if isRootObjId(obj_id):
             # add to gc ids so sub-objects will be deleted
@@ -293,11 +387,88 @@ async def delete_metadata_obj(app, obj_id, notify=True, root_id=None, bucket=Non
 
     log.debug(f"delete_metadata_obj for {obj_id} done")
 
+async def get_chunk_range(app, dset_json, chunk_range):
+    """ Read a range of bytes holding several linked chunks (as planned by
+    getChunkRanges) with one storage request and add the chunks to the cache.
+    Returns the number of chunks added.
+    """
+    chunk_cache = app['chunk_cache']
+    chunks = [item for item in chunk_range["chunks"] if item[0] not in chunk_cache]
+    if not chunks:
+        log.debug("get_chunk_range - all chunks already in cache")
+        return 0
+    dims = getChunkLayout(dset_json)
+    dt = createDataType(dset_json["type"])
+    deflate_level = getDeflateLevel(dset_json)
+    shuffle = getShuffleSize(dset_json)
+    s3path = chunk_range["s3path"]
+    s3offset = chunk_range["s3offset"]
+    s3size = chunk_range["s3size"]
+    bucket, s3key = splitS3Path(s3path)
+    log.info(f"get_chunk_range - reading {len(chunks)} chunks from {s3path} offset: {s3offset} size: {s3size}")
+
+    # read raw bytes, each chunk is uncompressed separately
+    range_bytes = await getStorBytes(app, s3key, offset=s3offset, length=s3size, bucket=bucket)
+    if range_bytes is None or len(range_bytes) < s3size:
+        log.warn(f"get_chunk_range - expected {s3size} bytes from {s3path}")
+        return 0
+    count = 0
+    for chunk_id, offset, size in chunks:
+        if chunk_id in chunk_cache:
+            continue  # read by some other request meanwhile
+        chunk_bytes = decodeStorBytes(range_bytes[offset:(offset+size)], shuffle=shuffle, deflate_level=deflate_level, key=s3key)
+        chunk_arr = bytesToArray(chunk_bytes, dt, dims)
+        if chunk_cache.memTarget - chunk_cache.memDirty < chunk_arr.size:
+            log.warn(f"get_chunk_range - no room in cache for {chunk_id}")
+            break
+        chunk_cache[chunk_id] = chunk_arr
+        count += 1
+    return count
+
+async def _get_chunk_selection(app, chunk_id, dset_json, bucket, s3key, s3offset, s3size, select=None, points=None):
+    """ Read just the byte ranges of an uncompressed linked chunk that cover the
+    given selection or points.  Returns a chunk array where only the selected
+    elements are valid, or None if the chunk should be read in full.
+    """
+    dims = getChunkLayout(dset_json)
+    dt = createDataType(dset_json["type"])
+    if getDeflateLevel(dset_json) is not None or isShuffle(dset_json) or dt.hasobject:
+        return None
+    if s3size != np.prod(dims) * dt.itemsize:
+        log.debug(f"s3size: {s3size} doesn't match chunk dims for {chunk_id}, reading full chunk")
+        return None
+    max_gap = int(config.get("chunk_range_gap"))
+    ranges = getChunkByteRanges(dims, dt.itemsize, selection=select, points=points, max_gap=max_gap)
+    # count each extra request as max_gap bytes read
+    read_cost = sum(size for offset, size in ranges) + len(ranges) * max_gap
+    if read_cost >= s3size:
+        log.debug(f"dense selection for {chunk_id}, reading full chunk")
+        return None
+    log.info(f"reading {len(ranges)} byte ranges of {s3size} byte chunk: {chunk_id}")
+
+    buffer = bytearray(s3size)
+
+    async def read_range(offset, size):
+        data = await getStorBytes(app, s3key, offset=(s3offset + offset), length=size, bucket=bucket)
+        if data is None or len(data) != size:
+            log.error(f"expected {size} bytes for range read of {s3key}")
+            raise HTTPInternalServerError()
+        buffer[offset:(offset+size)] = data
+
+    await asyncio.gather(*[read_range(offset, size) for offset, size in ranges])
+    return bytesToArray(buffer, dt, dims)
+
 """
 Utility method for GET_Chunk, PUT_Chunk, and POST_CHunk
 Get a numpy array for the chunk (possibly initizaling a new chunk if requested)
 """
-async def get_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset=0, s3size=0, chunk_init=False):
+async def get_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset=0, s3size=0, chunk_init=False, select=None, points=None):
+    """ Return the chunk array from the cache or storage.
+    For uncompressed linked chunks that aren't cached, select (chunk-relative
+    slices) or points can be given to read only the bytes that cover them.
+    In that case the returned array isn't cached and only the selected elements
+    are valid.
+    """
     # if the chunk cache has too many dirty items, wait till items get flushed to S3
     MAX_WAIT_TIME = 10.0  # TBD - make this a config
     chunk_cache = app['chunk_cache']
@@ -316,21 +487,16 @@ async def get_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset
     # and shuffle then deflate on write
     # also note - get deflate and shuffle will update the deflate and shuffle map so that the s3sync will do the right thing
     deflate_level = getDeflateLevel(dset_json)
-    shuffle = isShuffle(dset_json)
+    shuffle = getShuffleSize(dset_json)
     s3key = None
+    if deflate_level is not None and not s3path and "deflate_map" in app and config.get("dn_chunk_deflate"):
+        # shuffle and compress the chunk when it's written
+        app["deflate_map"][getDatasetId(chunk_id)] = deflate_level
+        if shuffle:
+            app["shuffle_map"][getDatasetId(chunk_id)] = shuffle
 
     if s3path:
-        if s3path.startswith("s3://"):
-            # trim off the s3:// if found
-            path = s3path[5:]
-        else:
-            path = s3path
-        index = path.find('/')   # split bucket and key
-        if index < 1:
-            log.error(f"s3path is invalid: {s3path}")
-            raise HTTPInternalServerError()
-        bucket = path[:index]
-        s3key = path[(index+1):]
+        bucket, s3key = splitS3Path(s3path)
         log.debug(f"Using s3path bucket: {bucket} and  s3key: {s3key}")
     else:
         s3key = getS3Key(chunk_id)
@@ -346,6 +512,11 @@ async def get_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset
         if obj_exists:
             pending_s3_read = app["pending_s3_read"]
 
+            if s3path and (select is not None or points is not None) and chunk_id not in pending_s3_read:
+                chunk_arr = await _get_chunk_selection(app, chunk_id, dset_json, bucket, s3key, s3offset, s3size, select=select, points=points)
+                if chunk_arr is not None:
+                    return chunk_arr
+
             if chunk_id in pending_s3_read:
                 # already a read in progress, wait for it to complete
                 read_start_time = pending_s3_read[chunk_id]
@@ -365,7 +536,13 @@ async def get_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset
                     pending_s3_read[chunk_id] = time.time()
                 log.debug(f"Reading chunk {s3key} from S3")
 
-                chunk_bytes = await getStorBytes(app, s3key, shuffle=shuffle, deflate_level=deflate_level, offset=s3offset, length=s3size, bucket=bucket)
+                if s3path:
+                    chunk_bytes = await getStorBytes(app, s3key, shuffle=shuffle, deflate_level=deflate_level, offset=s3offset, length=s3size, bucket=bucket)
+                else:
+                    chunk_bytes = await getStorBytes(app, s3key, bucket=bucket)
+                    if deflate_level is not None and isDeflated(chunk_bytes):
+                        # written with the dataset's filters (see dn_chunk_deflate)
+                        chunk_bytes = decodeStorBytes(chunk_bytes, shuffle=shuffle, deflate_level=deflate_level, key=s3key)
                 if chunk_id in pending_s3_read:
                     # read complete - remove from pending map
                     elapsed_time = time.time() - pending_s3_read[chunk_id]
@@ -406,6 +583,79 @@ async def get_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset
             chunk_cache[chunk_id] = chunk_arr  # store in cache
     return chunk_arr
 
+def _get_stored_filters(dset_json, shuffle):
+    """ Return the dataset filters a chunk's bytes were encoded with, in the
+    order they were applied: shuffle (if shuffle is set) then deflate.
+    """
+    filters = []
+    for item in getFilters(dset_json):
+        filter_class = item.get("class")
+        if filter_class == "H5Z_FILTER_SHUFFLE" and shuffle:
+            filters.insert(0, item)
+        elif filter_class == "H5Z_FILTER_DEFLATE":
+            filters.append(item)
+    return filters
+
+async def get_chunk_bytes(app, chunk_id, dset_json, bucket=None):
+    """ Return the chunk as stored, i.e. without decoding it, along with the
+    list of filters applied to the bytes (empty if they weren't filtered).
+    Returns (None, None) if the chunk hasn't been written.
+    """
+    chunk_cache = app['chunk_cache']
+    s3key = getS3Key(chunk_id)
+
+    if chunk_id in chunk_cache and chunk_cache.isDirty(chunk_id):
+        # storage may be out of date, encode the cached array as write_s3_obj will
+        deflate_level = app["deflate_map"].get(getDatasetId(chunk_id))
+        if deflate_level is None:
+            return arrayToBytes(chunk_cache[chunk_id]), []
+        shuffle = getShuffleSize(dset_json)
+        chunk_bytes = arrayToBytes(chunk_cache[chunk_id])
+        chunk_bytes = encodeStorBytes(chunk_bytes, shuffle=shuffle, deflate_level=deflate_level, key=s3key)
+        if not isDeflated(chunk_bytes):
+            log.warn(f"unable to encode chunk {chunk_id}, returning raw bytes")
+            return arrayToBytes(chunk_cache[chunk_id]), []
+        return chunk_bytes, _get_stored_filters(dset_json, shuffle)
+
+    if not await isStorObj(app, s3key, bucket=bucket):
+        log.debug(f"Chunk {chunk_id} not found")
+        return None, None
+
+    chunk_bytes = await getStorBytes(app, s3key, bucket=bucket)
+    if getDeflateLevel(dset_json) is None or not isDeflated(chunk_bytes):
+        # written without the dataset's filters (see dn_chunk_deflate)
+        log.debug(f"chunk {chunk_id} is stored unfiltered")
+        return chunk_bytes, []
+    return chunk_bytes, _get_stored_filters(dset_json, getShuffleSize(dset_json))
+
+async def put_chunk_bytes(app, chunk_id, chunk_bytes, bucket=None):
+    """ Store bytes for the whole chunk that have already been filtered as
+    the dataset's chunks are.  The bytes are written as is, and any cached
+    copy of the chunk is dropped so that it is decoded from storage when
+    next read.
+    """
+    s3key = getS3Key(chunk_id)
+    if s3key in app["pending_s3_write"]:
+        log.warn(f"put_chunk_bytes - write in progress for {chunk_id}, returning 503")
+        raise HTTPServiceUnavailable()
+    chunk_cache = app['chunk_cache']
+    dirty_ids = app["dirty_ids"]
+    if chunk_id in dirty_ids:
+        # pending updates are replaced by the new chunk
+        log.info(f"put_chunk_bytes - discarding pending updates for {chunk_id}")
+        del dirty_ids[chunk_id]
+    if chunk_id in chunk_cache:
+        if chunk_cache.isDirty(chunk_id):
+            chunk_cache.clearDirty(chunk_id)
+        del chunk_cache[chunk_id]
+
+    await putStorBytes(app, s3key, chunk_bytes, bucket=bucket)
+
+    if chunk_id in chunk_cache and not chunk_cache.isDirty(chunk_id):
+        # read from storage while the write was in progress
+        del chunk_cache[chunk_id]
+    await invalidate_replicas(app, chunk_id)
+
 """
 Mark the given chunk as dirty to write to storage
 """
@@ -692,3 +942,239 @@ async def s3syncCheck(app):
         else:
             log.info(f"s3syncCheck no objects to write, sleeping for {long_sleep}")
             await asyncio.sleep(long_sleep)
+
+
+async def flush_dirty(app, timeout):
+    """ Write dirty objects to storage, waiting up to timeout seconds for
+    all of them to be written.  Returns True if no dirty objects remain.
+    """
+    start_time = time.time()
+    dirty_ids = app["dirty_ids"]
+    while dirty_ids and time.time() - start_time < timeout:
+        await s3sync(app)
+        await asyncio.sleep(0.1)
+    if dirty_ids:
+        log.warn(f"flush_dirty - {len(dirty_ids)} objects still dirty after {timeout} seconds")
+        return False
+    return True
+
+
+def getHandoffItems(app, dn_urls, node_number):
+    """ Remove the clean cache entries this node won't own with the given
+    data node urls (map of node number to url) and node number (-1 if this
+    node is leaving).  Returns a list of (node_number, obj_id, data) for the
+    entries to be handed to their new owners, metadata first and then most recently
+    used chunks, up to cache_handoff_max_bytes.
+    """
+    node_count = len(dn_urls)
+    old_count = len(app["dn_urls"])
+    max_bytes = config.get("cache_handoff_max_bytes")
+    handoff_items = []
+    handoff_bytes = 0
+    for cache_name in ("meta_cache", "chunk_cache"):
+        cache = app[cache_name]
+        for obj_id in list(cache):  # most recently used first
+            if cache.isDirty(obj_id):
+                continue
+            if node_count > 0:
+                new_number = getObjPartition(obj_id, node_count)
+            else:
+                new_number = -1
+            if new_number == node_number:
+                continue  # still ours
+            data = cache[obj_id]
+            del cache[obj_id]
+            if old_count == 0 or getObjPartition(obj_id, old_count) != app["node_number"]:
+                # not ours now (e.g. a replica or another node's dataset json)
+                # so may be out of date
+                continue
+            if new_number not in dn_urls:
+                continue
+            if cache_name == "chunk_cache":
+                if data.dtype.hasobject:
+                    continue  # vlen chunks aren't handed off
+                nbytes = data.nbytes
+            else:
+                nbytes = 1024  # same estimate as the meta cache
+            if handoff_bytes + nbytes > max_bytes:
+                continue
+            handoff_bytes += nbytes
+            handoff_items.append((new_number, obj_id, data))
+    log.info(f"getHandoffItems - {len(handoff_items)} items, {handoff_bytes} bytes to hand off")
+    return handoff_items
+
+
+async def handoff_cache(app, dn_urls, handoff_items):
+    """ Send cache entries from getHandoffItems to their new owners in
+    dn_urls, giving up after cache_handoff_timeout seconds.  Returns the
+    number of entries accepted.
+    """
+    MAX_HANDOFF_TASKS = 8
+    timeout = config.get("cache_handoff_timeout")
+    item_iter = iter(handoff_items)
+    counts = {"sent": 0, "rejected": 0}
+
+    async def worker():
+        for node_number, obj_id, data in item_iter:
+            url = dn_urls[node_number]
+            req = url + "/cachehandoff"
+            # let the new owner accept the entry before it has seen the
+            # membership change
+            params = {"id": obj_id, "node_count": len(dn_urls), "node_number": node_number}
+            try:
+                if isinstance(data, np.ndarray):
+                    buffer = io.BytesIO()
+                    np.save(buffer, data, allow_pickle=False)
+                    await http_put_binary(app, req, data=buffer.getvalue(), params=params)
+                else:
+                    await http_put(app, req, data=data, params=params)
+                counts["sent"] += 1
+            except (HTTPConflict, HTTPInternalServerError, HTTPServiceUnavailable) as e:
+                log.info(f"handoff_cache - {obj_id} not accepted by {url}: {e}")
+                counts["rejected"] += 1
+
+    start_time = time.time()
+    workers = [worker() for i in range(min(MAX_HANDOFF_TASKS, len(handoff_items)))]
+    try:
+        await asyncio.wait_for(asyncio.gather(*workers), timeout)
+    except asyncio.TimeoutError:
+        log.warn(f"handoff_cache - timed out after {timeout} seconds")
+    elapsed = time.time() - start_time
+    log.info(f"handoff_cache - sent: {counts['sent']} rejected: {counts['rejected']} of {len(handoff_items)} in {elapsed:.2f}s")
+    return counts["sent"]
+
+
+async def get_replica_chunk(app, chunk_id, dset_json, bucket=None, s3path=None, s3offset=0, s3size=0):
+    """ Return this node's replica of a hot chunk owned by another DN.  If not
+    cached, the whole chunk is fetched from the owner (which may hold changes
+    not yet written to storage) and the owner records this node as holding a
+    replica.  Replicas are dropped when the owner invalidates them, or after
+    hot_chunk_replica_ttl seconds in case the owner has changed.
+    Returns None if the chunk doesn't exist.
+    """
+    if getObjPartition(chunk_id, len(app["dn_urls"])) == app["node_number"]:
+        # the SN's view of membership is out of date, this is our chunk
+        return await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size, chunk_init=False)
+    chunk_cache = app["chunk_cache"]
+    replica_ids = app["replica_ids"]
+    if chunk_id in replica_ids:
+        if chunk_id in chunk_cache and time.time() - replica_ids[chunk_id] < config.get("hot_chunk_replica_ttl"):
+            return chunk_cache[chunk_id]
+        # expired or evicted
+        del replica_ids[chunk_id]
+        if chunk_id in chunk_cache and not chunk_cache.isDirty(chunk_id):
+            del chunk_cache[chunk_id]
+
+    req = getDataNodeUrl(app, chunk_id) + "/chunks/" + chunk_id
+    params = {"replica_url": app["dn_urls"][app["node_number"]]}
+    if s3path:
+        params["s3path"] = s3path
+        params["s3offset"] = s3offset
+        params["s3size"] = s3size
+    elif bucket:
+        params["bucket"] = bucket
+    log.debug(f"get_replica_chunk - fetching {chunk_id} from {req}")
+    start_time = time.time()
+    try:
+        data = await http_get(app, req, params=params, format="binary")
+    except HTTPNotFound:
+        log.debug(f"get_replica_chunk - {chunk_id} not found")
+        return None
+    dt = createDataType(dset_json["type"])
+    chunk_arr = bytesToArray(data, dt, getChunkLayout(dset_json))
+    invalidate_time = app["replica_invalidations"].get(chunk_id)
+    if invalidate_time is None or invalidate_time < start_time:
+        if chunk_id in chunk_cache and not chunk_cache.isDirty(chunk_id):
+            del chunk_cache[chunk_id]  # left from when this node owned the chunk
+        if chunk_id not in chunk_cache:
+            chunk_cache[chunk_id] = chunk_arr
+            replica_ids[chunk_id] = start_time
+    else:
+        # chunk was written while we were fetching it
+        log.info(f"get_replica_chunk - not caching {chunk_id} invalidated during fetch")
+    return chunk_arr
+
+
+def add_replica(app, chunk_id, replica_url):
+    """ Record that the DN at replica_url is fetching a replica of the chunk.
+    Entries are kept in the order they were last updated and dropped once
+    older than hot_chunk_replica_ttl, since the replica DN will have expired
+    its copy by then.
+    """
+    now = time.time()
+    ttl = config.get("hot_chunk_replica_ttl")
+    chunk_replicas = app["chunk_replicas"]
+    replica_urls = chunk_replicas.pop(chunk_id, {})
+    replica_urls[replica_url] = now
+    chunk_replicas[chunk_id] = replica_urls  # move to end
+    while chunk_replicas:
+        oldest_id = next(iter(chunk_replicas))
+        if now - max(chunk_replicas[oldest_id].values()) < ttl:
+            break
+        del chunk_replicas[oldest_id]
+
+
+async def invalidate_replicas(app, chunk_id):
+    """ Tell DNs holding replicas of the chunk to drop them.  Called by the
+    owning DN after the chunk is modified.
+    """
+    chunk_replicas = app["chunk_replicas"]
+    if chunk_id not in chunk_replicas:
+        return
+    now = time.time()
+    ttl = config.get("hot_chunk_replica_ttl")
+    replica_times = chunk_replicas.pop(chunk_id)
+    replica_urls = [url for url in replica_times if now - replica_times[url] < ttl]
+    if not replica_urls:
+        return
+    log.info(f"invalidate_replicas - {chunk_id} on {len(replica_urls)} nodes")
+    reqs = [http_delete(app, url + "/replicas/" + chunk_id) for url in replica_urls]
+    results = await asyncio.gather(*reqs, return_exceptions=True)
+    for url, result in zip(replica_urls, results):
+        if isinstance(result, Exception):
+            log.warn(f"invalidate_replicas - failed for {chunk_id} on {url}: {result}")
+
+
+def _checkLocalRequest(app, chunk_id, method):
+    """ Checks done by log.request and the handlers for HTTP requests """
+    if app["node_state"] != "READY":
+        log.warn(f"returning 503 - node_state: {app['node_state']}")
+        raise HTTPServiceUnavailable()
+    app["req_count"][method] += 1
+    validateInPartition(app, chunk_id)
+
+async def read_chunk_selection(app, chunk_id, selection, bucket=None, s3path=None, s3offset=0, s3size=0):
+    """ Return an array of the selected data of the chunk, or None if the
+    chunk doesn't exist.  For SN reads from a DN in the same process (the
+    standalone app) - the equivalent of GET_Chunk without the HTTP request.
+    The array may be a view of the cached chunk, so should be copied by
+    the caller before yielding to other tasks.
+    """
+    log.info(f"read_chunk_selection - chunk_id: {chunk_id}, selection: {selection}")
+    _checkLocalRequest(app, chunk_id, "GET")
+    dset_id = getDatasetId(chunk_id)
+    dset_json = await get_metadata_obj(app, dset_id, bucket=bucket)
+    chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, s3path=s3path, s3offset=s3offset, s3size=s3size,
+        chunk_init=False, select=selection)
+    if chunk_arr is None:
+        return None
+    return chunkReadSelection(chunk_arr, slices=selection)
+
+async def write_chunk_selection(app, chunk_id, selection, input_arr, bucket=None):
+    """ Write the array to the selection of the chunk and return True if it
+    changed the chunk.  For SN writes to a DN in the same process (the
+    standalone app) - the equivalent of PUT_Chunk without the HTTP request.
+    """
+    log.info(f"write_chunk_selection - chunk_id: {chunk_id}, selection: {selection}")
+    _checkLocalRequest(app, chunk_id, "PUT")
+    dset_id = getDatasetId(chunk_id)
+    dset_json = await get_metadata_obj(app, dset_id, bucket=bucket)
+    chunk_arr = await get_chunk(app, chunk_id, dset_json, bucket=bucket, chunk_init=True)
+    if chunk_arr is None:
+        log.error("failed to create numpy array")
+        raise HTTPInternalServerError()
+    is_dirty = chunkWriteSelection(chunk_arr=chunk_arr, slices=selection, data=input_arr)
+    if is_dirty:
+        save_chunk(app, chunk_id, bucket=bucket)
+        await invalidate_replicas(app, chunk_id)
+    return is_dirty
@@ -690,7 +690,6 @@ async def doFlush(app, root_id, bucket=None):
     params = {"flush": 1}
     if bucket:
         params["bucket"] = bucket
-    client = get_http_client(app)
     dn_urls = getDataNodeUrls(app)
     log.debug(f"doFlush - dn_urls: {dn_urls}")
     failed_count = 0
@@ -699,6 +698,7 @@ async def doFlush(app, root_id, bucket=None):
         tasks = []
         for dn_url in dn_urls:
             req = dn_url + "/groups/" + root_id
+            client = get_http_client(app, url=req)
             task = asyncio.ensure_future(client.put(req, params=params))
             tasks.append(task)
         done, pending = await asyncio.wait(tasks)
@@ -19,7 +19,7 @@ from aiohttp.web import json_response
 
 
 from .util.idUtil import isValidUuid, validateUuid
-from .datanode_lib import get_obj_id, check_metadata_obj, get_metadata_obj, save_metadata_obj, delete_metadata_obj
+from .datanode_lib import get_obj_id, check_metadata_obj, get_metadata_obj, save_metadata_obj, delete_metadata_obj, save_chunk_table
 from . import hsds_logger as log
 
 
@@ -129,6 +129,7 @@ async def POST_Dataset(request):
         dset_json["creationProperties"] = body["creationProperties"]
     if layout is not None:
         dset_json["layout"] = layout
+        await save_chunk_table(app, dset_id, dset_json, bucket=bucket)
 
     await save_metadata_obj(app, dset_id, dset_json, bucket=bucket, notify=True, flush=True)
 
@@ -28,6 +28,7 @@ from .util.authUtil import getUserPasswordFromRequest, aclCheck, validateUserPas
 from .util.domainUtil import  getDomainFromRequest, isValidDomain, getBucketForDomain, getPathForDomain
 from .util.hdf5dtype import validateTypeItem, createDataType, getBaseTypeJson, getItemSize
 from .servicenode_lib import getDomainJson, getObjectJson, validateAction, getObjectIdByPath, getPathForObjectId, getRootInfo
+from .chunk_sn import getChunkRefLayout
 from . import config
 from . import hsds_logger as log
 
@@ -293,7 +294,11 @@ async def GET_Dataset(request):
         resp_json["creationProperties"] = {}
 
     if "layout" in dset_json:
-        resp_json["layout"] = dset_json["layout"]
+        layout = dset_json["layout"]
+        if layout.get("class") == 'H5D_CHUNKED_REF' and "chunk_count" in layout:
+            # chunk table is kept in a binary object
+            layout = await getChunkRefLayout(app, dset_json, bucket=bucket)
+        resp_json["layout"] = layout
     resp_json["attributeCount"] = dset_json["attributeCount"]
     resp_json["created"] = dset_json["created"]
     resp_json["lastModified"] = dset_json["lastModified"]
@@ -18,7 +18,7 @@ import json
 import time
 
 from aiohttp.web import Application, StreamResponse, run_app, json_response
-from aiohttp.web_exceptions import HTTPBadRequest, HTTPServiceUnavailable, HTTPNotFound, HTTPException
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPException
 
 from asyncio import TimeoutError
 
@@ -32,6 +32,83 @@ from .util import query_marathon as marathonClient
 NODE_STAT_KEYS = ("cpu", "diskio", "memory", "log_stats", "disk", "netio",
     "req_count", "s3_stats", "azure_stats", "chunk_cache_stats")
 
+async def checkNode(app, node):
+    """ Send an info request to the node and return True if it responded as expected.
+    Nodes that are replaced by another process have their slot freed.
+    """
+    if node["host"] is None:
+        log.warn("Node found with missing host information.")
+        return False
+    url = getUrl(node["host"], node["port"]) + "/info"
+    timeout = config.get("head_health_check_timeout")
+    try:
+        # don't let one unresponsive node hold up the check of the others
+        rsp_json = await asyncio.wait_for(http_get(app, url), timeout)
+    except OSError as ose:
+        log.warn("OSError for req: {}: {}".format(url, str(ose)))
+        node["failcount"] += 1
+        return False
+    except TimeoutError as toe:
+        log.warn("TimeoutError for req: {}: {}".format(url, str(toe)))
+        node["failcount"] += 1
+        return False
+    except HTTPException as he:
+        log.warn("HTTPException error for req: {}: {}".format(url, str(he)))
+        node["failcount"] += 1
+        return False
+    except Exception as e:
+        log.warn("Exception for healthcheck: {}: {}".format(url, str(e)))
+        node["failcount"] += 1
+        return False
+
+    if "node" not in rsp_json:
+        log.error("Unexpected response from node")
+        return False
+    node_state = rsp_json["node"]
+    node_id = node_state["id"]
+
+    if node_id != node['id']:
+        log.warn("unexpected node_id: {} (expecting: {})".format(node_id, node['id']))
+        node['host'] = None
+        node['id'] = None
+        return False
+
+    if 'number' in node_state and node_state['number'] != node['node_number']:
+        msg = "unexpected node_number got {} (expecting: {})"
+        log.warn(msg.format(node_state["number"], node['node_number']))
+        node['host'] = None
+        node['id'] = None
+        return False
+
+    # save off other useful info from the node
+    app_node_stats = app["node_stats"]
+    node_stats = {}
+    for k in NODE_STAT_KEYS:
+        if k in rsp_json:
+            node_stats[k] = rsp_json[k]
+    app_node_stats[node_id] = node_stats
+    # mark the last time we got a response from this node
+    node["healthcheck"] = unixTimeToUTC(int(time.time()))
+    node["failcount"] = 0 # rest
+    return True
+
+def updateMembershipEpoch(app):
+    """ Bump the membership epoch if the cluster state or set of registered
+    nodes has changed since the last call, and wake up nodestate requests
+    waiting on the old epoch.
+    """
+    membership = [app["cluster_state"],]
+    for node in app["nodes"]:
+        membership.append((node["node_type"], node["node_number"], node["host"], node["port"], node["id"]))
+    if membership == app["membership"]:
+        return
+    app["membership"] = membership
+    app["membership_epoch"] += 1
+    log.info(f"membership epoch: {app['membership_epoch']}, cluster_state: {app['cluster_state']}")
+    if "membership_event" in app:
+        app["membership_event"].set()
+    app["membership_event"] = asyncio.Event()
+
 async def healthCheck(app):
     """ Periodic method that pings each active node and verifies it is still healthy.
     If node doesn't respond, free up the node slot (the node can re-register if it comes back)'.
@@ -50,123 +127,30 @@ async def healthCheck(app):
         now = int(time.time())
         log.info("health check {}, cluster_state: {}, node_count: {}".format(unixTimeToUTC(now), app["cluster_state"], len(nodes)))
 
-        fail_count = 0
-        # keep track of where we are in the global node list for possible deletions
-        node_seq_num = -1
         HEALTH_CHECK_RETRY_COUNT = 1 # times to try before calling a node dead
-        #TODO note that this fail_count actually applies to any node.  Should the fail count be a hash of node_ids to a fail count?
-        for node in nodes:
-            node_seq_num += 1
-            if node["host"] is None:
-                fail_count += 1
-                log.warn("Node found with missing host information.")
+        # probe all the nodes at once so a check takes one timeout at most
+        check_nodes = list(nodes)
+        results = await asyncio.gather(*[checkNode(app, node) for node in check_nodes])
+
+        fail_count = 0
+        removed_nodes = []
+        for node, ok in zip(check_nodes, results):
+            if ok:
                 continue
-            url = getUrl(node["host"], node["port"]) + "/info"
-            try:
-                rsp_json = await http_get(app, url)
-                if "node" not in rsp_json:
-                    log.error("Unexpected response from node")
-                    fail_count += 1
-                    continue
-                node_state = rsp_json["node"]
-                node_id = node_state["id"]
-
-                if node_id != node['id']:
-                    log.warn("unexpected node_id: {} (expecting: {})".format(node_id, node['id']))
-                    node['host'] = None
-                    node['id'] = None
-                    fail_count += 1
-                    continue
-
-                if 'number' in node_state and node_state['number'] != node['node_number']:
-                    msg = "unexpected node_number got {} (expecting: {})"
-                    log.warn(msg.format(node_state["number"], node['node_number']))
-                    node['host'] = None
-                    node['id'] = None
-                    fail_count += 1
-                    continue
-
-                # save off other useful info from the node
-                app_node_stats = app["node_stats"]
-                node_stats = {}
-                for k in NODE_STAT_KEYS:
-                    if k in rsp_json:
-                        node_stats[k] = rsp_json[k]
-                app_node_stats[node_id] = node_stats
-                # mark the last time we got a response from this node
-                node["healthcheck"] = unixTimeToUTC(int(time.time()))
-                node["failcount"] = 0 # rest
-            except OSError as ose:
-                log.warn("OSError for req: {}: {}".format(url, str(ose)))
-                # node has gone away?
-                node["failcount"] += 1
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("node {}:{} not responding".format(node["host"], node["port"]))
-                    fail_count += 1
-            except TimeoutError as toe:
-                log.warn("TimeoutError for req: {}: {}".format(url, str(toe)))
-                # node has gone away?
-                node["failcount"] += 1
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("node {}:{} not responding".format(node["host"], node["port"]))
-                    fail_count += 1
-            except Exception as e:
-                log.warn("Exception for healthcheck: {}: {}".format(url, str(e)))
-                # node has gone away?
-                node["failcount"] += 1
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("removing {}:{} from active list".format(node["host"], node["port"]))
-                    node["host"] = None  # make slow available for new registrations
-                    fail_count += 1
-            except HTTPServiceUnavailable as hsu:
-                log.warn("HTTPServiceUnavailable error for req: {}: {}".format(url, str(hsu)))
-                # node has gone away?
-                node["failcount"] += 1
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("removing {}:{} from active list".format(node["host"], node["port"]))
-                    fail_count += 1
-            except HTTPNotFound as hnf:
-                log.warn("HTTPException error for req: {}: {}".format(url, str(hnf)))
-                # node has gone away?
-                node["failcount"] += 1
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("removing {}:{} from active list".format(node["host"], node["port"]))
-                    fail_count += 1
-            except HTTPException as he:
-                log.warn("HTTPException error for req: {}: {}".format(url, str(he)))
-                # node has gone away?
-                node["failcount"] += 1
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("removing {}:{} from active list".format(node["host"], node["port"]))
-                    fail_count += 1
-            except:
-                log.warn("Unknown exception caught")
-            finally:
-                if node["failcount"] >= HEALTH_CHECK_RETRY_COUNT:
-                    log.warn("Forgetting about node {}:{} due to too many failures.".format(node['host'], node['port']))
-                    node['host'] = None
-                    node['id'] = None
-                    if node['node_type'] == "dn":
-                        log.warn("Removed a DN")
-                        del app['nodes'][node_seq_num]
-                        del node
-                        # best to just break to avoid weird modified loop variable behavior
-                        break
-                    elif node['node_type'] == "sn":
-                        log.warn("Removed a SN")
-                        del app['nodes'][node_seq_num]
-                        del node
-                        # best to just break to avoid weird modified loop variable behavior
-                        break
-                    else:
-                        log.warn("Lost a node that wasn't a dn or sn, no action taken")
-                    #We've handled this particular loop's failed node
-                    fail_count -= 1
-                    # check to see if the cluster is in the process of scaling down and reached its target
-                    log.debug(f"After node removal, checking to see if we can go ready fail_count is {fail_count}, app['cluster_state'] is {app['cluster_state']}, app['target_dn_count'] is {app['target_dn_count']}, getTargetNodeCount(app, 'dn') is {await getTargetNodeCount(app, 'dn')}, getActiveNodeCount(app, 'dn') is {getActiveNodeCount(app, 'dn')}, getTargetNodeCount(app, 'sn') is {await getTargetNodeCount(app, 'sn')}, app['target_sn_count'] is {app['target_sn_count']}, getActiveNodeCount(app, 'sn') is {getActiveNodeCount(app, 'sn')}")
-                    if fail_count == 0 and app["cluster_state"] != "READY" and app['target_dn_count'] == getActiveNodeCount(app, "dn") and app['target_sn_count'] == getActiveNodeCount(app, "sn"):
-                        log.info("All nodes healthy at new cluster size, changing cluster state to READY")
-                        app["cluster_state"] = "READY"
+            fail_count += 1
+            if node.get("failcount", 0) < HEALTH_CHECK_RETRY_COUNT:
+                continue
+            log.warn("Forgetting about node {}:{} due to too many failures.".format(node['host'], node['port']))
+            node['host'] = None
+            node['id'] = None
+            if node['node_type'] in ("dn", "sn"):
+                log.warn(f"Removed a {node['node_type'].upper()}")
+                removed_nodes.append(node)
+            else:
+                log.warn("Lost a node that wasn't a dn or sn, no action taken")
+                fail_count -= 1
+        if removed_nodes:
+            nodes[:] = [node for node in nodes if not any(node is removed for removed in removed_nodes)]
 
         log.info("node health check fail_count: {}".format(fail_count))
 
@@ -179,7 +163,7 @@ async def healthCheck(app):
             log.info("All nodes healthy, changing cluster state to READY")
             app["cluster_state"] = "READY"
         #else: all is well
-
+        updateMembershipEpoch(app)
 
 
 async def info(request):
@@ -273,6 +257,7 @@ async def register(request):
                     node['id'] =   body["id"]
                     node['connected'] = unixTimeToUTC(int(time.time()))
                     node['failcount'] = 0
+                    node['socket'] = body.get("socket")
                     ret_node = node
                     node_ids[body["id"]] = ret_node
                     replacedNode = True
@@ -284,7 +269,8 @@ async def register(request):
                     "port": body['port'],
                     "id": body['id'],
                     "connected": unixTimeToUTC(int(time.time())),
-                    "failcount": 0}
+                    "failcount": 0,
+                    "socket": body.get("socket")}
                 log.debug(f"Added node node_type {node['node_type']} host {node['host']} port {node['port']} id {node['id']} connected {node['connected']} failcount {node['failcount']}")
                 nodes.append(node)
                 ret_node = node
@@ -313,6 +299,7 @@ async def register(request):
 
     #answer["node_count"] = app["target_dn_count"]
     answer["node_count"] = await getTargetNodeCount(app, body['node_type'])
+    updateMembershipEpoch(app)
 
     resp = json_response(answer)
     log.response(request, resp=resp)
@@ -336,7 +323,31 @@ async def nodestate(request):
     resp = StreamResponse()
     resp.headers['Content-Type'] = 'application/json'
 
+    params = request.rel_url.query
+    epoch = None
     if node_number == '*':
+        updateMembershipEpoch(app)
+    if node_number == '*' and "epoch" in params:
+        # caller already has the node list for this epoch - wait for a
+        # change (up to wait seconds) rather than have it poll
+        try:
+            epoch = int(params["epoch"])
+            wait = float(params.get("wait", 0))
+        except ValueError:
+            msg = "invalid epoch or wait param"
+            log.response(request, code=400, message=msg)
+            raise HTTPBadRequest(reason=msg)
+        if epoch == app["membership_epoch"] and wait > 0:
+            wait = min(wait, config.get("timeout") / 2)
+            try:
+                await asyncio.wait_for(app["membership_event"].wait(), wait)
+            except TimeoutError:
+                log.debug(f"nodestate - no change from epoch {epoch}")
+
+    if epoch is not None and epoch == app["membership_epoch"]:
+        # unchanged, leave out the node list
+        answer = {}
+    elif node_number == '*':
         nodes = []
         for node in app["nodes"]:
             if node["node_type"] == node_type or node_type == "*":
@@ -350,6 +361,8 @@ async def nodestate(request):
                 answer = node
                 break
     answer["cluster_state"] = app["cluster_state"]
+    if node_number == '*':
+        answer["epoch"] = app["membership_epoch"]
     resp = json_response(answer)
     log.response(request, resp=resp)
     return resp
@@ -460,8 +473,9 @@ def init():
     app["id"] = createNodeId("head")
     app["cluster_state"] = "INITIALIZING"
     app["start_time"] = int(time.time())  # seconds after epoch
-    app["target_sn_count"] = int(config.get("target_sn_count"))
-    app["target_dn_count"] = int(config.get("target_dn_count"))
+    # each worker process of an SN or DN container registers as a node
+    app["target_sn_count"] = int(config.get("target_sn_count")) * max(int(config.get("sn_workers")), 1)
+    app["target_dn_count"] = int(config.get("target_dn_count")) * max(int(config.get("dn_workers")), 1)
     log.info("target_sn_count: {}".format(app["target_sn_count"]))
     log.info("target_dn_count: {}".format(app["target_dn_count"]))
 
@@ -496,6 +510,8 @@ def init():
     app["nodes"] = nodes
     app["node_stats"] = {}  # stats retuned by node/info request.  Keyed by node id
     app["node_ids"] = {}  # dictionary to look up node by id
+    app["membership"] = None  # cluster state and node list as of membership_epoch
+    app["membership_epoch"] = -1
     app.router.add_get('/', info)
     app.router.add_get('/nodestate', nodestate)
     app.router.add_get('/nodestate/{nodetype}', nodestate)
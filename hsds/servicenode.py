@@ -13,13 +13,15 @@
 # service node of hsds cluster
 #
 import asyncio
+import os
 
 from aiohttp.web import run_app
 import aiohttp_cors
 from .util.lruCache import LruCache
+from .util.sharedChunkCache import SharedChunkCache
 
 from . import config
-from .basenode import healthCheck,  baseInit
+from .basenode import healthCheck,  baseInit, getWorkerCount, createListenSocket, runWorkers
 from . import hsds_logger as log
 from .util.authUtil import initUserDB
 from .domain_sn import GET_Domain, PUT_Domain, DELETE_Domain, GET_Domains
@@ -31,7 +33,7 @@ from .attr_sn import GET_Attributes, GET_Attribute, PUT_Attribute
 from .attr_sn import DELETE_Attribute, GET_AttributeValue, PUT_AttributeValue
 from .ctype_sn import GET_Datatype, POST_Datatype, DELETE_Datatype
 from .dset_sn import GET_Dataset, POST_Dataset, DELETE_Dataset, GET_DatasetShape, PUT_DatasetShape, GET_DatasetType
-from .chunk_sn import PUT_Value, GET_Value, POST_Value
+from .chunk_sn import PUT_Value, GET_Value, POST_Value, GET_DatasetChunk, PUT_DatasetChunk, getChunkExecutor, getValueCache, getChunkTableCache
 
 
 async def init(loop):
@@ -96,6 +98,8 @@ async def init(loop):
     app.router.add_route('PUT', '/datasets/{id}/value', PUT_Value)
     app.router.add_route('GET', '/datasets/{id}/value', GET_Value)
     app.router.add_route('POST', '/datasets/{id}/value', POST_Value)
+    app.router.add_route('GET', '/datasets/{id}/chunks/{index}', GET_DatasetChunk)
+    app.router.add_route('PUT', '/datasets/{id}/chunks/{index}', PUT_DatasetChunk)
     app.router.add_route('GET', '/datasets/{id}/acls/{username}', GET_ACL)
     app.router.add_route('PUT', '/datasets/{id}/acls/{username}', PUT_ACL)
     app.router.add_route('GET', '/datasets/{id}/acls', GET_ACLs)
@@ -124,10 +128,30 @@ def create_app(loop):
     """
     app = loop.run_until_complete(init(loop))
 
-    metadata_mem_cache_size = int(config.get("metadata_mem_cache_size"))
+    # cache sizes are per container, so split them between the workers
+    workers = getWorkerCount("sn")
+    metadata_mem_cache_size = int(config.get("metadata_mem_cache_size")) // workers
     log.info("Using metadata memory cache size of: {}".format(metadata_mem_cache_size))
     app['meta_cache'] = LruCache(mem_target=metadata_mem_cache_size, chunk_cache=False)
     app['domain_cache'] = LruCache(mem_target=metadata_mem_cache_size, chunk_cache=False)
+    # chunks read directly from storage for read-only domains
+    shared_cache_dir = config.get("sn_shared_chunk_cache_dir")
+    if shared_cache_dir:
+        # one cache for all the workers in the container
+        sn_chunk_cache_size = int(config.get("sn_chunk_cache_size"))
+        group_pid = os.getppid() if workers > 1 else os.getpid()
+        shared_cache_dir = os.path.join(shared_cache_dir, f"hsds_sn_{group_pid}")
+        log.info(f"Using SN shared chunk cache of: {sn_chunk_cache_size} in {shared_cache_dir}")
+        app['chunk_cache'] = SharedChunkCache(shared_cache_dir, mem_target=sn_chunk_cache_size)
+    else:
+        sn_chunk_cache_size = int(config.get("sn_chunk_cache_size")) // workers
+        log.info("Using SN chunk memory cache size of: {}".format(sn_chunk_cache_size))
+        app['chunk_cache'] = LruCache(mem_target=sn_chunk_cache_size, chunk_cache=True)
+    app["pending_s3_read"] = {} # map of s3key to timestamp for in-flight read requests
+    getChunkExecutor(app)  # bounds the number of in-flight DN requests
+    getValueCache(app)  # shares results of identical GET value requests
+    getChunkTableCache(app)  # chunk locations for indirect reference layouts
+    app["dn_load"] = {}  # map of DN urls to time and load last reported by the DN
 
     app['loop'] = loop
     if config.get("allow_noauth"):
@@ -154,14 +178,28 @@ def create_app(loop):
 # Main
 #
 
-def main():
-    log.info("Service node initializing")
+def runWorker(worker):
+    """ Run an SN worker.  With more than one worker, client requests on
+    sn_port are spread over the workers, and each worker also listens on a
+    port of its own (sn_port + 1 + worker) for requests from other nodes.
+    """
     app = create_app(asyncio.get_event_loop())
 
     # run the app
     port = int(config.get("sn_port"))
-    log.info(f"run_app on port: {port}")
-    run_app(app, port=port)
+    if getWorkerCount("sn") == 1:
+        log.info(f"run_app on port: {port}")
+        run_app(app, port=port, path=app["node_socket"])
+        return
+    node_port = port + 1 + worker
+    app["node_port"] = node_port
+    log.info(f"run_app on port: {port} (shared) and {node_port}")
+    socks = [createListenSocket(port, reuse_port=True), createListenSocket(node_port)]
+    run_app(app, sock=socks, path=app["node_socket"])
+
+def main():
+    log.info("Service node initializing")
+    runWorkers("sn", runWorker)
 
 
 if __name__ == '__main__':
@@ -10,9 +10,17 @@
 # request a copy from help@hdfgroup.org.                                     #
 ##############################################################################
 
+import io
+import json
+import re
+import warnings
 import numpy as np
 
 MAX_VLEN_ELEMENT=1000000  # restrict largest vlen element to one million
+JSON_SLAB_SIZE=65536  # max elements converted to python objects at a time by arrayToJson
+_BRACKETS_TO_SPACES=bytes.maketrans(b'[]', b'  ')  # for parsing nested JSON arrays with np.fromstring
+_SPLIT_NUMBER=re.compile(rb'[0-9-][ \t\r\n]+[0-9-]')  # whitespace inside a number, e.g. "[1 2]"
+_LEADING_ZERO=re.compile(rb'[\[,]-?0[0-9]')  # not valid JSON, e.g. "[007]" (applied after whitespace is removed)
 
 """
 Convert list that may contain bytes type elements to list of string elements
@@ -48,6 +56,46 @@ def bytesArrayToList(data):
 
     return out
 
+"""
+Return True if tolist() on arrays of the given type gives values that
+json can encode as is, i.e. without bytes or nested arrays to convert.
+"""
+def _isJsonNative(dt):
+    if dt.names:
+        return all(_isJsonNative(dt.fields[name][0]) for name in dt.names)
+    if dt.subdtype is not None:
+        return False  # tolist gives arrays for array fields of compound types
+    return dt.kind in ('b', 'i', 'u', 'f', 'U')
+
+"""
+Encode a numpy array as JSON text, the same as
+json.dumps(bytesArrayToList(arr.tolist())) would.  The array is converted a
+slab along the first dimension at a time to limit the number of python
+objects created, and types json can encode directly skip bytesArrayToList.
+"""
+def arrayToJson(arr):
+    if arr.ndim == 0 or arr.size <= JSON_SLAB_SIZE:
+        data = arr.tolist()
+        if not _isJsonNative(arr.dtype):
+            data = bytesArrayToList(data)
+        return json.dumps(data)
+    native = _isJsonNative(arr.dtype)
+    row_size = arr.size // arr.shape[0]
+    slab_rows = max(1, JSON_SLAB_SIZE // max(1, row_size))
+    buffer = io.StringIO()
+    buffer.write('[')
+    for start in range(0, arr.shape[0], slab_rows):
+        data = arr[start:start+slab_rows].tolist()
+        if not native:
+            data = bytesArrayToList(data)
+        if start > 0:
+            buffer.write(', ')
+        text = json.dumps(data)
+        buffer.write(text[1:-1])  # strip brackets of the slab
+        del data
+    buffer.write(']')
+    return buffer.getvalue()
+
 """
 Convert a list to a tuple, recursively.
 Example. [[1,2],[3,4]] -> ((1,2),(3,4))
@@ -61,6 +109,73 @@ def toTuple(rank, data):
     else:
         return data
 
+"""
+Convert the innermost lists (at depth rank) of nested lists to tuples, as
+toTuple does, for compound types without compound fields.
+"""
+def _toRecords(rank, data):
+    if rank > 1:
+        return [_toRecords(rank-1, x) for x in data]
+    return [tuple(x) if type(x) in (list, tuple) else x for x in data]
+
+"""
+Return the nested list structure (brackets and commas only) that JSON
+text for an array of the given shape would have.
+"""
+def _getJsonSkeleton(shape):
+    skeleton = b'[' + b','*(shape[-1]-1) + b']'
+    for extent in reversed(shape[:-1]):
+        skeleton = b'[' + b','.join([skeleton,]*extent) + b']'
+    return skeleton
+
+"""
+Parse JSON text of a nested array of integers straight into a numpy array
+of the given shape and (non-compound, integer) type, without creating python
+objects for the elements.  Returns None if the text or type can't be handled
+this way, in which case json.loads and jsonToArray should be used.
+"""
+def jsonTextToArray(text, data_shape, data_dtype):
+    if data_dtype.names or data_dtype.kind not in ('i', 'u'):
+        return None
+    data_shape = tuple(data_shape)
+    if len(data_shape) == 0 or getNumElements(data_shape) == 0:
+        return None
+    if isinstance(text, str):
+        try:
+            text = text.encode('ascii')
+        except UnicodeEncodeError:
+            return None
+    if _SPLIT_NUMBER.search(text):
+        return None  # whitespace is only allowed around brackets and commas
+    text = text.translate(None, b' \t\r\n')
+    for token in (b',,', b'[,', b',]', b'[]', b'-,', b'-]', b'--'):
+        if token in text:
+            return None  # empty element or missing digits
+    if _LEADING_ZERO.search(text):
+        return None
+    if text.translate(None, b'-0123456789') != _getJsonSkeleton(data_shape):
+        return None  # not nested as the shape requires, or not all integers
+    if data_dtype.kind == 'u':
+        parse_dtype = np.dtype('u8')
+    else:
+        parse_dtype = np.dtype('i8')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            arr = np.fromstring(text.translate(_BRACKETS_TO_SPACES), dtype=parse_dtype, sep=',')
+    except (ValueError, DeprecationWarning):
+        return None
+    if arr.size != getNumElements(data_shape):
+        return None
+    info = np.iinfo(data_dtype)
+    if data_dtype.itemsize == parse_dtype.itemsize:
+        # np.fromstring saturates on overflow, leave the limits to json.loads
+        if (data_dtype.kind == 'i' and arr.min() <= info.min) or arr.max() >= info.max:
+            return None
+    elif arr.min() < info.min or arr.max() > info.max:
+        return None  # out of range for type
+    return arr.astype(data_dtype, copy=False).reshape(data_shape)
+
 """
 Get size in bytes of a numpy array.
 """
@@ -146,6 +261,15 @@ def jsonToArray(data_shape, data_dtype, data_json):
         converted_data = []
         if npoints == 1 and len(data_json) == len(data_dtype):
             converted_data.append(toTuple(0, data_json))
+        elif len(data_dtype) == 0 and not isVlen(data_dtype):
+            # no tuples needed, numpy can convert the lists as is
+            converted_data = data_json
+        elif np_shape_rank > 0 and not isVlen(data_dtype) and not any(data_dtype.fields[name][0].names for name in data_dtype.names):
+            try:
+                converted_data = _toRecords(np_shape_rank, data_json)
+            except TypeError:
+                # not nested to the depth of the shape
+                converted_data = toTuple(np_shape_rank, data_json)
         else:
             converted_data = toTuple(np_shape_rank, data_json)
         data_json = converted_data
@@ -0,0 +1,180 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# chunkExecutor.py
+#
+# Bounded-concurrency executor for SN -> DN chunk requests.
+#
+import asyncio
+import itertools
+import time
+from asyncio import CancelledError
+from collections import OrderedDict, deque
+
+from .. import hsds_logger as log
+
+
+class ChunkExecutor():
+    """
+    Run chunk jobs for service node requests with bounded concurrency.
+
+    Each request runs at most max_request_tasks jobs at once, and at most
+    max_node_tasks jobs are in flight to any one node across all requests.
+    Jobs that can't get a node slot wait in a per-node queue that is served
+    round-robin by request, so a large request can't starve small ones.
+    """
+    def __init__(self, max_node_tasks=16, max_request_tasks=32):
+        if max_node_tasks < 1 or max_request_tasks < 1:
+            raise ValueError("executor task limits must be at least 1")
+        self._max_node_tasks = max_node_tasks
+        self._max_request_tasks = max_request_tasks
+        self._active = {}   # node -> number of jobs in flight
+        self._waiters = {}  # node -> OrderedDict of request_id -> deque of futures
+        self._request_count = 0
+        self._queue_depth = 0
+        self._job_count = 0
+        self._wait_count = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    async def _acquire(self, node, request_id):
+        """ wait for a slot for the given node """
+        active = self._active.get(node, 0)
+        if active < self._max_node_tasks and not self._waiters.get(node):
+            self._active[node] = active + 1
+            return
+        future = asyncio.get_event_loop().create_future()
+        if node not in self._waiters:
+            self._waiters[node] = OrderedDict()
+        waiters = self._waiters[node]
+        if request_id not in waiters:
+            waiters[request_id] = deque()
+        waiters[request_id].append(future)
+        self._queue_depth += 1
+        start_time = time.time()
+        try:
+            await future
+        except CancelledError:
+            if future.cancelled():
+                # still in the queue, take it out
+                self._removeWaiter(node, request_id, future)
+            else:
+                # slot was handed to us just as we were cancelled
+                self._release(node)
+            raise
+        wait_time = time.time() - start_time
+        self._wait_count += 1
+        self._wait_time += wait_time
+        if wait_time > self._max_wait_time:
+            self._max_wait_time = wait_time
+
+    def _removeWaiter(self, node, request_id, future):
+        waiters = self._waiters.get(node)
+        if not waiters or request_id not in waiters:
+            return
+        futures = waiters[request_id]
+        try:
+            futures.remove(future)
+            self._queue_depth -= 1
+        except ValueError:
+            pass  # already handed off
+        if not futures:
+            del waiters[request_id]
+        if not waiters:
+            del self._waiters[node]
+
+    def _release(self, node):
+        """ hand the slot to the next waiting request for the node, or free it """
+        waiters = self._waiters.get(node)
+        while waiters:
+            # round-robin: serve the first request, then move it to the back
+            request_id = next(iter(waiters))
+            futures = waiters[request_id]
+            future = futures.popleft()
+            self._queue_depth -= 1
+            if futures:
+                waiters.move_to_end(request_id)
+            else:
+                del waiters[request_id]
+            if not future.done():
+                future.set_result(None)
+                if not waiters:
+                    del self._waiters[node]
+                return
+        if node in self._waiters:
+            del self._waiters[node]
+        self._active[node] -= 1
+        if self._active[node] == 0:
+            del self._active[node]
+
+    async def run(self, jobs, request_id=None):
+        """ Run jobs for the given request and return when all are complete.
+        jobs is an iterable (which may be a generator) of (node, job) tuples,
+        where job is a function returning an awaitable.  Jobs are pulled from
+        the iterable only as they can be run.  If any job raises an exception,
+        remaining jobs are cancelled and the exception is re-raised.
+        request_id defaults to the current task (i.e. the request handler).
+        """
+        if request_id is None:
+            request_id = asyncio.current_task()
+        job_iter = iter(jobs)
+        # don't start more workers than there are jobs
+        first_jobs = list(itertools.islice(job_iter, self._max_request_tasks))
+        if not first_jobs:
+            return
+        job_iter = itertools.chain(first_jobs, job_iter)
+        self._request_count += 1
+
+        async def worker():
+            for node, job in job_iter:
+                await self._acquire(node, request_id)
+                self._job_count += 1
+                try:
+                    await job()
+                finally:
+                    self._release(node)
+
+        workers = []
+        for i in range(len(first_jobs)):
+            workers.append(asyncio.ensure_future(worker()))
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            self._request_count -= 1
+            for task in workers:
+                if not task.done():
+                    task.cancel()
+            log.debug(f"ChunkExecutor - request {request_id} done, queue depth: {self._queue_depth}")
+
+    @property
+    def queueDepth(self):
+        return self._queue_depth
+
+    @property
+    def activeCount(self):
+        return sum(self._active.values())
+
+    @property
+    def stats(self):
+        stats = {}
+        stats["requests"] = self._request_count
+        stats["active"] = self.activeCount
+        stats["active_nodes"] = len(self._active)
+        stats["queue_depth"] = self._queue_depth
+        stats["job_count"] = self._job_count
+        stats["wait_count"] = self._wait_count
+        if self._wait_count > 0:
+            stats["avg_wait_time"] = self._wait_time / self._wait_count
+        else:
+            stats["avg_wait_time"] = 0.0
+        stats["max_wait_time"] = self._max_wait_time
+        return stats
@@ -0,0 +1,128 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# chunkTableCache.py
+#
+# SN cache of chunk tables (or regions of them) for reference layouts.
+#
+import time
+from collections import OrderedDict
+import numpy as np
+
+from .. import hsds_logger as log
+
+
+class ChunkTableCache():
+    """
+    Keep regions of chunk tables (the datasets that hold the offset, size,
+    and optionally path of each chunk of an indirect reference layout) as
+    numpy arrays so that chunk locations can be looked up without a request
+    to the DNs.
+
+    Each region is a tuple of (start, stop) pairs, one per dimension of the
+    chunk table.  The binary chunk tables of H5D_CHUNKED_REF datasets are kept
+    whole, with a region of None.  Entries expire after ttl seconds and are
+    evicted least recently used first to keep within mem_target bytes.
+    """
+    def __init__(self, ttl=60, mem_target=16*1024*1024):
+        self._ttl = ttl
+        self._mem_target = mem_target
+        self._mem_used = 0
+        self._cache = OrderedDict()  # (table_id, region) -> (expire_time, arr)
+        self._hit_count = 0
+        self._miss_count = 0
+
+    def _remove(self, cache_key):
+        (expire_time, arr) = self._cache.pop(cache_key)
+        self._mem_used -= arr.nbytes
+
+    def get(self, table_id, indices):
+        """ Return the chunk table values for the given (num_points, rank)
+        array of chunk table indices, or None if no cached region holds all
+        of them.
+        """
+        if len(indices) == 0:
+            return None
+        now = time.time()
+        min_index = indices.min(axis=0)
+        max_index = indices.max(axis=0)
+        for cache_key in list(self._cache.keys()):
+            if cache_key[0] != table_id or cache_key[1] is None:
+                continue
+            (expire_time, arr) = self._cache[cache_key]
+            if expire_time <= now:
+                self._remove(cache_key)
+                continue
+            region = cache_key[1]
+            starts = np.array([r[0] for r in region], dtype=indices.dtype)
+            stops = np.array([r[1] for r in region], dtype=indices.dtype)
+            if np.all(min_index >= starts) and np.all(max_index < stops):
+                self._cache.move_to_end(cache_key)
+                self._hit_count += 1
+                rel_indices = indices - starts
+                return arr[tuple(rel_indices[:, dim] for dim in range(indices.shape[1]))]
+        self._miss_count += 1
+        return None
+
+    def getTable(self, table_id):
+        """ Return the whole chunk table saved with a region of None, or None
+        if not cached
+        """
+        cache_key = (table_id, None)
+        if cache_key in self._cache:
+            (expire_time, arr) = self._cache[cache_key]
+            if expire_time > time.time():
+                self._cache.move_to_end(cache_key)
+                self._hit_count += 1
+                return arr
+            self._remove(cache_key)
+        self._miss_count += 1
+        return None
+
+    def add(self, table_id, region, arr):
+        """ Add the array read for the given region of the chunk table """
+        if self._ttl <= 0 or arr.nbytes > self._mem_target:
+            return
+        if region is not None:
+            region = tuple(region)
+        cache_key = (table_id, region)
+        if cache_key in self._cache:
+            self._remove(cache_key)
+        while self._cache and self._mem_used + arr.nbytes > self._mem_target:
+            # evict least recently used
+            self._remove(next(iter(self._cache)))
+        self._cache[cache_key] = (time.time() + self._ttl, arr)
+        self._mem_used += arr.nbytes
+        log.debug(f"ChunkTableCache - added region {region} of {table_id}")
+
+    def invalidate(self, table_id):
+        """ Drop cached regions for the chunk table """
+        for cache_key in list(self._cache.keys()):
+            if cache_key[0] == table_id:
+                self._remove(cache_key)
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def memUsed(self):
+        return self._mem_used
+
+    @property
+    def stats(self):
+        stats = {}
+        stats["count"] = len(self._cache)
+        stats["mem_used"] = self._mem_used
+        stats["mem_target"] = self._mem_target
+        stats["hit_count"] = self._hit_count
+        stats["miss_count"] = self._miss_count
+        return stats
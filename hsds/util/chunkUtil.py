@@ -6,6 +6,8 @@ CHUNK_MIN =  512*1024   # Soft lower limit (512k)
 CHUNK_MAX = 2048*1024   # Hard upper limit (2M)
 DEFAULT_TYPE_SIZE = 128 # Type size case when it is variable
 PRIMES = [29, 31, 37, 41, 43, 47, 53, 59, 61, 67] # for chunk partitioning
+REQUEST_COST = 16*1024  # estimated overhead of one SN->DN request, in bytes transferred
+CHUNK_TABLE_DT = np.dtype([("index", "<u8"), ("offset", "<u8"), ("size", "<u8")])  # binary H5D_CHUNKED_REF table
 
 
 """
@@ -294,6 +296,11 @@ def getNumChunks(selection, layout):
 
         c = layout[i]   # chunk size
 
+        if s.step > c:
+            # each selected point lands in a different chunk
+            num_chunks *= frac((s.stop-s.start), s.step)
+            continue
+
         lc = frac(s.start, c) * c
 
         if s.start + w <= lc:
@@ -335,6 +342,11 @@ def getChunkId(dset_id, point, layout):
 
     return chunk_id
 
+def getChunkIdForIndex(dset_id, chunk_index):
+    """ get chunk id for the given chunk index (tuple of chunk coordinates)
+    """
+    return "c-" + dset_id[2:] + '_' + '_'.join(map(str, chunk_index))
+
 def getDatasetId(chunk_id):
     """ Get dataset id given a chunk id
     """
@@ -417,61 +429,268 @@ def getChunkIdForPartition(chunk_id, dset_json):
             chunk_id = getPartitionKey(chunk_id, partition_count)
     return chunk_id
 
-def getChunkIds(dset_id, selection, layout, dim=0, prefix=None, chunk_ids=None):
+def getChunkIndices(selection, layout):
+    """ Generator returning the chunk index tuples for chunks that lie in the
+    selection, in row-major order.  Only the per-dimension ranges are held in
+    memory, so arbitrarily large selections can be enumerated.
+    """
+    rank = len(selection)
+    # for each dimension, a range and divisor such that range[i] // divisor
+    # gives the i-th chunk index along that dimension
+    dim_ranges = []
+    for dim in range(rank):
+        s = selection[dim]
+        c = layout[dim]
+        if s.stop <= s.start:
+            return  # null selection
+        if s.step > c:
+            # chunks may not be contiguous, skip along the selection and
+            # use whatever chunks we land in.  Since step > c, each point
+            # lands in a different chunk
+            dim_ranges.append((range(s.start, s.stop, s.step), c))
+        else:
+            # contiguous set of chunks along the selection
+            dim_ranges.append((range(s.start // c, frac(slice_stop(s), c)), 1))
+
+    # iterate like an odometer rather than use itertools.product, which
+    # would expand each range into a tuple
+    positions = [0,] * rank
+    while True:
+        yield tuple(r[positions[dim]] // d for dim, (r, d) in enumerate(dim_ranges))
+        dim = rank - 1
+        while dim >= 0:
+            positions[dim] += 1
+            if positions[dim] < len(dim_ranges[dim][0]):
+                break
+            positions[dim] = 0
+            dim -= 1
+        if dim < 0:
+            return
+
+def iterChunkIds(dset_id, selection, layout):
+    """ Return a generator of the chunk ids for chunks that lie in the
+    selection of the given dataset.  Ids are produced lazily from the chunk
+    index tuples, but the dataset id is checked (raising ValueError) when
+    this is called.
+    """
+    if not dset_id.startswith("d-"):
+        msg = "Bad Request: invalid dset id: {}".format(dset_id)
+        log.warning(msg)
+        raise ValueError(msg)
+    prefix = "c-" + dset_id[2:] + '_'
+    return (prefix + '_'.join(map(str, chunk_index)) for chunk_index in getChunkIndices(selection, layout))
+
+def getChunkIds(dset_id, selection, layout):
     """ Get the all the chunk ids for chunks that lie in the selection of the
     given dataset.
     """
+    return list(iterChunkIds(dset_id, selection, layout))
+
+def getSelectionPoints(selection):
+    """ Return a (num_points, rank) uint64 array with the coordinates of every
+    point in the selection, in row-major order.
+    """
+    coords = [np.arange(s.start, s.stop, s.step, dtype='uint64') for s in selection]
+    grids = np.meshgrid(*coords, indexing='ij')
+    return np.stack([grid.reshape(-1) for grid in grids], axis=-1)
+
+def getStridedReadMode(selection, layout, item_size, node_count, max_size=None):
+    """ Choose how to read a selection: "hyperslab" for one request per chunk
+    or "point" for one point request per data node.
+    Only selections with a step larger than the chunk extent are candidates
+    for point mode, since they touch many chunks with just a few points each.
+    The choice is made by comparing the estimated bytes transferred plus
+    REQUEST_COST for each request.  Point mode holds the coordinates of every
+    point (rank uint64s each) as well as the values, so it is not used if
+    that would come to max_size bytes or more.
+    """
+    if not any(s.step > c for s, c in zip(selection, layout)):
+        return "hyperslab"
+    if item_size == 'H5T_VARIABLE':
+        return "hyperslab"
     num_chunks = getNumChunks(selection, layout)
     if num_chunks == 0:
-        return []  # empty list
-    if prefix is None:
-        # construct a prefix using "c-" with the uuid of the dset_id
-        if not dset_id.startswith("d-"):
-            msg = "Bad Request: invalid dset id: {}".format(dset_id)
-            log.warning(msg)
-            raise ValueError(msg)
-        prefix = "c-" + dset_id[2:] + '_'
+        return "hyperslab"
+    num_points = 1
+    for s in selection:
+        num_points *= frac((s.stop-s.start), s.step)
     rank = len(selection)
-    if chunk_ids is None:
-        chunk_ids = []
-    s = selection[dim]
-    c = layout[dim]
-
-    if s.step > c:
-        # chunks may not be contiguous,  skip along the selection and add
-        # whatever chunks we land in
-        for i in range(s.start, s.stop, s.step):
-            chunk_index = i // c
-            chunk_id = prefix + str(chunk_index)
-            if dim + 1 == rank:
-                # we've gone through all the dimensions, add this id to the list
-                chunk_ids.append(chunk_id)
-            else:
-                chunk_id += '_'  # seperator between dimensions
-                # recursive call
-                getChunkIds(dset_id, selection, layout, dim+1, chunk_id, chunk_ids)
-    else:
-        # get a contiguous set of chunks along the selection
-        if s.step > 1:
-            num_points = frac((s.stop-s.start), s.step)
-            w = num_points * s.step - (s.step - 1)
-        else:
-            w = s.stop - s.start # selection width (>0)
-
-        chunk_index_start = s.start // c
-        chunk_index_end = frac((s.start + w), c)
-
-        for i in range(chunk_index_start, chunk_index_end):
-            chunk_id = prefix + str(i)
-            if dim + 1 == rank:
-                # we've gone through all the dimensions, add this id to the list
-                chunk_ids.append(chunk_id)
-            else:
-                chunk_id += '_'  # seperator between dimensions
-                # recursive call
-                getChunkIds(dset_id, selection, layout, dim+1, chunk_id, chunk_ids)
-    # got the complete list, return it!
-    return chunk_ids
+    hyperslab_cost = num_chunks * REQUEST_COST + num_points * item_size
+    num_requests = min(num_chunks, node_count)
+    point_size = num_points * (rank * 8 + item_size)
+    if max_size is not None and point_size >= max_size:
+        log.debug(f"getStridedReadMode - point selection of {point_size} bytes too large")
+        return "hyperslab"
+    point_cost = num_requests * REQUEST_COST + point_size
+    log.debug(f"getStridedReadMode - hyperslab cost: {hyperslab_cost} point cost: {point_cost}")
+    if point_cost < hyperslab_cost:
+        return "point"
+    return "hyperslab"
+
+def getChunkRanges(chunk_items, max_gap=0, max_size=None):
+    """ Plan coalesced storage reads for chunks stored as byte ranges of
+    other files (e.g. linked HDF5 chunks).
+    chunk_items is an iterable of (chunk_id, s3path, s3offset, s3size) tuples.
+    Chunks in the same file that are no more than max_gap bytes apart are
+    merged into one range, provided the range is no larger than max_size.
+    Returns a list of dicts with keys: s3path, s3offset, s3size, and chunks -
+    a list of (chunk_id, offset, size) with offset relative to the range start.
+    Chunks with a size of 0 (not allocated) are skipped.
+    """
+    items = sorted((item for item in chunk_items if item[3] > 0), key=lambda item: (item[1], item[2]))
+    ranges = []
+    chunk_range = None
+    for chunk_id, s3path, s3offset, s3size in items:
+        if chunk_range is not None and chunk_range["s3path"] == s3path:
+            range_end = chunk_range["s3offset"] + chunk_range["s3size"]
+            new_end = max(range_end, s3offset + s3size)
+            new_size = new_end - chunk_range["s3offset"]
+            if s3offset - range_end <= max_gap and (not max_size or new_size <= max_size):
+                chunk_range["s3size"] = new_size
+                chunk_range["chunks"].append((chunk_id, s3offset - chunk_range["s3offset"], s3size))
+                continue
+        chunk_range = {"s3path": s3path, "s3offset": s3offset, "s3size": s3size, "chunks": [(chunk_id, 0, s3size)]}
+        ranges.append(chunk_range)
+    return ranges
+
+def _mergeByteRanges(starts, run_size, max_gap):
+    """ merge sorted runs of run_size bytes into (offset, size) ranges """
+    if len(starts) == 0:
+        return []
+    ends = starts + run_size
+    gaps = starts[1:] - ends[:-1]
+    breaks = np.nonzero(gaps > max_gap)[0]
+    range_starts = np.concatenate((starts[:1], starts[breaks+1]))
+    range_ends = np.concatenate((ends[breaks], ends[-1:]))
+    return [(int(start), int(end - start)) for start, end in zip(range_starts, range_ends)]
+
+def getChunkByteRanges(chunk_dims, item_size, selection=None, points=None, max_gap=0):
+    """ Return the (offset, size) byte ranges of an uncompressed, C-ordered
+    chunk that cover the given chunk-relative selection (a tuple of slices) or
+    points (a (num_points, rank) array of dataset or chunk coordinates).
+    Ranges no more than max_gap bytes apart are merged.
+    """
+    rank = len(chunk_dims)
+    strides = [item_size,] * rank
+    for dim in range(rank-2, -1, -1):
+        strides[dim] = strides[dim+1] * chunk_dims[dim+1]
+    if points is not None:
+        points = np.asarray(points, dtype='uint64').reshape((-1, rank))
+        rel_points = points % np.array(chunk_dims, dtype='uint64')
+        starts = np.unique(rel_points @ np.array(strides, dtype='uint64')).astype('int64')
+        return _mergeByteRanges(starts, item_size, max_gap)
+
+    if selection is None:
+        selection = tuple(slice(0, extent, 1) for extent in chunk_dims)
+    counts = [frac(s.stop - s.start, s.step) for s in selection]
+    if min(counts) <= 0:
+        return []
+    # each row along the last dimension is read as one run
+    last = selection[-1]
+    run_start = last.start * item_size
+    run_size = ((counts[-1] - 1) * last.step + 1) * item_size
+    starts = np.array([run_start], dtype='int64')
+    for dim in range(rank-2, -1, -1):
+        s = selection[dim]
+        offsets = np.arange(s.start, s.stop, s.step, dtype='int64') * strides[dim]
+        starts = np.add.outer(offsets, starts).reshape(-1)
+    return _mergeByteRanges(starts, run_size, max_gap)
+
+def getChunkTableRegion(indices, table_dims, table_layout, item_size, max_bytes):
+    """ Return the region of a chunk table - a list of (start, stop) pairs -
+    to read for the given (num_points, rank) array of chunk indices.
+    The bounding box of the indices is extended to the chunk table's own chunk
+    boundaries if that stays within max_bytes.  Returns None if even the
+    bounding box is larger than max_bytes.
+    """
+    if len(indices) == 0:
+        return None
+    min_index = indices.min(axis=0)
+    max_index = indices.max(axis=0)
+    bbox = []
+    aligned = []
+    for dim in range(len(table_dims)):
+        start = int(min_index[dim])
+        stop = int(max_index[dim]) + 1
+        bbox.append((start, stop))
+        c = table_layout[dim]
+        aligned.append(((start // c) * c, min(frac(stop, c) * c, table_dims[dim])))
+    for region in (aligned, bbox):
+        num_bytes = item_size
+        for start, stop in region:
+            num_bytes *= stop - start
+        if num_bytes <= max_bytes:
+            return region
+    return None
+
+def getChunkGrid(dims, layout):
+    """ Return the number of chunks along each dimension """
+    return [frac(extent, c) for extent, c in zip(dims, layout)]
+
+def getChunkTableGrid(layout, dims):
+    """ Return the chunk grid the linear indexes of an H5D_CHUNKED_REF binary
+    chunk table are based on, i.e. the grid when the table was written.
+    The dataset may have been resized since.
+    """
+    if "chunk_table_grid" in layout:
+        return layout["chunk_table_grid"]
+    return getChunkGrid(dims, layout["dims"])
+
+def _getLinearIndex(chunk_indices, chunk_grid):
+    """ row-major linear index for a (num_chunks, rank) array of chunk indices """
+    linear_index = np.zeros((len(chunk_indices),), dtype='uint64')
+    for dim in range(len(chunk_grid)):
+        linear_index = linear_index * np.uint64(chunk_grid[dim]) + chunk_indices[:, dim].astype('uint64')
+    return linear_index
+
+def getChunkTableArray(chunks, chunk_grid):
+    """ Convert the chunks dict of an H5D_CHUNKED_REF layout (chunk index
+    suffix, e.g. "2_3", to [offset, size]) to an array of CHUNK_TABLE_DT
+    sorted by linear chunk index.
+    """
+    rank = len(chunk_grid)
+    num_chunks = len(chunks)
+    chunk_indices = np.zeros((num_chunks, rank), dtype='uint64')
+    table_arr = np.zeros((num_chunks,), dtype=CHUNK_TABLE_DT)
+    for i, (chunk_key, item) in enumerate(chunks.items()):
+        chunk_indices[i] = [int(x) for x in chunk_key.split('_')]
+        table_arr[i]["offset"] = item[0]
+        table_arr[i]["size"] = item[1]
+    table_arr["index"] = _getLinearIndex(chunk_indices, chunk_grid)
+    return np.sort(table_arr, order="index")
+
+def getChunkTableDict(table_arr, chunk_grid):
+    """ Convert an array of CHUNK_TABLE_DT back to the chunks dict of an
+    H5D_CHUNKED_REF layout (the inverse of getChunkTableArray)
+    """
+    chunks = {}
+    if len(table_arr) == 0:
+        return chunks
+    chunk_indices = np.unravel_index(table_arr["index"].astype('int64'), chunk_grid)
+    offsets = table_arr["offset"].tolist()
+    sizes = table_arr["size"].tolist()
+    keys = zip(*(dim_indices.tolist() for dim_indices in chunk_indices))
+    for i, chunk_index in enumerate(keys):
+        chunks['_'.join(map(str, chunk_index))] = [offsets[i], sizes[i]]
+    return chunks
+
+def getChunkTableItems(table_arr, chunk_indices, chunk_grid):
+    """ Look up the given (num_chunks, rank) array of chunk indices in a sorted
+    chunk table array.  Returns arrays of offsets and sizes, with a size of 0
+    for chunks that aren't in the table (including chunks outside chunk_grid).
+    """
+    chunk_indices = np.asarray(chunk_indices)
+    linear_index = _getLinearIndex(chunk_indices, chunk_grid)
+    pos = np.searchsorted(table_arr["index"], linear_index)
+    pos = np.minimum(pos, max(len(table_arr) - 1, 0))
+    offsets = np.zeros((len(linear_index),), dtype='uint64')
+    sizes = np.zeros((len(linear_index),), dtype='uint64')
+    if len(table_arr) > 0:
+        found = table_arr["index"][pos] == linear_index
+        found &= np.all(chunk_indices < np.asarray(chunk_grid, dtype=chunk_indices.dtype), axis=1)
+        offsets[found] = table_arr["offset"][pos[found]]
+        sizes[found] = table_arr["size"][pos[found]]
+    return offsets, sizes
 
 def getChunkSuffix(chunk_id):
     """ given a chunk_id (e.g.: c-12345678-1234-1234-1234-1234567890ab_6_4)
@@ -251,3 +251,30 @@ def getBucketForDomain(domain):
         # invalid domain?
         return None
     return domain[:index]
+
+def isReadOnlyDomain(domain, read_only_domains):
+    """ Return True if the domain is in the list of read-only domains (a
+        list or a comma-separated string, as given in the config).
+        Entries ending with '/' match every domain in that folder (and
+        sub-folders).  Entries without a bucket match the domain path in
+        any bucket.
+    """
+    if not domain or not read_only_domains:
+        return False
+    if isinstance(read_only_domains, str):
+        read_only_domains = read_only_domains.split(',')
+    domain_path = getPathForDomain(domain)
+    for item in read_only_domains:
+        item = item.strip()
+        if not item:
+            continue
+        if item[0] == '/':
+            name = domain_path
+        else:
+            name = domain
+        if item[-1] == '/':
+            if name.startswith(item):
+                return True
+        elif name == item:
+            return True
+    return False
@@ -12,8 +12,11 @@
 
 from aiohttp.web_exceptions import HTTPBadRequest, HTTPInternalServerError
 
+from .hdf5dtype import getItemSize
 from .. import hsds_logger as log
 
+CHUNK_FILTERS_HEADER = "X-Hsds-Chunk-Filters"  # JSON list of filters applied to raw chunk bytes
+CHUNK_SHAPE_HEADER = "X-Hsds-Chunk-Shape"  # JSON list of the chunk dimensions
 
 def getHyperslabSelection(dsetshape, start=None, stop=None, step=None):
     """
@@ -391,6 +394,16 @@ def getDeflateLevel(dset_json):
             deflate_level = filter["level"]
     return deflate_level
 
+""" Return the list of filters for the dataset
+"""
+def getFilters(dset_json):
+    if "creationProperties" not in dset_json:
+        return []
+    creationProperties = dset_json["creationProperties"]
+    if "filters" not in creationProperties:
+        return []
+    return creationProperties["filters"]
+
 """ Return true if Shuffle is enabled
 """
 def isShuffle(dset_json):
@@ -410,6 +423,17 @@ def isShuffle(dset_json):
             break
     return is_shuffle
 
+""" Return the element size chunk bytes are shuffled by, or 0 if the dataset
+doesn't use the shuffle filter (or its items are variable length)
+"""
+def getShuffleSize(dset_json):
+    if not isShuffle(dset_json):
+        return 0
+    item_size = getItemSize(dset_json["type"])
+    if item_size == "H5T_VARIABLE":
+        return 0
+    return item_size
+
 
 
 
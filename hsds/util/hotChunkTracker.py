@@ -0,0 +1,72 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# hotChunkTracker.py
+#
+# SN detection of frequently read chunks.
+#
+import time
+
+from .. import hsds_logger as log
+
+
+class HotChunkTracker():
+    """
+    Count chunk reads in fixed time windows.  A chunk is hot once it has
+    been read threshold times a second in the current window, and stays hot
+    for the following window if it was hot in the one before.
+    """
+    def __init__(self, threshold, window=1.0):
+        if threshold <= 0 or window <= 0:
+            raise ValueError("threshold and window must be positive")
+        self._min_count = threshold * window
+        self._window = window
+        self._window_start = time.time()
+        self._counts = {}  # chunk_id -> reads in current window
+        self._hot = set()  # chunks hot in the previous window
+        self._hot_read_count = 0
+
+    def _rollWindow(self, now):
+        if now - self._window_start < self._window:
+            return
+        if now - self._window_start < self._window * 2:
+            self._hot = set(chunk_id for chunk_id, count in self._counts.items() if count >= self._min_count)
+        else:
+            # no reads for a full window
+            self._hot = set()
+        if self._hot:
+            log.debug(f"HotChunkTracker - {len(self._hot)} hot chunks")
+        self._counts = {}
+        self._window_start = now
+
+    def record(self, chunk_id):
+        """ Count a read of the chunk and return True if the chunk is hot """
+        self._rollWindow(time.time())
+        count = self._counts.get(chunk_id, 0) + 1
+        self._counts[chunk_id] = count
+        if count >= self._min_count or chunk_id in self._hot:
+            self._hot_read_count += 1
+            return True
+        return False
+
+    def isHot(self, chunk_id):
+        """ Return True if the chunk is hot, without counting a read """
+        self._rollWindow(time.time())
+        return chunk_id in self._hot or self._counts.get(chunk_id, 0) >= self._min_count
+
+    @property
+    def stats(self):
+        stats = {}
+        stats["tracked_count"] = len(self._counts)
+        stats["hot_count"] = len(self._hot)
+        stats["hot_read_count"] = self._hot_read_count
+        return stats
@@ -13,15 +13,25 @@
 # httpUtil:
 # http-related helper functions
 #
+import asyncio
+import json
+import zlib
 from asyncio import CancelledError
-from aiohttp.web import json_response
-from aiohttp import  ClientSession, TCPConnector
+from aiohttp.web import json_response, Response
+from urllib.parse import urlparse
+from aiohttp import  ClientSession, TCPConnector, UnixConnector
 from aiohttp.web_exceptions import HTTPForbidden, HTTPNotFound, HTTPConflict, HTTPGone, HTTPInternalServerError, HTTPRequestEntityTooLarge, HTTPServiceUnavailable
 from aiohttp.client_exceptions import ClientError
 
 
 from .. import hsds_logger as log
 from .. import config
+from .loadUtil import updateDataNodeLoad
+
+WIRE_ENCODING = "deflate"  # Content-Encoding for compressed binary transfers between nodes
+RESPONSE_ENCODINGS = ("gzip", "deflate")  # Content-Encodings for client responses, in order of preference
+COMPRESS_PIECE_SIZE = 1024*1024  # bytes compressed at a time for streamed responses
+JSON_WHITESPACE = " \t\n\r"
 
 def isOK(http_response):
     if http_response < 300:
@@ -35,8 +45,31 @@ def getUrl(host, port):
 """
 get aiobotocore http client
 """
-def get_http_client(app):
-    """ get http client """
+def getNodeUrl(url):
+    """ Return the scheme and host:port part of the url """
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def _get_socket_client(app, socket_path):
+    """ get http client for requests over the given Unix domain socket """
+    socket_clients = app["socket_clients"]
+    if socket_path in socket_clients:
+        return socket_clients[socket_path]
+    loop = app["loop"]
+    max_tcp_connections = int(config.get("max_tcp_connections"))
+    log.info(f"Initiating UnixConnector for {socket_path} with limit {max_tcp_connections} connections")
+    client = ClientSession(loop=loop, connector=UnixConnector(path=socket_path, limit=max_tcp_connections))
+    socket_clients[socket_path] = client
+    return client
+
+def get_http_client(app, url=None):
+    """ get http client.  If the url is for a node on this host that has
+    a Unix domain socket (see node_sockets), the client for that socket
+    is returned. """
+    if url is not None and app.get("node_sockets"):
+        socket_path = app["node_sockets"].get(getNodeUrl(url))
+        if socket_path:
+            return _get_socket_client(app, socket_path)
     if "client" in app:
         return app["client"]
 
@@ -54,6 +87,109 @@ def get_http_client(app):
     return client
 
 
+async def compressWireBytes(data):
+    """ Return (data, encoding) for a binary body sent between nodes.  Bodies
+    of at least wire_compress_min_size bytes are compressed with zlib (off the
+    event loop), unless that doesn't make them smaller.  encoding is None if
+    the data is returned as is.
+    """
+    min_size = int(config.get("wire_compress_min_size"))
+    if min_size <= 0 or len(data) < min_size:
+        return data, None
+    level = int(config.get("wire_compress_level"))
+    loop = asyncio.get_event_loop()
+    zip_data = await loop.run_in_executor(None, zlib.compress, data, level)
+    if len(zip_data) >= len(data):
+        log.debug(f"compressWireBytes - {len(data)} bytes not compressible")
+        return data, None
+    log.debug(f"compressWireBytes - compressed {len(data)} bytes to {len(zip_data)}")
+    return zip_data, WIRE_ENCODING
+
+async def getWireBody(data):
+    """ Return (data, headers) to send data as a request body to another node.
+    The receiving node's server decompresses the body before it is read.
+    """
+    data, encoding = await compressWireBytes(data)
+    headers = {}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return data, headers
+
+def _getAcceptedEncodings(request):
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    return [item.split(';')[0].strip() for item in accept_encoding.split(',')]
+
+def acceptsWireEncoding(request):
+    """ Return True if the requestor accepts response bodies compressed with WIRE_ENCODING """
+    return WIRE_ENCODING in _getAcceptedEncodings(request)
+
+def getResponseEncoding(request, size):
+    """ Return the Content-Encoding to compress a client response body of
+    size bytes with, or None if it should be sent as is.  Bodies smaller than
+    http_compress_min_size are not compressed.
+    """
+    min_size = int(config.get("http_compress_min_size"))
+    if min_size <= 0 or size < min_size:
+        return None
+    accepted = _getAcceptedEncodings(request)
+    for encoding in RESPONSE_ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+def _getCompressor(encoding):
+    level = int(config.get("http_compress_level"))
+    if encoding == "gzip":
+        wbits = 16 + zlib.MAX_WBITS  # gzip header and trailer
+    else:
+        wbits = zlib.MAX_WBITS  # zlib format, as used by HTTP deflate
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+def _compressBytes(data, encoding):
+    compressor = _getCompressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+async def writeResponseBody(request, resp, data):
+    """ Prepare the StreamResponse and write data as its body.  If the
+    client accepts it and the body is large enough, the data is compressed a
+    piece at a time off the event loop and sent with chunked encoding.
+    """
+    encoding = getResponseEncoding(request, len(data))
+    if encoding is None:
+        resp.content_length = len(data)
+        await resp.prepare(request)
+        await resp.write(data)
+        return
+    log.debug(f"writeResponseBody - compressing {len(data)} bytes with {encoding}")
+    resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    compressor = _getCompressor(encoding)
+    loop = asyncio.get_event_loop()
+    view = memoryview(data)
+    for start in range(0, len(data), COMPRESS_PIECE_SIZE):
+        piece = await loop.run_in_executor(None, compressor.compress, view[start:start+COMPRESS_PIECE_SIZE])
+        if piece:
+            await resp.write(piece)
+    await resp.write(compressor.flush())
+
+async def getWireResponseBody(request, resp, data):
+    """ Return data to write as the body of resp, compressed if the requestor
+    accepts it and the data is large enough.  Call before resp is prepared.
+    """
+    if not acceptsWireEncoding(request):
+        return data
+    data, encoding = await compressWireBytes(data)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return data
+
+def isEncodedRequest(request):
+    """ Return True if the request body was sent compressed, so that
+    content_length is not the length of the body as read """
+    return request.headers.get("Content-Encoding", "identity") != "identity"
+
 """
 Replacement for aiohttp Request.read using our max request limit
 """
@@ -80,18 +216,100 @@ async def request_read(request) -> bytes:
         request._read_bytes = bytes(body)
     return request._read_bytes
 
+"""
+Helpers for reading a JSON request body with some array values left as text
+"""
+def _skipWhitespace(text, idx):
+    while idx < len(text) and text[idx] in JSON_WHITESPACE:
+        idx += 1
+    return idx
+
+def _findArrayEnd(text, idx):
+    # Return the end of the array starting at idx if it contains no
+    # strings, otherwise None.  Any nesting errors are left for the parse
+    # of the array text to report.
+    quote_index = text.find('"', idx)
+    if quote_index < 0:
+        quote_index = len(text)
+    end = text.rfind(']', idx, quote_index)
+    if end < 0:
+        return None
+    end += 1
+    if text.count('[', idx, end) != text.count(']', idx, end):
+        return None
+    return end
+
+def scanJsonBody(text, raw_keys=()):
+    """ Return a (body, raw) tuple for the JSON object text, where raw has
+    the values of any top-level raw_keys that are arrays of non-strings as
+    JSON text, and body has the remaining keys.  Raises ValueError if the
+    text is not a JSON object.
+    """
+    decoder = json.JSONDecoder()
+    body = {}
+    raw = {}
+    idx = _skipWhitespace(text, 0)
+    if text[idx:idx+1] != '{':
+        raise ValueError("Expected JSON object")
+    idx = _skipWhitespace(text, idx+1)
+    if text[idx:idx+1] == '}':
+        idx += 1
+    else:
+        while True:
+            key, idx = decoder.raw_decode(text, idx)
+            if not isinstance(key, str):
+                raise ValueError("Expected JSON object key")
+            idx = _skipWhitespace(text, idx)
+            if text[idx:idx+1] != ':':
+                raise ValueError("Expected ':' after JSON object key")
+            idx = _skipWhitespace(text, idx+1)
+            end = None
+            if key in raw_keys and text[idx:idx+1] == '[':
+                end = _findArrayEnd(text, idx)
+            if end is None:
+                body[key], idx = decoder.raw_decode(text, idx)
+                raw.pop(key, None)
+            else:
+                raw[key] = text[idx:end]
+                body.pop(key, None)
+                idx = end
+            idx = _skipWhitespace(text, idx)
+            delimiter = text[idx:idx+1]
+            idx = _skipWhitespace(text, idx+1)
+            if delimiter == '}':
+                break
+            if delimiter != ',':
+                raise ValueError("Expected ',' or '}' in JSON object")
+    if _skipWhitespace(text, idx) != len(text):
+        raise ValueError("Extra data after JSON object")
+    return body, raw
+
+async def getJsonBody(request, raw_keys=()):
+    """ Read the JSON request body, leaving the values of top-level raw_keys
+    as JSON text where possible (see scanJsonBody), so that large arrays can
+    be parsed straight into numpy arrays.  Returns a (body, raw) tuple.
+    """
+    text = await request.text()
+    if raw_keys:
+        try:
+            return scanJsonBody(text, raw_keys=raw_keys)
+        except ValueError as ve:
+            log.debug(f"getJsonBody - unable to scan body: {ve}")
+    return json.loads(text), {}
+
 """
 Helper function  - async HTTP GET
 """
 async def http_get(app, url, params=None, format="json"):
     log.info(f"http_get('{url}')")
-    client = get_http_client(app)
+    client = get_http_client(app, url=url)
     data = None
     status_code = None
     timeout = config.get("timeout")
     try:
         async with client.get(url, params=params, timeout=timeout) as rsp:
             log.info(f"http_get status: {rsp.status}")
+            updateDataNodeLoad(app, url, rsp.headers)
             status_code = rsp.status
             if rsp.status != 200:
                 log.warn(f"request to {url} failed with code: {status_code}")
@@ -131,13 +349,14 @@ Helper function  - async HTTP POST
 """
 async def http_post(app, url, data=None, params=None):
     log.info(f"http_post('{url}', {data})")
-    client = get_http_client(app)
+    client = get_http_client(app, url=url)
     rsp_json = None
     timeout = config.get("timeout")
 
     try:
         async with client.post(url, json=data, params=params, timeout=timeout ) as rsp:
             log.info(f"http_post status: {rsp.status}")
+            updateDataNodeLoad(app, url, rsp.headers)
             if rsp.status == 200:
                 pass  # ok
             elif rsp.status == 201:
@@ -171,12 +390,13 @@ Helper function  - async HTTP PUT for json data
 async def http_put(app, url, data=None, params=None):
     log.info(f"http_put('{url}', data: {data})")
     rsp = None
-    client = get_http_client(app)
+    client = get_http_client(app, url=url)
     timeout = config.get("timeout")
 
     try:
         async with client.put(url, json=data, params=params, timeout=timeout) as rsp:
             log.info(f"http_put status: {rsp.status}")
+            updateDataNodeLoad(app, url, rsp.headers)
             if rsp.status == 201:
                 pass # expected
             elif rsp.status == 404:
@@ -209,18 +429,19 @@ Helper function  - async HTTP PUT for binary data
 async def http_put_binary(app, url, data=None, params=None):
     log.info(f"http_put_binary('{url}') nbytes: {len(data)}")
     rsp_json = None
-    client = get_http_client(app)
+    client = get_http_client(app, url=url)
     timeout = config.get("timeout")
 
     try:
         async with client.put(url, data=data, params=params, timeout=timeout) as rsp:
             log.info(f"http_put_binary status: {rsp.status}")
-            if rsp.status != 201:
-                log.error(f"PUT (binary) request error for {url}: status {rsp.status}")
-                raise HTTPInternalServerError()
-            elif rsp.status == 503:
+            updateDataNodeLoad(app, url, rsp.headers)
+            if rsp.status == 503:
                 log.warn(f"503 error for http_put_binary {url}")
                 raise HTTPServiceUnavailable()
+            elif rsp.status != 201:
+                log.error(f"PUT (binary) request error for {url}: status {rsp.status}")
+                raise HTTPInternalServerError()
 
             rsp_json = await rsp.json()
             log.debug(f"http_put_binary({url}) response: {rsp_json}")
@@ -247,6 +468,7 @@ async def http_delete(app, url, data=None, params=None):
         async with aiohttp.ClientSession() as session:
             async with session.delete(url, json=data, params=params, timeout=timeout) as rsp:
                 log.info(f"http_delete status: {rsp.status}")
+                updateDataNodeLoad(app, url, rsp.headers)
                 if rsp.status == 200:
                     pass  # expectred
                 elif rsp.status == 404:
@@ -276,8 +498,30 @@ async def http_delete(app, url, data=None, params=None):
 Helper function, create a response object using the provided
 JSON data
 """
-async def jsonResponse(request, data, status=200):
-    return json_response(data, headers={}, status=status)
+def _dumpsJson(data, encoded=None):
+    text = json.dumps(data)
+    if not encoded:
+        return text
+    items = ', '.join(f"{json.dumps(key)}: {value}" for key, value in encoded.items())
+    if text == '{}':
+        return '{' + items + '}'
+    return '{' + items + ', ' + text[1:]
+
+async def jsonResponse(request, data, status=200, encoded=None):
+    """ Return a JSON response for data.  encoded is an optional dict of keys
+    to add to data with values that are already JSON text (e.g. from
+    arrayToJson).
+    """
+    text = _dumpsJson(data, encoded=encoded)
+    encoding = getResponseEncoding(request, len(text))
+    if encoding is None:
+        return json_response(text=text, headers={}, status=status)
+    # compress off the event loop
+    loop = asyncio.get_event_loop()
+    body = await loop.run_in_executor(None, _compressBytes, text.encode('utf8'), encoding)
+    log.debug(f"jsonResponse - compressed {len(text)} bytes to {len(body)} with {encoding}")
+    headers = {"Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    return Response(body=body, status=status, content_type="application/json", charset="utf-8", headers=headers)
 
 """
 Convenience method to compute href links
@@ -16,6 +16,7 @@
 import hashlib
 import uuid
 
+from .. import config
 from .. import hsds_logger as log
 
 def getIdHash(id):
@@ -187,6 +188,16 @@ def getS3Key(id):
 
     return key
 
+def getChunkTableKey(dset_id):
+    """ Return the storage key of the binary chunk table for an H5D_CHUNKED_REF
+    dataset.  The table is kept next to the dataset json.
+    Only supported for schema v2 ids.
+    """
+    if not isSchema2Id(dset_id) or getCollectionForId(dset_id) != "datasets":
+        raise ValueError(f"Unexpected id for chunk table: {dset_id}")
+    s3key = getS3Key(dset_id)
+    return s3key[:-len(".dataset.json")] + ".chunks.bin"
+
 def getObjId(s3key):
     """ Return object id given valid s3key """
     if len(s3key) >= 44 and s3key[0:5].isalnum() and s3key[5] == '-' and s3key[6] in ('g', 'd', 'c', 't'):
@@ -224,8 +235,8 @@ def getObjId(s3key):
             elif parts[2] == 't' and parts[4] == ".datatype.json":
                 prefix = 't'  # datatype json
             elif parts[2] == 'd':
-                if parts[4] == ".dataset.json":
-                    prefix = 'd'  # dataset json
+                if parts[4] in (".dataset.json", ".chunks.bin"):
+                    prefix = 'd'  # dataset json or binary chunk table
                 else:
                     # chunk object
                     prefix = 'c'
@@ -376,12 +387,63 @@ def getUuidFromId(id):
     and return the uuid part """
     return id[2:]
 
+def _jumpHash(key, count):
+    """ Jump consistent hash (Lamping & Veach) of the 64-bit key into
+    count buckets.  Going from n to n+1 buckets only moves 1/(n+1) of keys,
+    all of them to the new bucket.
+    """
+    bucket = -1
+    j = 0
+    while j < count:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def getPlacementBlock(rank, block_config):
+    """ Return the chunk placement block shape for the given rank.
+    block_config is an int or a comma separated list of ints (e.g. "16,1"),
+    with the last value used for any remaining dimensions.
+    """
+    if isinstance(block_config, int):
+        block = [block_config,]
+    else:
+        block = [int(x) for x in str(block_config).split(',') if x.strip()]
+    if not block or min(block) < 1:
+        raise ValueError(f"invalid chunk_placement_block: {block_config}")
+    while len(block) < rank:
+        block.append(block[-1])
+    return block[:rank]
+
+def getPlacementKey(id, block_config=1):
+    """ Return the key used to place the given object on a data node.
+    For chunk ids, this is the chunk id with each chunk coordinate divided
+    by the block_config block shape, so that neighboring chunks are placed
+    on the same node.  Other ids are returned as is.
+    """
+    if block_config == 1 or not isValidChunkId(id):
+        return id
+    index = id.index('_')
+    coords = [int(x) for x in id[index+1:].split('_')]
+    block = getPlacementBlock(len(coords), block_config)
+    if max(block) == 1:
+        return id
+    block_coords = [str(coords[dim] // block[dim]) for dim in range(len(coords))]
+    return id[:index+1] + '_'.join(block_coords)
+
 def getObjPartition(id, count):
-    """ Get the id of the dn node that should be handling the given obj id
+    """ Get the id of the dn node that should be handling the given obj id.
+    Uses consistent hashing so that changing the number of nodes only moves
+    about 1/count of the objects to a different node.  Nodes are identified
+    by number, so removing a node other than the last renumbers the nodes
+    after it and moves more objects.  Chunks are placed by blocks of
+    chunk_placement_block chunks.
     """
-    hash_code = getIdHash(id)
-    hash_value = int(hash_code, 16)
-    number = hash_value % count
+    placement_key = getPlacementKey(id, config.get("chunk_placement_block"))
+    m = hashlib.new('md5')
+    m.update(placement_key.encode('utf8'))
+    hash_value = int(m.hexdigest()[:16], 16)
+    number = _jumpHash(hash_value, count)
     log.debug(f"ID {id} resolved to data node {number}, out of {count} data paritions.")
     return number
 
@@ -0,0 +1,136 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# loadUtil.py
+#
+# DN load reporting and SN admission control based on it.
+#
+import time
+from urllib.parse import urlparse
+from aiohttp.web_exceptions import HTTPServiceUnavailable
+
+from .. import config
+from .. import hsds_logger as log
+
+LOAD_HEADER = "X-Hsds-Load"
+LOAD_KEYS = ("queue", "dirty", "latency")
+LATENCY_WEIGHT = 0.1  # weight of each new storage request time in the moving average
+
+
+def recordStorageLatency(app, elapsed):
+    """ Update the moving average of storage request times (in seconds) """
+    latency = app.get("storage_latency")
+    if latency is None:
+        app["storage_latency"] = elapsed
+    else:
+        app["storage_latency"] = latency * (1.0 - LATENCY_WEIGHT) + elapsed * LATENCY_WEIGHT
+
+
+def getNodeLoad(app):
+    """ Return the load of this DN: number of pending storage requests,
+    fraction of the chunk cache that is dirty, and average storage latency
+    """
+    load = {}
+    load["queue"] = len(app["pending_s3_read"]) + len(app["pending_s3_write"])
+    chunk_cache = app["chunk_cache"]
+    if chunk_cache.memTarget > 0:
+        load["dirty"] = chunk_cache.memDirty / chunk_cache.memTarget
+    else:
+        load["dirty"] = 0.0
+    load["latency"] = app.get("storage_latency", 0.0)
+    return load
+
+
+def formatLoad(load):
+    """ Return the load as a header value, e.g. "queue=2; dirty=0.100; latency=0.052" """
+    return f"queue={load['queue']}; dirty={load['dirty']:.3f}; latency={load['latency']:.3f}"
+
+
+def parseLoad(text):
+    """ Return the load dict for the given header value, or None if it is malformed """
+    load = {}
+    try:
+        for item in text.split(';'):
+            key, value = item.strip().split('=')
+            if key in LOAD_KEYS:
+                load[key] = float(value)
+    except ValueError:
+        return None
+    if len(load) != len(LOAD_KEYS):
+        return None
+    return load
+
+
+async def setLoadHeader(request, response):
+    """ DN on_response_prepare handler to piggyback the node load on every response """
+    app = request.app
+    if "chunk_cache" in app:
+        response.headers[LOAD_HEADER] = formatLoad(getNodeLoad(app))
+
+
+def _getNodeUrl(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def updateDataNodeLoad(app, url, headers):
+    """ Save the load reported in the headers of a DN response to a request
+    for the given url
+    """
+    if "dn_load" not in app:
+        return
+    text = headers.get(LOAD_HEADER)
+    if not text:
+        return
+    load = parseLoad(text)
+    if load is None:
+        log.warn(f"unexpected {LOAD_HEADER} header: {text}")
+        return
+    app["dn_load"][_getNodeUrl(url)] = (time.time(), load)
+
+
+def getOverloadReason(app, dn_url):
+    """ Return a description of why the DN at dn_url is too busy to take more
+    requests, or None if it isn't (or hasn't reported recently)
+    """
+    if "dn_load" not in app:
+        return None
+    dn_load = app["dn_load"]
+    dn_url = _getNodeUrl(dn_url)
+    if dn_url not in dn_load:
+        return None
+    report_time, load = dn_load[dn_url]
+    if time.time() - report_time > config.get("dn_load_ttl"):
+        # stale - let requests through to get a new report
+        del dn_load[dn_url]
+        return None
+    max_queue = int(config.get("dn_max_queue"))
+    if max_queue > 0 and load["queue"] > max_queue:
+        return f"{load['queue']:.0f} pending storage requests"
+    max_dirty_ratio = float(config.get("dn_max_dirty_ratio"))
+    if max_dirty_ratio > 0 and load["dirty"] > max_dirty_ratio:
+        return f"dirty ratio of {load['dirty']:.3f}"
+    max_latency = float(config.get("dn_max_storage_latency"))
+    if max_latency > 0 and load["latency"] > max_latency:
+        return f"storage latency of {load['latency']:.3f}s"
+    return None
+
+
+def checkDataNodeLoad(app, dn_url):
+    """ Raise HTTPServiceUnavailable if the DN at dn_url has reported it is
+    overloaded, rather than send it a request that would stall
+    """
+    reason = getOverloadReason(app, dn_url)
+    if reason is not None:
+        app["req_count"]["dn_busy"] += 1
+        log.warn(f"DN {dn_url} overloaded ({reason}), returning 503")
+        raise HTTPServiceUnavailable()
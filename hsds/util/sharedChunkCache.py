@@ -0,0 +1,247 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# sharedChunkCache.py
+#
+# Chunk cache shared by the worker processes on a host.
+#
+import os
+import fcntl
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from .. import hsds_logger as log
+
+SUFFIX = ".npy"
+
+
+class SharedChunkCache():
+    """
+    Keep decoded chunk arrays as .npy files in a shared memory directory
+    (e.g. under /dev/shm) so that every worker process on the host can use
+    them.  Arrays are returned as read-only memory maps of the files, so
+    reads don't copy the data.
+
+    A chunk is written once, by the first process to add it: the file is
+    written under a temporary name and linked into place, and later adds
+    of the same chunk are ignored.  Reads bump the file time, and the
+    process that takes the cache over mem_target removes the least
+    recently used files (holding a lock on the directory while it does).
+    Removed files stay valid for processes that have them mapped.
+
+    Files are written on a background thread so adds don't block the event
+    loop.  A running total of the cache size is kept in the lock file, and
+    the directory is only scanned when that goes over mem_target.
+
+    Entries can't be dirty or updated, so this is only for chunks that
+    aren't modified in place, e.g. SN reads for read-only domains.
+    Supports the subset of the LruCache interface used for those.
+    """
+    def __init__(self, path, mem_target=32*1024*1024):
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._mem_target = mem_target
+        self._mem_used = 0  # as of this process's last add
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}  # map of keys being written to their arrays
+        self._lock_path = os.path.join(path, ".lock")
+        self._last = (None, None)  # most recently found key and array
+        self._hit_count = 0
+        self._miss_count = 0
+
+    def _getFilePath(self, key):
+        if not key.startswith("c") or os.sep in key:
+            raise ValueError(f"Unexpected chunk id: {key}")
+        return os.path.join(self._path, key + SUFFIX)
+
+    def _load(self, key):
+        file_path = self._getFilePath(key)
+        try:
+            arr = np.load(file_path, mmap_mode='r', allow_pickle=False)
+        except (FileNotFoundError, ValueError):
+            # not cached, or removed before it could be read
+            return None
+        try:
+            os.utime(file_path)  # mark as recently used
+        except FileNotFoundError:
+            pass  # removed by another process, the array is still valid
+        return arr
+
+    def __contains__(self, key):
+        """ Test if key is in the cache.  The array is loaded here so it
+        can't be removed between this and the following getitem """
+        arr = self._pending.get(key)  # not written yet
+        if arr is None:
+            arr = self._load(key)
+        if arr is None:
+            self._miss_count += 1
+            return False
+        self._hit_count += 1
+        self._last = (key, arr)
+        return True
+
+    def __getitem__(self, key):
+        """ Return read-only numpy array from cache """
+        last_key, arr = self._last
+        self._last = (None, None)
+        if last_key != key:
+            arr = self._load(key)
+        if arr is None:
+            raise KeyError(key)
+        return arr
+
+    def __setitem__(self, key, data):
+        if not isinstance(data, np.ndarray):
+            raise TypeError(f"Expected ndarray but got type: {type(data)}")
+        if data.dtype.hasobject:
+            # variable length types can't be memory mapped
+            log.debug(f"SharedChunkCache - not caching {key} with dtype {data.dtype}")
+            return
+        if data.nbytes > self._mem_target:
+            return
+        file_path = self._getFilePath(key)
+        if key in self._pending:
+            return  # already being written
+        self._pending[key] = data
+        self._executor.submit(self._save, key, file_path, data)
+
+    def _save(self, key, file_path, data):
+        # runs on the executor thread
+        try:
+            if os.path.exists(file_path):
+                return  # another process got here first
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, data, allow_pickle=False)
+                os.link(tmp_path, file_path)
+                log.debug(f"SharedChunkCache - added {key} [{data.nbytes} bytes]")
+            except FileExistsError:
+                log.debug(f"SharedChunkCache - {key} added by another process")
+                return
+            except OSError as oe:
+                log.warn(f"SharedChunkCache - unable to add {key}: {oe}")
+                return
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+            lock_fd = self._lock()
+            try:
+                mem_used = self._readMemUsed(lock_fd) + os.path.getsize(file_path)
+                if mem_used > self._mem_target:
+                    mem_used = self._reduceCache(keep=file_path)
+                self._writeMemUsed(lock_fd, mem_used)
+            finally:
+                os.close(lock_fd)  # releases the lock
+        finally:
+            del self._pending[key]
+
+    def waitForWrites(self):
+        """ Block until the adds made so far are written """
+        self._executor.submit(lambda: None).result()
+
+    def _lock(self):
+        """ Lock the directory and return the lock file descriptor.  The
+        lock file holds the running size total of the cache """
+        lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT)
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        return lock_fd
+
+    def _readMemUsed(self, lock_fd):
+        data = os.pread(lock_fd, 32, 0)
+        return int(data) if data else 0
+
+    def _writeMemUsed(self, lock_fd, mem_used):
+        os.ftruncate(lock_fd, 0)
+        os.pwrite(lock_fd, str(mem_used).encode(), 0)
+        self._mem_used = mem_used
+
+    def _scan(self):
+        """ Return list of (mtime, size, path) for the cached chunks """
+        entries = []
+        with os.scandir(self._path) as it:
+            for entry in it:
+                if not entry.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _reduceCache(self, keep=None):
+        # remove least recently used files until we are under mem_target,
+        # called with the directory locked.  Returns the new size
+        entries = self._scan()
+        mem_used = sum(entry[1] for entry in entries)
+        if mem_used > self._mem_target:
+            entries.sort()
+            for (mtime, size, file_path) in entries:
+                if mem_used <= self._mem_target:
+                    break
+                if file_path == keep:
+                    continue
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass
+                mem_used -= size
+            log.debug(f"SharedChunkCache - reduced to {mem_used} bytes")
+        return mem_used
+
+    def clearCache(self):
+        """ Remove all entries """
+        self.waitForWrites()
+        lock_fd = self._lock()
+        try:
+            for (mtime, size, file_path) in self._scan():
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass
+            self._writeMemUsed(lock_fd, 0)
+        finally:
+            os.close(lock_fd)
+
+    def __len__(self):
+        """ Number of chunks in the cache """
+        return len(self._scan())
+
+    @property
+    def cacheUtilizationPercent(self):
+        return int((self._mem_used/self._mem_target)*100.0)
+
+    @property
+    def dirtyCount(self):
+        return 0
+
+    @property
+    def memUsed(self):
+        return self._mem_used
+
+    @property
+    def memTarget(self):
+        return self._mem_target
+
+    @property
+    def memDirty(self):
+        return 0
+
+    @property
+    def stats(self):
+        stats = {}
+        stats["mem_used"] = self._mem_used
+        stats["mem_target"] = self._mem_target
+        stats["hit_count"] = self._hit_count
+        stats["miss_count"] = self._miss_count
+        return stats
@@ -14,6 +14,7 @@
 # storage access functions.  Abstracts S3 API vs Azure storage access
 #
 import json
+import time
 import zlib
 import numpy as np
 from numba import jit
@@ -22,6 +23,7 @@ from aiohttp.web_exceptions import HTTPInternalServerError
 
 from .. import hsds_logger as log
 from .s3Client import S3Client
+from .loadUtil import recordStorageLatency
 try:
     from .azureBlobClient import AzureBlobClient
 except ImportError:
@@ -146,25 +148,80 @@ async def getStorBytes(app, key, shuffle=0, deflate_level=None, offset=0, length
         key = key[1:]  # no leading slash
     log.info(f"getStorBytes({bucket}/{key})")
 
+    start_time = time.time()
     data = await client.get_object(bucket=bucket, key=key, offset=offset, length=length)
+    recordStorageLatency(app, time.time() - start_time)
 
     if data and len(data) > 0:
         log.info(f"read: {len(data)} bytes for key: {key}")
-        if deflate_level is not None:
-            try:
-                unzip_data = zlib.decompress(data)
-                log.info(f"uncompressed to {len(unzip_data)} bytes")
-                data = unzip_data
-            except zlib.error as zlib_error:
-                log.info(f"zlib_err: {zlib_error}")
-                log.warn(f"unable to uncompress obj: {key}")
-        if shuffle > 0:
-            unshuffled = _unshuffle(shuffle, data)
-            log.info(f"unshuffled to {len(unshuffled)} bytes")
-            data = unshuffled
+        data = decodeStorBytes(data, shuffle=shuffle, deflate_level=deflate_level, key=key)
 
     return data
 
+def decodeStorBytes(data, shuffle=0, deflate_level=None, key=None):
+    """ Uncompress and unshuffle bytes read from storage
+    """
+    if deflate_level is not None:
+        try:
+            unzip_data = zlib.decompress(data)
+            log.info(f"uncompressed to {len(unzip_data)} bytes")
+            data = unzip_data
+        except zlib.error as zlib_error:
+            log.info(f"zlib_err: {zlib_error}")
+            log.warn(f"unable to uncompress obj: {key}")
+    if shuffle > 0:
+        unshuffled = _unshuffle(shuffle, data)
+        log.info(f"unshuffled to {len(unshuffled)} bytes")
+        data = unshuffled
+    return data
+
+def encodeStorBytes(data, shuffle=0, deflate_level=None, key=None):
+    """ Shuffle and compress bytes to be written to storage
+    """
+    if shuffle > 0:
+        shuffled_data = _shuffle(shuffle, data)
+        log.info(f"shuffled data to {len(shuffled_data)}")
+        data = shuffled_data
+
+    if deflate_level is not None:
+        try:
+            # the keyword parameter is enabled with py3.6
+            # zip_data = zlib.compress(data, level=deflate_level)
+            zip_data = zlib.compress(data, deflate_level)
+            log.info(f"compressed from {len(data)} bytes to {len(zip_data)} bytes with level: {deflate_level}")
+            data = zip_data
+        except zlib.error as zlib_error:
+            log.info(f"zlib_err: {zlib_error}")
+            log.warn(f"unable to compress obj: {key}, using raw bytes")
+    return data
+
+def isDeflated(data):
+    """ Return True if data starts with a valid zlib stream, i.e. was
+    compressed by encodeStorBytes rather than stored as is
+    """
+    if not data or len(data) < 2:
+        return False
+    if (data[0] & 0x0f) != 8 or ((data[0] << 8) | data[1]) % 31 != 0:
+        return False
+    try:
+        zlib.decompressobj().decompress(data[:64])
+    except zlib.error:
+        return False
+    return True
+
+def splitS3Path(s3path):
+    """ Return bucket and key for the given s3path """
+    if s3path.startswith("s3://"):
+        # trim off the s3:// if found
+        path = s3path[5:]
+    else:
+        path = s3path
+    index = path.find('/')   # split bucket and key
+    if index < 1:
+        log.error(f"s3path is invalid: {s3path}")
+        raise HTTPInternalServerError()
+    return path[:index], path[(index+1):]
+
 async def putStorJSONObj(app, key, json_obj, bucket=None):
     """ Store JSON data as storage object with given key
     """
@@ -192,23 +249,11 @@ async def putStorBytes(app, key, data, shuffle=0, deflate_level=None, bucket=Non
     if key[0] == '/':
         key = key[1:]  # no leading slash
     log.info(f"putStorBytes({bucket}/{key}), {len(data)} bytes shuffle: {shuffle} deflate: {deflate_level}")
-    if shuffle > 0:
-        shuffled_data = _shuffle(shuffle, data)
-        log.info(f"shuffled data to {len(shuffled_data)}")
-        data = shuffled_data
-
-    if deflate_level is not None:
-        try:
-            # the keyword parameter is enabled with py3.6
-            # zip_data = zlib.compress(data, level=deflate_level)
-            zip_data = zlib.compress(data, deflate_level)
-            log.info(f"compressed from {len(data)} bytes to {len(zip_data)} bytes with level: {deflate_level}")
-            data = zip_data
-        except zlib.error as zlib_error:
-            log.info(f"zlib_err: {zlib_error}")
-            log.warn(f"unable to compress obj: {key}, using raw bytes")
+    data = encodeStorBytes(data, shuffle=shuffle, deflate_level=deflate_level, key=key)
 
+    start_time = time.time()
     rsp = await client.put_object(key, data, bucket=bucket)
+    recordStorageLatency(app, time.time() - start_time)
 
     return rsp
 
@@ -0,0 +1,149 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# valueCache.py
+#
+# Single-flight and short-lived cache for dataset value reads on the SN.
+#
+import asyncio
+import time
+from collections import OrderedDict
+
+from .. import hsds_logger as log
+
+
+class ValueCache():
+    """
+    Coalesce identical concurrent dataset reads and optionally keep the
+    results for ttl seconds.
+
+    Reads are identified by dataset id plus a caller-supplied key (e.g.
+    bucket and selection).  While a read is in flight, other requests for
+    the same key wait on it rather than starting their own.  With ttl > 0
+    the resulting arrays are kept (up to mem_target bytes, least recently
+    used first out) until they expire or the dataset is invalidated.
+    """
+    def __init__(self, ttl=0, mem_target=32*1024*1024):
+        self._ttl = ttl
+        self._mem_target = mem_target
+        self._mem_used = 0
+        self._inflight = {}  # key -> task
+        self._cache = OrderedDict()  # key -> (expire_time, arr)
+        self._generation = {}  # dset_id -> number of invalidations
+        self._refs = {}  # dset_id -> number of cached results and reads not done
+        self._hit_count = 0
+        self._coalesce_count = 0
+        self._miss_count = 0
+
+    def _getKey(self, dset_id, key):
+        generation = self._generation.get(dset_id, 0)
+        return (dset_id, generation, key)
+
+    def _addRef(self, dset_id):
+        self._refs[dset_id] = self._refs.get(dset_id, 0) + 1
+
+    def _releaseRef(self, dset_id):
+        # once nothing of the dataset is cached or being read, keys can't
+        # collide with results from before an invalidation
+        self._refs[dset_id] -= 1
+        if self._refs[dset_id] == 0:
+            del self._refs[dset_id]
+            self._generation.pop(dset_id, None)
+
+    def _removeCached(self, cache_key):
+        (expire_time, arr) = self._cache.pop(cache_key)
+        self._mem_used -= arr.nbytes
+        self._releaseRef(cache_key[0])
+
+    def _addCached(self, cache_key, arr):
+        if self._ttl <= 0 or arr.nbytes > self._mem_target:
+            return
+        if cache_key in self._cache:
+            self._removeCached(cache_key)
+        while self._cache and self._mem_used + arr.nbytes > self._mem_target:
+            # evict least recently used
+            self._removeCached(next(iter(self._cache)))
+        self._cache[cache_key] = (time.time() + self._ttl, arr)
+        self._mem_used += arr.nbytes
+        self._addRef(cache_key[0])
+
+    async def get(self, dset_id, key, read_func):
+        """ Return the array for the given dataset and key, calling read_func
+        (a function returning an awaitable that returns a numpy array) only
+        if the result isn't cached or already being read.
+        The returned array is shared and must not be modified.
+        """
+        cache_key = self._getKey(dset_id, key)
+        if cache_key in self._cache:
+            (expire_time, arr) = self._cache[cache_key]
+            if expire_time > time.time():
+                self._cache.move_to_end(cache_key)
+                self._hit_count += 1
+                log.debug(f"ValueCache - hit for {dset_id}")
+                return arr
+            self._removeCached(cache_key)
+
+        if cache_key in self._inflight:
+            self._coalesce_count += 1
+            log.debug(f"ValueCache - joining in-flight read for {dset_id}")
+            task = self._inflight[cache_key]
+        else:
+            self._miss_count += 1
+            # run the read as its own task so that a cancelled request
+            # doesn't cancel the read for other waiters
+            task = asyncio.ensure_future(read_func())
+            self._inflight[cache_key] = task
+            self._addRef(dset_id)
+
+            def read_done(task):
+                if self._inflight.get(cache_key) is task:
+                    del self._inflight[cache_key]
+                if not task.cancelled() and task.exception() is None:
+                    if cache_key[1] == self._generation.get(dset_id, 0):
+                        self._addCached(cache_key, task.result())
+                self._releaseRef(dset_id)
+
+            task.add_done_callback(read_done)
+        return await asyncio.shield(task)
+
+    def invalidate(self, dset_id):
+        """ Drop cached results for the dataset.  Reads in flight are not
+        shared with requests that start after this call.
+        """
+        if dset_id not in self._refs:
+            return  # nothing cached or being read
+        self._generation[dset_id] = self._generation.get(dset_id, 0) + 1
+        for cache_key in list(self._cache.keys()):
+            if cache_key[0] == dset_id:
+                self._removeCached(cache_key)
+        for cache_key in list(self._inflight.keys()):
+            if cache_key[0] == dset_id:
+                del self._inflight[cache_key]
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def memUsed(self):
+        return self._mem_used
+
+    @property
+    def stats(self):
+        stats = {}
+        stats["count"] = len(self._cache)
+        stats["inflight_count"] = len(self._inflight)
+        stats["mem_used"] = self._mem_used
+        stats["mem_target"] = self._mem_target
+        stats["hit_count"] = self._hit_count
+        stats["coalesce_count"] = self._coalesce_count
+        stats["miss_count"] = self._miss_count
+        return stats
@@ -14,8 +14,8 @@ import os
 import sys
 
 
-unit_tests = ('arrayUtilTest', 'chunkUtilTest', 'domainUtilTest',
-    'dsetUtilTest', 'hdf5dtypeTest', 'idUtilTest', 'lruCacheTest')
+unit_tests = ('arrayUtilTest', 'chunkExecutorTest', 'chunkTableCacheTest', 'chunkUtilTest', 'domainUtilTest',
+    'dsetUtilTest', 'hdf5dtypeTest', 'hotChunkTrackerTest', 'httpUtilTest', 'idUtilTest', 'loadUtilTest', 'localDataNodeTest', 'lruCacheTest', 'sharedChunkCacheTest', 'valueCacheTest')
 
 integ_tests = ('uptest', 'setup_test', 'domain_test', 'group_test', 'link_test',
  'attr_test', 'datatype_test', 'dataset_test', 'acl_test', 'value_test', 'pointsel_test', 'query_test', 'vlen_test' )
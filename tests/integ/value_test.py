@@ -12,6 +12,7 @@
 import unittest
 import requests
 import json
+import zlib
 import helper
 import config
 
@@ -1840,6 +1841,283 @@ class ValueTest(unittest.TestCase):
         self.assertEqual(len(row), 1)
         self.assertEqual(row[0], 22)
 
+    def testGetDatasetChunk(self):
+        # read chunks as stored with GET /datasets/{id}/chunks/{index}
+        print("testGetDatasetChunk", self.base_domain)
+        headers = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req["Content-Type"] = "application/octet-stream"
+        # get domain
+        req = helper.getEndpoint() + '/'
+        rsp = requests.get(req, headers=headers)
+        rspJson = json.loads(rsp.text)
+        self.assertTrue("root" in rspJson)
+        root_uuid = rspJson["root"]
+
+        # create the dataset
+        payload = {'type': 'H5T_STD_I32LE', 'shape': [2000, 2000]}
+        gzip_filter = {'class': 'H5Z_FILTER_DEFLATE', 'id': 1, 'level': 9, 'name': 'deflate'}
+        layout = {'class': 'H5D_CHUNKED', 'dims': [500, 500]}
+        payload['creationProperties'] = {'layout': layout, 'filters': [gzip_filter,] }
+        req = self.endpoint + "/datasets"
+        rsp = requests.post(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 201)  # create dataset
+        rspJson = json.loads(rsp.text)
+        dset_uuid = rspJson['id']
+        self.assertTrue(helper.validateId(dset_uuid))
+
+        # link new dataset as 'dset'
+        name = 'dset'
+        req = self.endpoint + "/groups/" + root_uuid + "/links/" + name
+        payload = {"id": dset_uuid}
+        rsp = requests.put(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 201)
+
+        # get the chunk layout used
+        req = self.endpoint + "/datasets/" + dset_uuid
+        rsp = requests.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        chunk_dims = rspJson["layout"]["dims"]
+        chunk_grid = [-(-2000 // extent) for extent in chunk_dims]
+
+        # write 1 to 8 to the top left corner
+        req = self.endpoint + "/datasets/" + dset_uuid + "/value"
+        data = bytearray(4*8)
+        for i in range(8):
+            data[i*4] = i + 1
+        params = {"select": "[0:2,0:4]"}
+        rsp = requests.put(req, data=data, params=params, headers=headers_bin_req)
+        self.assertEqual(rsp.status_code, 200)
+
+        # read the first chunk
+        req = self.endpoint + "/datasets/" + dset_uuid + "/chunks/0_0"
+        rsp = requests.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        self.assertEqual(rsp.headers['Content-Type'], "application/octet-stream")
+        self.assertEqual(json.loads(rsp.headers["X-Hsds-Chunk-Shape"]), chunk_dims)
+        filters = json.loads(rsp.headers["X-Hsds-Chunk-Filters"])
+        chunk_bytes = rsp.content
+        if filters:
+            # DNs only store compressed chunks if configured to
+            self.assertEqual(len(filters), 1)
+            self.assertEqual(filters[0]["class"], 'H5Z_FILTER_DEFLATE')
+            chunk_bytes = zlib.decompress(chunk_bytes)
+        self.assertEqual(len(chunk_bytes), chunk_dims[0] * chunk_dims[1] * 4)
+        for i in range(8):
+            offset = ((i // 4) * chunk_dims[1] + (i % 4)) * 4
+            self.assertEqual(chunk_bytes[offset], i + 1)
+        self.assertEqual(sum(chunk_bytes), sum(range(9)))
+
+        # chunks that haven't been written aren't found
+        index = f"{chunk_grid[0] - 1}_{chunk_grid[1] - 1}"
+        req = self.endpoint + "/datasets/" + dset_uuid + "/chunks/" + index
+        rsp = requests.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 404)
+
+        # invalid chunk indexes
+        for index in (f"{chunk_grid[0]}_0", "0", "0_0_0", "a_0", "-1_0"):
+            req = self.endpoint + "/datasets/" + dset_uuid + "/chunks/" + index
+            rsp = requests.get(req, headers=headers)
+            self.assertEqual(rsp.status_code, 400)
+
+    def testPutDatasetChunk(self):
+        # write whole chunks with PUT /datasets/{id}/chunks/{index}
+        print("testPutDatasetChunk", self.base_domain)
+        headers = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req["Content-Type"] = "application/octet-stream"
+        # get domain
+        req = helper.getEndpoint() + '/'
+        rsp = requests.get(req, headers=headers)
+        rspJson = json.loads(rsp.text)
+        self.assertTrue("root" in rspJson)
+        root_uuid = rspJson["root"]
+
+        # create the dataset
+        payload = {'type': 'H5T_STD_I32LE', 'shape': [2000, 2000]}
+        gzip_filter = {'class': 'H5Z_FILTER_DEFLATE', 'id': 1, 'level': 9, 'name': 'deflate'}
+        layout = {'class': 'H5D_CHUNKED', 'dims': [500, 500]}
+        payload['creationProperties'] = {'layout': layout, 'filters': [gzip_filter,] }
+        req = self.endpoint + "/datasets"
+        rsp = requests.post(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 201)  # create dataset
+        rspJson = json.loads(rsp.text)
+        dset_uuid = rspJson['id']
+        self.assertTrue(helper.validateId(dset_uuid))
+
+        # link new dataset as 'dset'
+        name = 'dset'
+        req = self.endpoint + "/groups/" + root_uuid + "/links/" + name
+        payload = {"id": dset_uuid}
+        rsp = requests.put(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 201)
+
+        # get the chunk layout used
+        req = self.endpoint + "/datasets/" + dset_uuid
+        rsp = requests.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        chunk_dims = rspJson["layout"]["dims"]
+        chunk_size = chunk_dims[0] * chunk_dims[1] * 4
+
+        # chunk with 1 to 4 at the start of the first row
+        data = bytearray(chunk_size)
+        for i in range(4):
+            data[i*4] = i + 1
+        chunk_url = self.endpoint + "/datasets/" + dset_uuid + "/chunks/"
+        value_url = self.endpoint + "/datasets/" + dset_uuid + "/value"
+
+        # write a deflated chunk
+        deflate_headers = dict(headers_bin_req)
+        deflate_headers["X-Hsds-Chunk-Filters"] = json.dumps([{'class': 'H5Z_FILTER_DEFLATE', 'id': 1, 'level': 9}])
+        rsp = requests.put(chunk_url + "0_0", data=zlib.compress(bytes(data), 9), headers=deflate_headers)
+        self.assertEqual(rsp.status_code, 201)
+        params = {"select": "[0:1,0:5]"}
+        rsp = requests.get(value_url, params=params, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        self.assertEqual(rspJson["value"], [[1, 2, 3, 4, 0],])
+
+        # write an unfiltered chunk
+        start = chunk_dims[1]
+        rsp = requests.put(chunk_url + "0_1", data=bytes(data), headers=headers_bin_req)
+        self.assertEqual(rsp.status_code, 201)
+        params = {"select": f"[0:1,{start}:{start+5}]"}
+        rsp = requests.get(value_url, params=params, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        self.assertEqual(rspJson["value"], [[1, 2, 3, 4, 0],])
+
+        # replace the chunk
+        data[0] = 9
+        rsp = requests.put(chunk_url + "0_1", data=zlib.compress(bytes(data)), headers=deflate_headers)
+        self.assertEqual(rsp.status_code, 201)
+        rsp = requests.get(value_url, params=params, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        self.assertEqual(rspJson["value"], [[9, 2, 3, 4, 0],])
+
+        # chunks of the wrong size
+        rsp = requests.put(chunk_url + "1_0", data=bytes(data[:-4]), headers=headers_bin_req)
+        self.assertEqual(rsp.status_code, 400)
+        rsp = requests.put(chunk_url + "1_0", data=bytes(data) + bytes(4), headers=headers_bin_req)
+        self.assertEqual(rsp.status_code, 400)
+        rsp = requests.put(chunk_url + "1_0", data=zlib.compress(bytes(data[:-4])), headers=deflate_headers)
+        self.assertEqual(rsp.status_code, 400)
+        rsp = requests.put(chunk_url + "1_0", data=zlib.compress(bytes(data) + bytes(4)), headers=deflate_headers)
+        self.assertEqual(rsp.status_code, 400)
+        # not compressed, though the filters say it is
+        rsp = requests.put(chunk_url + "1_0", data=bytes(data), headers=deflate_headers)
+        self.assertEqual(rsp.status_code, 400)
+
+        # the dataset doesn't use the shuffle filter
+        shuffle_headers = dict(headers_bin_req)
+        shuffle_headers["X-Hsds-Chunk-Filters"] = json.dumps([{'class': 'H5Z_FILTER_SHUFFLE', 'id': 2}])
+        rsp = requests.put(chunk_url + "1_0", data=bytes(data), headers=shuffle_headers)
+        self.assertEqual(rsp.status_code, 400)
+
+        # nothing was written by the failed requests
+        rsp = requests.get(chunk_url + "1_0", headers=headers)
+        self.assertEqual(rsp.status_code, 404)
+
+    def testShuffleDatasetChunk(self):
+        # read and write chunks of a dataset using the shuffle and deflate filters
+        print("testShuffleDatasetChunk", self.base_domain)
+        headers = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req = helper.getRequestHeaders(domain=self.base_domain)
+        headers_bin_req["Content-Type"] = "application/octet-stream"
+        # get domain
+        req = helper.getEndpoint() + '/'
+        rsp = requests.get(req, headers=headers)
+        rspJson = json.loads(rsp.text)
+        self.assertTrue("root" in rspJson)
+        root_uuid = rspJson["root"]
+
+        # create the dataset
+        payload = {'type': 'H5T_STD_I32LE', 'shape': [2000, 2000]}
+        shuffle_filter = {'class': 'H5Z_FILTER_SHUFFLE', 'id': 2, 'name': 'shuffle'}
+        gzip_filter = {'class': 'H5Z_FILTER_DEFLATE', 'id': 1, 'level': 9, 'name': 'deflate'}
+        layout = {'class': 'H5D_CHUNKED', 'dims': [500, 500]}
+        payload['creationProperties'] = {'layout': layout, 'filters': [shuffle_filter, gzip_filter] }
+        req = self.endpoint + "/datasets"
+        rsp = requests.post(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 201)  # create dataset
+        rspJson = json.loads(rsp.text)
+        dset_uuid = rspJson['id']
+        self.assertTrue(helper.validateId(dset_uuid))
+
+        # link new dataset as 'dset'
+        name = 'dset'
+        req = self.endpoint + "/groups/" + root_uuid + "/links/" + name
+        payload = {"id": dset_uuid}
+        rsp = requests.put(req, data=json.dumps(payload), headers=headers)
+        self.assertEqual(rsp.status_code, 201)
+
+        # get the chunk layout used
+        req = self.endpoint + "/datasets/" + dset_uuid
+        rsp = requests.get(req, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        chunk_dims = rspJson["layout"]["dims"]
+        chunk_size = chunk_dims[0] * chunk_dims[1] * 4
+        chunk_url = self.endpoint + "/datasets/" + dset_uuid + "/chunks/"
+        value_url = self.endpoint + "/datasets/" + dset_uuid + "/value"
+
+        # write multi-byte values to the start of the first row
+        values = [1, 258, 65539, 16777220]
+        params = {"select": "[0:1,0:4]"}
+        payload = {"value": [values,]}
+        rsp = requests.put(value_url, data=json.dumps(payload), params=params, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+
+        # read the chunk and undo the filters reported for it
+        rsp = requests.get(chunk_url + "0_0", headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        filters = json.loads(rsp.headers["X-Hsds-Chunk-Filters"])
+        chunk_bytes = rsp.content
+        if filters:
+            # DNs only store filtered chunks if configured to
+            filter_classes = [item["class"] for item in filters]
+            self.assertEqual(filter_classes, ['H5Z_FILTER_SHUFFLE', 'H5Z_FILTER_DEFLATE'])
+            chunk_bytes = zlib.decompress(chunk_bytes)
+            count = len(chunk_bytes) // 4
+            unshuffled = bytearray(len(chunk_bytes))
+            for i in range(4):
+                unshuffled[i::4] = chunk_bytes[(i*count):((i+1)*count)]
+            chunk_bytes = bytes(unshuffled)
+        self.assertEqual(len(chunk_bytes), chunk_size)
+        for i in range(4):
+            self.assertEqual(int.from_bytes(chunk_bytes[(i*4):((i+1)*4)], "little"), values[i])
+
+        # write a shuffled and deflated chunk
+        data = bytearray(chunk_size)
+        for i in range(4):
+            data[(i*4):((i+1)*4)] = values[i].to_bytes(4, "little")
+        count = chunk_size // 4
+        shuffled = bytearray(chunk_size)
+        for i in range(4):
+            shuffled[(i*count):((i+1)*count)] = data[i::4]
+        filter_headers = dict(headers_bin_req)
+        filter_headers["X-Hsds-Chunk-Filters"] = json.dumps([shuffle_filter, gzip_filter])
+        rsp = requests.put(chunk_url + "0_1", data=zlib.compress(bytes(shuffled), 9), headers=filter_headers)
+        self.assertEqual(rsp.status_code, 201)
+        start = chunk_dims[1]
+        params = {"select": f"[0:1,{start}:{start+5}]"}
+        rsp = requests.get(value_url, params=params, headers=headers)
+        self.assertEqual(rsp.status_code, 200)
+        rspJson = json.loads(rsp.text)
+        self.assertEqual(rspJson["value"], [values + [0,],])
+
+        # deflated chunks must be shuffled first
+        deflate_headers = dict(headers_bin_req)
+        deflate_headers["X-Hsds-Chunk-Filters"] = json.dumps([gzip_filter,])
+        rsp = requests.put(chunk_url + "1_0", data=zlib.compress(bytes(data), 9), headers=deflate_headers)
+        self.assertEqual(rsp.status_code, 400)
+        filter_headers["X-Hsds-Chunk-Filters"] = json.dumps([gzip_filter, shuffle_filter])
+        rsp = requests.put(chunk_url + "1_0", data=zlib.compress(bytes(shuffled), 9), headers=filter_headers)
+        self.assertEqual(rsp.status_code, 400)
+
     def testShuffleFilter(self):
         # test Dataset with creation property list
         print("testShuffleFilter", self.base_domain)
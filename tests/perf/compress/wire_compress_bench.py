@@ -0,0 +1,78 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# Measure zlib compression of typical chunk payloads to pick settings for
+# wire_compress_min_size and wire_compress_level.  For each payload and level
+# the break-even bandwidth is the network speed below which sending the data
+# compressed (compress + transfer + decompress) is faster than sending it raw.
+#
+# usage: python wire_compress_bench.py [--size=bytes] [--repeat=n]
+#
+import sys
+import time
+import zlib
+import numpy as np
+
+
+def getPayloads(size):
+    count = size // 8
+    payloads = {}
+    payloads["zeros"] = bytes(size)
+    sparse = np.zeros((count,), dtype='f8')
+    sparse[::97] = np.random.random(len(sparse[::97]))
+    payloads["sparse f8"] = sparse.tobytes()
+    payloads["counter i8"] = np.arange(count, dtype='i8').tobytes()
+    x = np.linspace(0, 100, count * 2, dtype='f4')
+    payloads["smooth f4"] = np.sin(x).tobytes()
+    payloads["random f8"] = np.random.random(count).tobytes()
+    return payloads
+
+
+def timeit(func, repeat):
+    start = time.time()
+    for i in range(repeat):
+        result = func()
+    return result, (time.time() - start) / repeat
+
+
+def main():
+    size = 4 * 1024 * 1024
+    repeat = 3
+    for arg in sys.argv[1:]:
+        if arg.startswith("--size="):
+            size = int(arg[len("--size="):])
+        elif arg.startswith("--repeat="):
+            repeat = int(arg[len("--repeat="):])
+        else:
+            print("usage: python wire_compress_bench.py [--size=bytes] [--repeat=n]")
+            sys.exit(1)
+
+    print(f"payload size: {size} bytes")
+    print(f"{'payload':12} {'level':>5} {'ratio':>7} {'comp MB/s':>10} {'decomp MB/s':>12} {'break-even MB/s':>16}")
+    for name, data in getPayloads(size).items():
+        for level in (1, 6):
+            zip_data, comp_time = timeit(lambda: zlib.compress(data, level), repeat)
+            unzip_data, decomp_time = timeit(lambda: zlib.decompress(zip_data), repeat)
+            assert unzip_data == data
+            saved = len(data) - len(zip_data)
+            if saved > 0:
+                break_even = saved / (comp_time + decomp_time) / 1e6
+                break_even = f"{break_even:.0f}"
+            else:
+                break_even = "never"
+            ratio = len(data) / len(zip_data)
+            comp_rate = len(data) / comp_time / 1e6
+            decomp_rate = len(data) / decomp_time / 1e6
+            print(f"{name:12} {level:>5} {ratio:>7.2f} {comp_rate:>10.0f} {decomp_rate:>12.0f} {break_even:>16}")
+
+
+main()
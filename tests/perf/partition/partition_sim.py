@@ -0,0 +1,88 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+#
+# Simulate how many objects change data node when the number of data nodes
+# changes, for the consistent placement used by getObjPartition versus
+# the md5 modulo placement it replaced.  Nodes are identified by number, so
+# besides adding (or removing) the last node, this shows removing a node from
+# the middle, where the nodes after it are renumbered (as when a pod is
+# removed on Kubernetes, where node numbers follow the sorted pod IPs).
+#
+# usage: python partition_sim.py [--count=num_ids] [--max-nodes=n]
+#
+import sys
+import os
+import time
+
+if "CONFIG_DIR" not in os.environ:
+    os.environ["CONFIG_DIR"] = "../../../admin/config/"
+
+sys.path.append('../../..')
+from hsds.util.idUtil import createObjId, getIdHash, getObjPartition
+
+
+def moduloPartition(id, count):
+    return int(getIdHash(id), 16) % count
+
+
+def movedOnRemove(partition, id, node_count, removed):
+    """ Return True if the object moves to another node when node number
+    removed is dropped from node_count + 1 nodes, and the nodes after it
+    are renumbered.
+    """
+    old_node = partition(id, node_count + 1)
+    new_node = partition(id, node_count)
+    if new_node >= removed:
+        new_node += 1  # number the node had before the removal
+    return old_node != new_node
+
+
+def main():
+    num_ids = 100000
+    max_nodes = 16
+    for arg in sys.argv[1:]:
+        if arg.startswith("--count="):
+            num_ids = int(arg[len("--count="):])
+        elif arg.startswith("--max-nodes="):
+            max_nodes = int(arg[len("--max-nodes="):])
+        else:
+            print("usage: python partition_sim.py [--count=num_ids] [--max-nodes=n]")
+            sys.exit(1)
+
+    ids = [createObjId("chunks") for i in range(num_ids)]
+    print(f"{num_ids} chunk ids")
+    print("                last node           middle node")
+    print("nodes  ideal   consistent  modulo  consistent  modulo")
+    for node_count in range(1, max_nodes):
+        moved = {"consistent": 0, "modulo": 0, "consistent_middle": 0, "modulo_middle": 0}
+        middle = (node_count + 1) // 2
+        for id in ids:
+            if getObjPartition(id, node_count) != getObjPartition(id, node_count + 1):
+                moved["consistent"] += 1
+            if moduloPartition(id, node_count) != moduloPartition(id, node_count + 1):
+                moved["modulo"] += 1
+            if movedOnRemove(getObjPartition, id, node_count, middle):
+                moved["consistent_middle"] += 1
+            if movedOnRemove(moduloPartition, id, node_count, middle):
+                moved["modulo_middle"] += 1
+        ideal = 1.0 / (node_count + 1)
+        ratios = [moved[key] / num_ids for key in ("consistent", "modulo", "consistent_middle", "modulo_middle")]
+        print(f"{node_count:>2}<>{node_count+1:<2} {ideal:6.3f}  {ratios[0]:10.3f}  {ratios[1]:6.3f}  {ratios[2]:10.3f}  {ratios[3]:6.3f}")
+
+    start = time.time()
+    for id in ids:
+        getObjPartition(id, max_nodes)
+    elapsed = time.time() - start
+    print(f"getObjPartition with {max_nodes} nodes: {elapsed*1000000/num_ids:.2f} us per id")
+
+
+main()
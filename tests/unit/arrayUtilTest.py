@@ -16,6 +16,8 @@ import numpy as np
 import sys
 sys.path.append('../..')
 from hsds.util.arrayUtil import bytesArrayToList, toTuple, getNumElements, jsonToArray, arrayToBytes, bytesToArray, getByteArraySize
+from hsds.util.arrayUtil import arrayToJson, jsonTextToArray
+from hsds.util import arrayUtil
 from hsds.util import hdf5dtype
 from hsds.util.hdf5dtype import special_dtype
 from hsds.util.hdf5dtype import check_dtype
@@ -45,6 +47,33 @@ class ArrayUtilTest(unittest.TestCase):
             # will throw TypeError if not able to convert
             json.dumps(json_data)
 
+    def testArrayToJson(self):
+        def expected(arr):
+            return json.dumps(bytesArrayToList(arr.tolist()))
+
+        cases = []
+        cases.append(np.arange(100, dtype='i4'))
+        cases.append(np.arange(60, dtype='f8').reshape((12, 5)) / 7.0)
+        cases.append(np.array([np.nan, np.inf, -np.inf, 0.5]*5, dtype='f4'))
+        cases.append(np.ones((3, 4, 5), dtype=bool))
+        cases.append(np.zeros((0, 3), dtype='i2'))
+        cases.append(np.array(3.5))
+        cases.append(np.array([b'ab', b'cd']*10, dtype='S2'))
+        cases.append(np.zeros((20,), dtype=[('a', 'i4'), ('b', 'f8')]))
+        cases.append(np.zeros((20,), dtype=[('a', 'i4'), ('b', 'S3')]))
+        cases.append(np.zeros((20,), dtype=[('a', 'i4'), ('b', 'f4', (2,))]))
+
+        slab_size = arrayUtil.JSON_SLAB_SIZE
+        try:
+            for size in (slab_size, 7):
+                # small slab size to check joining of slabs
+                arrayUtil.JSON_SLAB_SIZE = size
+                for arr in cases:
+                    self.assertEqual(arrayToJson(arr), expected(arr))
+                self.assertEqual(arrayToJson(cases[1][0, 0]), expected(cases[1][0, 0]))
+        finally:
+            arrayUtil.JSON_SLAB_SIZE = slab_size
+
     def testToTuple(self):
         data0d = 42  # scalar
         data1d1 = [1]  # one dimensional, one element list
@@ -231,6 +260,47 @@ class ArrayUtilTest(unittest.TestCase):
         self.assertTrue(isinstance(e, tuple))
         self.assertEqual(e, (id0,id1,id2))
 
+    def testJsonTextToArray(self):
+        cases = []
+        cases.append(((4,), 'i4', [1, -2, 3, 4]))
+        cases.append(((2, 3), 'u1', [[0, 1, 2], [253, 254, 255]]))
+        cases.append(((2, 2, 2), 'i8', [[[1, 2], [3, 4]], [[5, 6], [7, -8]]]))
+        cases.append(((3,), 'u8', [0, 2**63, 5]))
+        for (shape, dt, data) in cases:
+            dt = np.dtype(dt)
+            for text in (json.dumps(data), json.dumps(data, indent=1)):
+                out = jsonTextToArray(text, shape, dt)
+                self.assertTrue(isinstance(out, np.ndarray))
+                self.assertEqual(out.shape, shape)
+                self.assertEqual(out.dtype, dt)
+                self.assertEqual(out.tolist(), data)
+                self.assertEqual(out.tobytes(), jsonToArray(shape, dt, data).tobytes())
+
+        # text that should be left to json.loads and jsonToArray
+        dt = np.dtype('i4')
+        for text in ('[1, 2]', '[1, 2, 3, 4]', '[[1, 2, 3]]', '[1, , 3]', '[1, 2, -]',
+                     '[1, 2, 3', '[1, 2, x]', '["1", 2, 3]', '[1.5, 2, 3]', '[1e3, 2, 3]',
+                     '[1-2, 3, 4]', '[true, 2, 3]', '[3000000000, 1, 2]'):
+            self.assertIsNone(jsonTextToArray(text, (3,), dt))
+        self.assertIsNone(jsonTextToArray('[-1, 0, 1]', (3,), np.dtype('u2')))
+        self.assertIsNone(jsonTextToArray('[256, 0, 1]', (3,), np.dtype('u1')))
+        self.assertIsNone(jsonTextToArray('[99999999999999999999, 0, 1]', (3,), np.dtype('i8')))
+        self.assertIsNone(jsonTextToArray('[1.5, 2, 3]', (3,), np.dtype('f4')))
+        self.assertIsNone(jsonTextToArray('[[1, 2], [3, 4]]', (2,), np.dtype([('a', 'i4'), ('b', 'i4')])))
+        self.assertIsNone(jsonTextToArray('[]', (0,), dt))
+
+        # whitespace inside a number, and leading zeros
+        for text in ('[1 2, 3]', '[12, 3 4]', '[- 1, 3]', '[1, 2\n3]', '[007, 3]', '[0, 01]', '[-01, 3]', '[-00, 3]'):
+            self.assertIsNone(jsonTextToArray(text, (2,), dt))
+            try:
+                json.loads(text)
+                self.assertTrue(False)
+            except ValueError:
+                pass  # rejected by json.loads too
+        for text in ('[ 0 , -0 ]', '[10, 100]', '[\n-10,\t0\r\n]'):
+            out = jsonTextToArray(text, (2,), dt)
+            self.assertEqual(out.tolist(), json.loads(text))
+
     def testToBytes(self):
         # Simple array
         dt = np.dtype("<i4")
@@ -0,0 +1,135 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import asyncio
+import functools
+import sys
+
+sys.path.append('../..')
+from hsds.util.chunkExecutor import ChunkExecutor
+
+
+class ChunkExecutorTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ChunkExecutorTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testLimits(self):
+        executor = ChunkExecutor(max_node_tasks=2, max_request_tasks=5)
+        in_flight = {}
+        max_in_flight = {}
+        done = []
+
+        async def job(node, i):
+            in_flight[node] = in_flight.get(node, 0) + 1
+            max_in_flight[node] = max(max_in_flight.get(node, 0), in_flight[node])
+            self.assertTrue(executor.activeCount <= 4)
+            await asyncio.sleep(0.001)
+            in_flight[node] -= 1
+            done.append(i)
+
+        async def run():
+            jobs = []
+            for i in range(20):
+                node = "dn" + str(i % 2)
+                jobs.append((node, functools.partial(job, node, i)))
+            await executor.run(jobs)
+
+        asyncio.run(run())
+        self.assertEqual(sorted(done), list(range(20)))
+        self.assertEqual(max_in_flight["dn0"], 2)
+        self.assertEqual(max_in_flight["dn1"], 2)
+        stats = executor.stats
+        self.assertEqual(stats["requests"], 0)
+        self.assertEqual(stats["active"], 0)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["job_count"], 20)
+        self.assertTrue(stats["wait_count"] > 0)
+        self.assertTrue(stats["max_wait_time"] >= stats["avg_wait_time"])
+
+        try:
+            ChunkExecutor(max_node_tasks=0)
+            self.assertTrue(False)
+        except ValueError:
+            pass  # expected
+
+    def testLazyJobs(self):
+        executor = ChunkExecutor(max_node_tasks=4, max_request_tasks=4)
+        pulled = []
+
+        async def job():
+            await asyncio.sleep(0)
+
+        def jobs():
+            for i in range(100):
+                pulled.append(i)
+                # never more than max_request_tasks jobs pulled ahead
+                self.assertTrue(len(pulled) - executor.stats["job_count"] <= 5)
+                yield ("dn0", job)
+
+        asyncio.run(executor.run(jobs()))
+        self.assertEqual(len(pulled), 100)
+
+        # no jobs
+        asyncio.run(executor.run([]))
+
+    def testFairness(self):
+        executor = ChunkExecutor(max_node_tasks=1, max_request_tasks=10)
+        order = []
+
+        async def job(name):
+            order.append(name)
+            await asyncio.sleep(0.001)
+
+        async def request(name, count, delay):
+            await asyncio.sleep(delay)
+            jobs = [("dn0", functools.partial(job, name)) for i in range(count)]
+            await executor.run(jobs, request_id=name)
+
+        async def run():
+            await asyncio.gather(request("big", 50, 0), request("small", 2, 0.003))
+
+        asyncio.run(run())
+        self.assertEqual(len(order), 52)
+        # small request is served round-robin with the big one rather than
+        # waiting for all of the big request's jobs
+        last_small = max(i for i in range(len(order)) if order[i] == "small")
+        self.assertTrue(last_small < 20)
+
+    def testException(self):
+        executor = ChunkExecutor(max_node_tasks=2, max_request_tasks=4)
+        done = []
+
+        async def job(i):
+            await asyncio.sleep(0.001)
+            if i == 3:
+                raise KeyError("bad job")
+            done.append(i)
+
+        async def run():
+            jobs = [("dn0", functools.partial(job, i)) for i in range(100)]
+            await executor.run(jobs)
+
+        try:
+            asyncio.run(run())
+            self.assertTrue(False)
+        except KeyError:
+            pass  # expected
+        self.assertTrue(len(done) < 100)
+        self.assertEqual(executor.activeCount, 0)
+        self.assertEqual(executor.queueDepth, 0)
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
@@ -0,0 +1,100 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import time
+import sys
+import numpy as np
+
+sys.path.append('../..')
+from hsds.util.chunkTableCache import ChunkTableCache
+
+TABLE_ID = "d-12345678-1234-1234-1234-1234567890ab"
+
+
+class ChunkTableCacheTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ChunkTableCacheTest, self).__init__(*args, **kwargs)
+        # main
+
+    def getTable(self, shape):
+        dt = np.dtype([("offset", "u8"), ("size", "u4")])
+        arr = np.zeros(shape, dtype=dt)
+        arr["offset"] = np.arange(arr.size).reshape(shape) * 1000
+        arr["size"] = 1000
+        return arr
+
+    def testGet(self):
+        cache = ChunkTableCache(ttl=10, mem_target=1000)
+        arr = self.getTable((4, 10))
+        cache.add(TABLE_ID, ((4, 8), (0, 10)), arr)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.memUsed, arr.nbytes)
+
+        indices = np.array([[4, 0], [7, 9], [5, 2]], dtype='i8')
+        values = cache.get(TABLE_ID, indices)
+        self.assertEqual(list(values["offset"]), [0, 39000, 12000])
+        self.assertEqual(list(values["size"]), [1000, 1000, 1000])
+
+        # outside the cached region
+        indices = np.array([[4, 0], [8, 0]], dtype='i8')
+        self.assertTrue(cache.get(TABLE_ID, indices) is None)
+        # some other table
+        indices = np.array([[4, 0]], dtype='i8')
+        self.assertTrue(cache.get("d-00000000-1234-1234-1234-1234567890ab", indices) is None)
+        stats = cache.stats
+        self.assertEqual(stats["hit_count"], 1)
+        self.assertEqual(stats["miss_count"], 2)
+
+        cache.invalidate(TABLE_ID)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.memUsed, 0)
+        self.assertTrue(cache.get(TABLE_ID, indices) is None)
+
+    def testEviction(self):
+        arr = self.getTable((10,))
+        cache = ChunkTableCache(ttl=10, mem_target=arr.nbytes * 2)
+        for i in range(3):
+            cache.add(TABLE_ID, ((i*10, (i+1)*10),), self.getTable((10,)))
+        self.assertEqual(len(cache), 2)
+        # first region was evicted
+        self.assertTrue(cache.get(TABLE_ID, np.array([[5]], dtype='i8')) is None)
+        self.assertTrue(cache.get(TABLE_ID, np.array([[25]], dtype='i8')) is not None)
+
+        # regions expire
+        cache = ChunkTableCache(ttl=0.01)
+        cache.add(TABLE_ID, ((0, 10),), arr)
+        time.sleep(0.02)
+        self.assertTrue(cache.get(TABLE_ID, np.array([[5]], dtype='i8')) is None)
+        self.assertEqual(len(cache), 0)
+
+        # nothing kept with ttl of 0
+        cache = ChunkTableCache(ttl=0)
+        cache.add(TABLE_ID, ((0, 10),), arr)
+        self.assertEqual(len(cache), 0)
+
+    def testGetTable(self):
+        arr = self.getTable((10,))
+        cache = ChunkTableCache(ttl=10)
+        self.assertTrue(cache.getTable(TABLE_ID) is None)
+        cache.add(TABLE_ID, None, arr)
+        self.assertTrue(cache.getTable(TABLE_ID) is arr)
+        # whole tables aren't used for region lookups
+        self.assertTrue(cache.get(TABLE_ID, np.array([[5]], dtype='i8')) is None)
+        cache.invalidate(TABLE_ID)
+        self.assertTrue(cache.getTable(TABLE_ID) is None)
+        self.assertEqual(cache.memUsed, 0)
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
@@ -18,6 +18,9 @@ sys.path.append('../..')
 from hsds.util.dsetUtil import getHyperslabSelection
 from hsds.util.chunkUtil import guessChunk, getNumChunks, getChunkIds, getChunkId, getPartitionKey, getChunkPartition
 from hsds.util.chunkUtil import getChunkIndex, getChunkSelection, getChunkCoverage, getDataCoverage, ChunkIterator
+from hsds.util.chunkUtil import getChunkIndices, iterChunkIds, getChunkIdForIndex
+from hsds.util.chunkUtil import getSelectionPoints, getStridedReadMode, getChunkRanges, getChunkByteRanges, getChunkTableRegion
+from hsds.util.chunkUtil import getChunkGrid, getChunkTableGrid, getChunkTableArray, getChunkTableItems, getChunkTableDict
 from hsds.util.chunkUtil import getChunkSize, shrinkChunk, expandChunk, getDatasetId, getContiguousLayout, _getEvalStr
 from hsds.util.chunkUtil import chunkReadSelection, chunkWriteSelection, chunkReadPoints, chunkWritePoints, chunkQuery
 
@@ -987,6 +990,221 @@ class ChunkUtilTest(unittest.TestCase):
         self.assertEqual(sel.stop, 10)
         self.assertEqual(sel.step, 1)
 
+    def testIterChunkIds(self):
+        dset_id = "d-12345678-1234-1234-1234-1234567890ab"
+        datashape = [100, 100, 20]
+        layout = (10, 25, 5)
+        for start, stop, step, count in (((0,0,0), (100,100,20), (1,1,1), 160),
+                                         ((5,12,3), (97,60,19), (3,7,2), 120),
+                                         ((1,0,0), (100,100,20), (33,30,6), 48)):
+            selection = getHyperslabSelection(datashape, start, stop, step)
+            it = iterChunkIds(dset_id, selection, layout)
+            self.assertFalse(isinstance(it, list))
+            chunk_ids = list(it)
+            self.assertEqual(len(chunk_ids), count)
+            self.assertEqual(len(set(chunk_ids)), len(chunk_ids))
+            indices = list(getChunkIndices(selection, layout))
+            self.assertEqual(len(indices), len(chunk_ids))
+            for i in range(len(chunk_ids)):
+                self.assertEqual(tuple(getChunkIndex(chunk_ids[i])), indices[i])
+            self.assertEqual(chunk_ids, getChunkIds(dset_id, selection, layout))
+
+        # strided selection only touches the chunks the points land in
+        selection = getHyperslabSelection([1000,], (5,), (1000,), (100,))
+        indices = list(getChunkIndices(selection, (10,)))
+        self.assertEqual(indices, [(i*10,) for i in range(10)])
+
+        # very large selection can be enumerated lazily
+        selection = getHyperslabSelection([10**9, 10**9])
+        it = getChunkIndices(selection, (10, 10))
+        self.assertEqual(next(it), (0, 0))
+        self.assertEqual(next(it), (0, 1))
+
+        # null selection
+        selection = (slice(5, 5, 1),)
+        self.assertEqual(list(iterChunkIds(dset_id, selection, (10,))), [])
+
+        try:
+            # invalid id is reported before any ids are generated
+            iterChunkIds("g-12345678-1234-1234-1234-1234567890ab", selection, (10,))
+            self.assertTrue(False)
+        except ValueError:
+            pass # expected
+
+    def testGetChunkIdForIndex(self):
+        dset_id = "d-12345678-1234-1234-1234-1234567890ab"
+        chunk_id = getChunkIdForIndex(dset_id, (2, 3))
+        self.assertEqual(chunk_id, getChunkId(dset_id, (23, 61), (10, 20)))
+        self.assertEqual(getChunkIndex(chunk_id), [2, 3])
+        chunk_id = getChunkIdForIndex(dset_id, np.array([7,], dtype='uint64'))
+        self.assertEqual(chunk_id, getChunkId(dset_id, 75, (10,)))
+
+    def testGetSelectionPoints(self):
+        selection = getHyperslabSelection([100,], (5,), (50,), (20,))
+        points = getSelectionPoints(selection)
+        self.assertEqual(points.shape, (3, 1))
+        self.assertEqual(points.dtype, np.dtype('uint64'))
+        self.assertEqual(list(points[:,0]), [5, 25, 45])
+
+        selection = getHyperslabSelection([100, 100], (0, 10), (30, 13), (10, 1))
+        points = getSelectionPoints(selection)
+        self.assertEqual(points.shape, (9, 2))
+        # row-major order
+        self.assertEqual(list(points[0]), [0, 10])
+        self.assertEqual(list(points[1]), [0, 11])
+        self.assertEqual(list(points[3]), [10, 10])
+        self.assertEqual(list(points[8]), [20, 12])
+
+    def testGetStridedReadMode(self):
+        # every 1000th row of a long time series, chunked by 100 rows
+        datashape = [1000000, 8]
+        layout = (100, 8)
+        selection = getHyperslabSelection(datashape, (0, 0), (1000000, 8), (1000, 1))
+        self.assertEqual(getNumChunks(selection, layout), 1000)
+        self.assertEqual(getStridedReadMode(selection, layout, 8, 4), "point")
+        # 8000 points with two uint64 coordinates and an 8 byte value each
+        self.assertEqual(getStridedReadMode(selection, layout, 8, 4, max_size=192001), "point")
+        self.assertEqual(getStridedReadMode(selection, layout, 8, 4, max_size=192000), "hyperslab")
+        # variable length types always use hyperslab reads
+        self.assertEqual(getStridedReadMode(selection, layout, 'H5T_VARIABLE', 4), "hyperslab")
+        # step smaller than the chunk extent
+        selection = getHyperslabSelection(datashape, (0, 0), (1000000, 8), (10, 1))
+        self.assertEqual(getStridedReadMode(selection, layout, 8, 4), "hyperslab")
+        # a few chunks with many points each
+        layout = (100, 100000)
+        selection = getHyperslabSelection([1000, 100000], (0, 0), (1000, 100000), (200, 1))
+        self.assertEqual(getStridedReadMode(selection, layout, 8, 4), "hyperslab")
+
+    def testGetChunkRanges(self):
+        items = [("c1", "bucket/a.h5", 1000, 100),
+                 ("c0", "bucket/a.h5", 900, 100),   # contiguous with c1
+                 ("c2", "bucket/a.h5", 1150, 100),  # 50 byte gap
+                 ("c3", "bucket/a.h5", 5000, 100),  # far away
+                 ("c4", "bucket/b.h5", 1250, 100),  # different file
+                 ("c5", "bucket/a.h5", 0, 0)]       # not allocated
+        ranges = getChunkRanges(items)
+        self.assertEqual(len(ranges), 4)
+        chunk_range = ranges[0]
+        self.assertEqual(chunk_range["s3path"], "bucket/a.h5")
+        self.assertEqual(chunk_range["s3offset"], 900)
+        self.assertEqual(chunk_range["s3size"], 200)
+        self.assertEqual(chunk_range["chunks"], [("c0", 0, 100), ("c1", 100, 100)])
+
+        ranges = getChunkRanges(items, max_gap=64)
+        self.assertEqual(len(ranges), 3)
+        chunk_range = ranges[0]
+        self.assertEqual(chunk_range["s3offset"], 900)
+        self.assertEqual(chunk_range["s3size"], 350)
+        self.assertEqual(chunk_range["chunks"][2], ("c2", 250, 100))
+        self.assertEqual(ranges[1]["chunks"], [("c3", 0, 100)])
+        self.assertEqual(ranges[2]["s3path"], "bucket/b.h5")
+
+        # range size limit
+        ranges = getChunkRanges(items, max_gap=64, max_size=200)
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0]["s3size"], 200)
+        self.assertEqual(ranges[1]["chunks"], [("c2", 0, 100)])
+
+        self.assertEqual(getChunkRanges([]), [])
+
+    def testGetChunkTableRegion(self):
+        table_dims = [100, 50]
+        table_layout = (10, 20)
+        indices = np.array([[12, 3], [15, 21]], dtype='i8')
+        # extended to chunk table chunks
+        region = getChunkTableRegion(indices, table_dims, table_layout, 16, 100000)
+        self.assertEqual(region, [(10, 20), (0, 40)])
+        # last chunk table chunk is clipped to the table extent
+        indices = np.array([[95, 45]], dtype='i8')
+        region = getChunkTableRegion(indices, table_dims, table_layout, 16, 100000)
+        self.assertEqual(region, [(90, 100), (40, 50)])
+        # just the bounding box
+        indices = np.array([[12, 3], [15, 21]], dtype='i8')
+        region = getChunkTableRegion(indices, table_dims, table_layout, 16, 4*19*16)
+        self.assertEqual(region, [(12, 16), (3, 22)])
+        # too large
+        self.assertTrue(getChunkTableRegion(indices, table_dims, table_layout, 16, 100) is None)
+
+    def testGetChunkTableArray(self):
+        chunk_grid = getChunkGrid([100, 95], [10, 10])
+        self.assertEqual(chunk_grid, [10, 10])
+        chunks = {"3_4": [4000, 100], "0_1": [1000, 100], "9_9": [9000, 50], "0_0": [0, 200]}
+        table_arr = getChunkTableArray(chunks, chunk_grid)
+        self.assertEqual(len(table_arr), 4)
+        self.assertEqual(table_arr.itemsize, 24)
+        self.assertEqual(list(table_arr["index"]), [0, 1, 34, 99])
+        self.assertEqual(list(table_arr["offset"]), [0, 1000, 4000, 9000])
+
+        chunk_indices = np.array([[3, 4], [0, 0], [5, 5], [9, 9], [0, 1]], dtype='i8')
+        offsets, sizes = getChunkTableItems(table_arr, chunk_indices, chunk_grid)
+        self.assertEqual(list(offsets), [4000, 0, 0, 9000, 1000])
+        self.assertEqual(list(sizes), [100, 200, 0, 50, 100])
+        # and back to the layout chunks dict
+        self.assertEqual(getChunkTableDict(table_arr, chunk_grid), chunks)
+
+        # empty table
+        table_arr = getChunkTableArray({}, chunk_grid)
+        offsets, sizes = getChunkTableItems(table_arr, chunk_indices, chunk_grid)
+        self.assertEqual(list(sizes), [0, 0, 0, 0, 0])
+        self.assertEqual(getChunkTableDict(table_arr, chunk_grid), {})
+
+    def testChunkTableResize(self):
+        # the table is indexed by the chunk grid when it was written
+        layout = {"class": "H5D_CHUNKED_REF", "dims": [10, 10]}
+        chunk_grid = getChunkTableGrid(layout, [100, 95])
+        self.assertEqual(chunk_grid, [10, 10])
+        chunks = {"3_4": [4000, 100], "0_1": [1000, 100], "9_9": [9000, 50], "1_0": [0, 200]}
+        table_arr = getChunkTableArray(chunks, chunk_grid)
+        layout["chunk_table_grid"] = chunk_grid
+        chunk_indices = np.array([[3, 4], [1, 0], [9, 9], [0, 1], [12, 3], [0, 10], [0, 11]], dtype='i8')
+
+        # grow the dataset
+        chunk_grid = getChunkTableGrid(layout, [150, 125])
+        self.assertEqual(chunk_grid, [10, 10])
+        offsets, sizes = getChunkTableItems(table_arr, chunk_indices, chunk_grid)
+        self.assertEqual(list(offsets), [4000, 0, 9000, 1000, 0, 0, 0])
+        self.assertEqual(list(sizes), [100, 200, 50, 100, 0, 0, 0])
+        self.assertEqual(getChunkTableDict(table_arr, chunk_grid), chunks)
+
+        # shrink the dataset
+        chunk_grid = getChunkTableGrid(layout, [20, 20])
+        offsets, sizes = getChunkTableItems(table_arr, chunk_indices[:4], chunk_grid)
+        self.assertEqual(list(sizes), [100, 200, 50, 100])
+        self.assertEqual(getChunkTableDict(table_arr, chunk_grid), chunks)
+
+    def testGetChunkByteRanges(self):
+        chunk_dims = (10, 20)
+        item_size = 4
+        # full chunk is one range
+        ranges = getChunkByteRanges(chunk_dims, item_size)
+        self.assertEqual(ranges, [(0, 800)])
+        # one row
+        ranges = getChunkByteRanges(chunk_dims, item_size, selection=(slice(2, 3, 1), slice(0, 20, 1)))
+        self.assertEqual(ranges, [(160, 80)])
+        # part of two rows, merged only if the gap is small enough
+        selection = (slice(2, 4, 1), slice(5, 10, 1))
+        ranges = getChunkByteRanges(chunk_dims, item_size, selection=selection)
+        self.assertEqual(ranges, [(180, 20), (260, 20)])
+        ranges = getChunkByteRanges(chunk_dims, item_size, selection=selection, max_gap=60)
+        self.assertEqual(ranges, [(180, 100)])
+        # strided selection - each run covers every selected element
+        selection = (slice(0, 10, 3), slice(1, 20, 5))
+        ranges = getChunkByteRanges(chunk_dims, item_size, selection=selection)
+        self.assertEqual(len(ranges), 4)
+        arr = np.arange(200, dtype='i4').reshape(chunk_dims)
+        data = arr.tobytes()
+        buffer = bytearray(len(data))
+        for offset, size in ranges:
+            buffer[offset:(offset+size)] = data[offset:(offset+size)]
+        read_arr = np.frombuffer(buffer, dtype='i4').reshape(chunk_dims)
+        self.assertTrue(np.array_equal(read_arr[selection], arr[selection]))
+        # points - given as dataset coordinates of the chunk at index (1, 2)
+        points = np.array([[13, 45], [10, 40], [13, 46]], dtype='uint64')
+        ranges = getChunkByteRanges(chunk_dims, item_size, points=points)
+        self.assertEqual(ranges, [(0, 4), (260, 8)])
+        # empty selection
+        self.assertEqual(getChunkByteRanges(chunk_dims, item_size, selection=(slice(2, 2, 1), slice(0, 20, 1))), [])
+
     def testGetChunkId(self):
         # getChunkIds(dset_id, selection, layout, dim=0, prefix=None, chunk_ids=None):
         dset_id = "d-12345678-1234-1234-1234-1234567890ab"
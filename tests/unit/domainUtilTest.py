@@ -17,6 +17,8 @@ import os
 sys.path.append('../..')
 from hsds.util.domainUtil import getParentDomain, isValidDomain, isValidHostDomain
 from hsds.util.domainUtil import getDomainForHost, isValidDomainPath, getBucketForDomain, getPathForDomain
+from hsds.util.domainUtil import isReadOnlyDomain
+from hsds import config
 
 class DomainUtilTest(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -117,6 +119,44 @@ class DomainUtilTest(unittest.TestCase):
         bucket = getBucketForDomain(domain)
         self.assertEqual(bucket, "mybucket")
 
+    def testIsReadOnlyDomain(self):
+        read_only_domains = ["/archive/", "mybucket/home/test_user1/myfile.h5", " /shared/data.h5"]
+        self.assertTrue(isReadOnlyDomain("/archive/climate.h5", read_only_domains))
+        self.assertTrue(isReadOnlyDomain("/archive/nex/climate.h5", read_only_domains))
+        self.assertTrue(isReadOnlyDomain("otherbucket/archive/climate.h5", read_only_domains))
+        self.assertTrue(isReadOnlyDomain("mybucket/home/test_user1/myfile.h5", read_only_domains))
+        self.assertTrue(isReadOnlyDomain("/shared/data.h5", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("/archived/climate.h5", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("/home/test_user1/myfile.h5", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("otherbucket/home/test_user1/myfile.h5", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("/shared/data.h5.bak", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("/archive/climate.h5", []))
+        self.assertFalse(isReadOnlyDomain("/archive/climate.h5", None))
+        self.assertFalse(isReadOnlyDomain(None, read_only_domains))
+        # comma-separated string from the config
+        read_only_domains = "/archive/, mybucket/home/test_user1/myfile.h5,"
+        self.assertTrue(isReadOnlyDomain("/archive/climate.h5", read_only_domains))
+        self.assertTrue(isReadOnlyDomain("mybucket/home/test_user1/myfile.h5", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("/home/test_user1/myfile.h5", read_only_domains))
+        self.assertFalse(isReadOnlyDomain("/archive/climate.h5", ""))
+
+    def testReadOnlyDomainsOverride(self):
+        # environment override of the read_only_domains config
+        saved_cfg = dict(config.cfg)
+        os.environ["READ_ONLY_DOMAINS"] = "/archive/,/shared/data.h5"
+        try:
+            config.cfg.clear()
+            read_only_domains = config.get("read_only_domains")
+            self.assertEqual(read_only_domains, "/archive/,/shared/data.h5")
+            self.assertTrue(isReadOnlyDomain("/archive/climate.h5", read_only_domains))
+            self.assertTrue(isReadOnlyDomain("/shared/data.h5", read_only_domains))
+            self.assertFalse(isReadOnlyDomain("/home/test_user1/myfile.h5", read_only_domains))
+            self.assertFalse(isReadOnlyDomain("/", read_only_domains))
+        finally:
+            del os.environ["READ_ONLY_DOMAINS"]
+            config.cfg.clear()
+            config.cfg.update(saved_cfg)
+
 
 if __name__ == '__main__':
     #setup test files
@@ -14,6 +14,7 @@ import sys
 
 sys.path.append('../..')
 from hsds.util.dsetUtil import  getHyperslabSelection, getSelectionShape, ItemIterator
+from hsds.util.dsetUtil import getFilters, getDeflateLevel, getShuffleSize
 
 class DsetUtilTest(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -123,6 +124,34 @@ class DsetUtilTest(unittest.TestCase):
                 break
         self.assertEqual(count, 20)
 
+    def testGetFilters(self):
+        dset_json = {"id": "d-12345678-1234-1234-1234-1234567890ab"}
+        self.assertEqual(getFilters(dset_json), [])
+        dset_json["creationProperties"] = {"fillValue": 42}
+        self.assertEqual(getFilters(dset_json), [])
+        self.assertEqual(getDeflateLevel(dset_json), None)
+        filters = [{"class": "H5Z_FILTER_SHUFFLE", "id": 2, "name": "shuffle"},
+                   {"class": "H5Z_FILTER_DEFLATE", "id": 1, "level": 9, "name": "deflate"}]
+        dset_json["creationProperties"]["filters"] = filters
+        self.assertEqual(getFilters(dset_json), filters)
+        self.assertEqual(getDeflateLevel(dset_json), 9)
+
+    def testGetShuffleSize(self):
+        dset_json = {"id": "d-12345678-1234-1234-1234-1234567890ab"}
+        dset_json["type"] = {"class": "H5T_INTEGER", "base": "H5T_STD_I32LE"}
+        self.assertEqual(getShuffleSize(dset_json), 0)
+        gzip_filter = {"class": "H5Z_FILTER_DEFLATE", "id": 1, "level": 9, "name": "deflate"}
+        dset_json["creationProperties"] = {"filters": [gzip_filter,]}
+        self.assertEqual(getShuffleSize(dset_json), 0)
+        shuffle_filter = {"class": "H5Z_FILTER_SHUFFLE", "id": 2, "name": "shuffle"}
+        dset_json["creationProperties"]["filters"] = [shuffle_filter, gzip_filter]
+        self.assertEqual(getShuffleSize(dset_json), 4)
+        dset_json["type"] = {"class": "H5T_FLOAT", "base": "H5T_IEEE_F64LE"}
+        self.assertEqual(getShuffleSize(dset_json), 8)
+        # variable length items aren't shuffled
+        dset_json["type"] = {"class": "H5T_VLEN", "base": {"class": "H5T_INTEGER", "base": "H5T_STD_I32LE"}}
+        self.assertEqual(getShuffleSize(dset_json), 0)
+
 
 if __name__ == '__main__':
     #setup test files
@@ -0,0 +1,65 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import sys
+import time
+
+sys.path.append('../..')
+from hsds.util.hotChunkTracker import HotChunkTracker
+
+CHUNK_ID = "c-12345678-1234-1234-1234-1234567890ab_0_0"
+OTHER_CHUNK_ID = "c-12345678-1234-1234-1234-1234567890ab_0_1"
+
+
+class HotChunkTrackerTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(HotChunkTrackerTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testRecord(self):
+        tracker = HotChunkTracker(100, window=0.05)  # 5 reads per window
+        for i in range(4):
+            self.assertFalse(tracker.record(CHUNK_ID))
+        self.assertTrue(tracker.record(CHUNK_ID))
+        self.assertTrue(tracker.isHot(CHUNK_ID))
+        self.assertFalse(tracker.record(OTHER_CHUNK_ID))
+        self.assertFalse(tracker.isHot(OTHER_CHUNK_ID))
+
+        # stays hot for the next window
+        time.sleep(0.06)
+        self.assertTrue(tracker.record(CHUNK_ID))
+        self.assertFalse(tracker.record(OTHER_CHUNK_ID))
+        stats = tracker.stats
+        self.assertEqual(stats["hot_count"], 1)
+        self.assertEqual(stats["hot_read_count"], 2)
+
+        # not after a window with few reads
+        time.sleep(0.06)
+        self.assertFalse(tracker.isHot(CHUNK_ID))
+
+        # or after an idle window
+        for i in range(5):
+            tracker.record(CHUNK_ID)
+        time.sleep(0.11)
+        self.assertFalse(tracker.record(CHUNK_ID))
+
+        try:
+            HotChunkTracker(0)
+            self.assertTrue(False)
+        except ValueError:
+            pass  # expected
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
@@ -0,0 +1,131 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import sys
+import asyncio
+import gzip
+import json
+import zlib
+import numpy as np
+
+sys.path.append('../..')
+from hsds.util.httpUtil import WIRE_ENCODING, compressWireBytes, getWireBody, acceptsWireEncoding, isEncodedRequest
+from hsds.util.httpUtil import getResponseEncoding, jsonResponse, scanJsonBody
+
+
+class MockRequest():
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class HttpUtilTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(HttpUtilTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testCompressWireBytes(self):
+        loop = asyncio.new_event_loop()
+        try:
+            # below wire_compress_min_size
+            data = bytes(100)
+            result, encoding = loop.run_until_complete(compressWireBytes(data))
+            self.assertEqual(encoding, None)
+            self.assertEqual(result, data)
+
+            data = np.arange(10000, dtype='i4').tobytes()
+            result, encoding = loop.run_until_complete(compressWireBytes(data))
+            self.assertEqual(encoding, WIRE_ENCODING)
+            self.assertTrue(len(result) < len(data))
+            self.assertEqual(zlib.decompress(result), data)
+
+            # not compressible
+            data = np.random.bytes(10000)
+            result, encoding = loop.run_until_complete(compressWireBytes(data))
+            self.assertEqual(encoding, None)
+            self.assertEqual(result, data)
+
+            data = bytes(10000)
+            result, headers = loop.run_until_complete(getWireBody(data))
+            self.assertEqual(headers, {"Content-Encoding": WIRE_ENCODING})
+            self.assertEqual(zlib.decompress(result), data)
+        finally:
+            loop.close()
+
+    def testWireEncodingHeaders(self):
+        self.assertTrue(acceptsWireEncoding(MockRequest({"Accept-Encoding": "gzip, deflate"})))
+        self.assertTrue(acceptsWireEncoding(MockRequest({"Accept-Encoding": "deflate;q=0.5"})))
+        self.assertFalse(acceptsWireEncoding(MockRequest({"Accept-Encoding": "gzip"})))
+        self.assertFalse(acceptsWireEncoding(MockRequest({})))
+        self.assertTrue(isEncodedRequest(MockRequest({"Content-Encoding": WIRE_ENCODING})))
+        self.assertFalse(isEncodedRequest(MockRequest({"Content-Encoding": "identity"})))
+        self.assertFalse(isEncodedRequest(MockRequest({})))
+
+    def testResponseEncoding(self):
+        request = MockRequest({"Accept-Encoding": "deflate, gzip"})
+        # below http_compress_min_size
+        self.assertEqual(getResponseEncoding(request, 100), None)
+        # gzip is preferred
+        self.assertEqual(getResponseEncoding(request, 10000), "gzip")
+        request = MockRequest({"Accept-Encoding": "deflate"})
+        self.assertEqual(getResponseEncoding(request, 10000), "deflate")
+        request = MockRequest({"Accept-Encoding": "br"})
+        self.assertEqual(getResponseEncoding(request, 10000), None)
+        self.assertEqual(getResponseEncoding(MockRequest({}), 10000), None)
+
+    def testJsonResponse(self):
+        data = {"value": list(range(1000))}
+        loop = asyncio.new_event_loop()
+        try:
+            resp = loop.run_until_complete(jsonResponse(MockRequest({"Accept-Encoding": "gzip"}), data))
+            self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+            self.assertEqual(json.loads(gzip.decompress(resp.body)), data)
+            resp = loop.run_until_complete(jsonResponse(MockRequest({"Accept-Encoding": "deflate"}), data, status=201))
+            self.assertEqual(resp.status, 201)
+            self.assertEqual(json.loads(zlib.decompress(resp.body)), data)
+            resp = loop.run_until_complete(jsonResponse(MockRequest({}), data))
+            self.assertTrue("Content-Encoding" not in resp.headers)
+            self.assertEqual(json.loads(resp.text), data)
+            # values already encoded as JSON text
+            resp = loop.run_until_complete(jsonResponse(MockRequest({}), {"hrefs": []}, encoded={"value": "[1, 2]"}))
+            self.assertEqual(json.loads(resp.text), {"value": [1, 2], "hrefs": []})
+            resp = loop.run_until_complete(jsonResponse(MockRequest({}), {}, encoded={"value": "3"}))
+            self.assertEqual(json.loads(resp.text), {"value": 3})
+        finally:
+            loop.close()
+
+
+    def testScanJsonBody(self):
+        raw_keys = ("value",)
+        text = ' {"value": [[1, 2], [3, 4]] , "start": [0, 0], "stop": [2, 2]} '
+        body, raw = scanJsonBody(text, raw_keys=raw_keys)
+        self.assertEqual(body, {"start": [0, 0], "stop": [2, 2]})
+        self.assertEqual(raw, {"value": "[[1, 2], [3, 4]]"})
+        body, raw = scanJsonBody('{"a": {"value": [1]}, "value": [2]}', raw_keys=raw_keys)
+        self.assertEqual(body, {"a": {"value": [1]}})
+        self.assertEqual(raw, {"value": "[2]"})
+        self.assertEqual(scanJsonBody('{}', raw_keys=raw_keys), ({}, {}))
+        self.assertEqual(scanJsonBody('{"value": [1]}'), ({"value": [1]}, {}))
+
+        # values that aren't arrays of non-strings are decoded
+        for text in ('{"value": 5}', '{"value": ["a]", "b"]}', '{"value": [[1], ["x"]]}',
+                     '{"value": [1, "]"], "x": null}', '{"value": [1], "value": 3}'):
+            self.assertEqual(scanJsonBody(text, raw_keys=raw_keys), (json.loads(text), {}))
+
+        for text in ('[1, 2]', '{"value": [1, 2]', '{"value": [1]]}', '{"value": [1, 2]} x', '{"value" [1]}', '{1: 2}'):
+            with self.assertRaises(ValueError):
+                scanJsonBody(text, raw_keys=raw_keys)
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
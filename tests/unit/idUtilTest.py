@@ -14,7 +14,8 @@ import sys
 
 sys.path.append('../..')
 from hsds.util.idUtil import getObjPartition, isValidUuid, validateUuid, createObjId, getCollectionForId
-from hsds.util.idUtil import isObjId, isS3ObjKey, getS3Key, getObjId, isSchema2Id, isRootObjId, getRootObjId
+from hsds.util.idUtil import isObjId, isS3ObjKey, getS3Key, getObjId, isSchema2Id, isRootObjId, getRootObjId, getChunkTableKey
+from hsds.util.idUtil import getPlacementBlock, getPlacementKey
 
 class IdUtilTest(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -96,6 +97,51 @@ class IdUtilTest(unittest.TestCase):
         self.assertTrue(node_number >= 0)
         self.assertTrue(node_number < node_count)
 
+        # objects are spread evenly, and adding a node only moves about
+        # 1/node_count of them, all to the new node
+        ids = [createObjId("chunks") for i in range(6000)]
+        counts = [0,] * node_count
+        moved = 0
+        for id in ids:
+            node_number = getObjPartition(id, node_count)
+            counts[node_number] += 1
+            new_number = getObjPartition(id, node_count + 1)
+            if new_number != node_number:
+                self.assertEqual(new_number, node_count)
+                moved += 1
+        for count in counts:
+            self.assertTrue(count > 300)
+            self.assertTrue(count < 700)
+        self.assertTrue(moved > 300)
+        self.assertTrue(moved < 700)
+        self.assertEqual(getObjPartition(ids[0], 1), 0)
+
+    def testGetPlacementKey(self):
+        self.assertEqual(getPlacementBlock(3, 4), [4, 4, 4])
+        self.assertEqual(getPlacementBlock(3, "16,1"), [16, 1, 1])
+        self.assertEqual(getPlacementBlock(1, "16,1"), [16,])
+        for block_config in (0, "4,0", ""):
+            try:
+                getPlacementBlock(2, block_config)
+                self.assertTrue(False)
+            except ValueError:
+                pass # expected
+
+        dset_id = createObjId("datasets")
+        chunk_id = 'c' + dset_id[1:] + "_5_9"
+        self.assertEqual(getPlacementKey(chunk_id), chunk_id)
+        self.assertEqual(getPlacementKey(chunk_id, 4), 'c' + dset_id[1:] + "_1_2")
+        self.assertEqual(getPlacementKey(chunk_id, "8,1"), 'c' + dset_id[1:] + "_0_9")
+        self.assertEqual(getPlacementKey(chunk_id, "1,1"), chunk_id)
+        # neighboring chunks share a key
+        self.assertEqual(getPlacementKey('c' + dset_id[1:] + "_4_8", 4), getPlacementKey(chunk_id, 4))
+        # partition prefix is kept
+        chunk_id = 'c42-' + dset_id[2:] + "_5_9"
+        self.assertEqual(getPlacementKey(chunk_id, 4), 'c42-' + dset_id[2:] + "_1_2")
+        # other ids are unchanged
+        self.assertEqual(getPlacementKey(dset_id, 4), dset_id)
+        self.assertEqual(getPlacementKey("mybucket/home/c_1", 4), "mybucket/home/c_1")
+
     def testGetCollection(self):
         group_id = "g-314d61b8-9954-11e6-a733-3c15c2da029e"
         dataset_id = "d-4c48f3ae-9954-11e6-a3cd-3c15c2da029e"
@@ -159,6 +205,18 @@ class IdUtilTest(unittest.TestCase):
             self.assertEqual(getObjId(s3key), oid)
             self.assertTrue(isS3ObjKey(s3key))
 
+        # binary chunk table is kept next to the dataset json
+        s3key = getChunkTableKey(dataset_id)
+        self.assertTrue(s3key.endswith("/.chunks.bin"))
+        self.assertEqual(s3key[:-len(".chunks.bin")], getS3Key(dataset_id)[:-len(".dataset.json")])
+        self.assertEqual(getObjId(s3key), dataset_id)
+        for oid in (group_id, chunk_id):
+            try:
+                getChunkTableKey(oid)
+                self.assertTrue(False)
+            except ValueError:
+                pass # expected
+
 
 if __name__ == '__main__':
     #setup test files
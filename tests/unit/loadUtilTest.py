@@ -0,0 +1,89 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import sys
+import time
+from aiohttp.web_exceptions import HTTPServiceUnavailable
+
+sys.path.append('../..')
+from hsds.util.loadUtil import LOAD_HEADER, formatLoad, parseLoad, recordStorageLatency
+from hsds.util.loadUtil import updateDataNodeLoad, getOverloadReason, checkDataNodeLoad
+
+DN_URL = "http://10.0.0.2:6101"
+
+
+class LoadUtilTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(LoadUtilTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testFormatLoad(self):
+        load = {"queue": 3, "dirty": 0.25, "latency": 0.0501}
+        text = formatLoad(load)
+        self.assertEqual(text, "queue=3; dirty=0.250; latency=0.050")
+        load = parseLoad(text)
+        self.assertEqual(load["queue"], 3)
+        self.assertEqual(load["dirty"], 0.25)
+        self.assertEqual(load["latency"], 0.05)
+        # unknown keys are ignored
+        self.assertEqual(parseLoad(text + "; other=1"), load)
+        for text in ("", "queue=3", "queue=x; dirty=0; latency=0", "queue; dirty=0; latency=0"):
+            self.assertEqual(parseLoad(text), None)
+
+    def testStorageLatency(self):
+        app = {}
+        recordStorageLatency(app, 1.0)
+        self.assertEqual(app["storage_latency"], 1.0)
+        for i in range(100):
+            recordStorageLatency(app, 0.1)
+        self.assertTrue(abs(app["storage_latency"] - 0.1) < 0.01)
+
+    def testOverload(self):
+        app = {"dn_load": {}, "req_count": {"dn_busy": 0}}
+        req = DN_URL + "/chunks/c-12345678-1234-1234-1234-1234567890ab_0_0"
+        # no report yet
+        self.assertEqual(getOverloadReason(app, DN_URL), None)
+
+        updateDataNodeLoad(app, req, {LOAD_HEADER: "queue=2; dirty=0.100; latency=0.052"})
+        self.assertTrue(DN_URL in app["dn_load"])
+        self.assertEqual(getOverloadReason(app, DN_URL), None)
+        checkDataNodeLoad(app, req)
+
+        updateDataNodeLoad(app, req, {LOAD_HEADER: "queue=20; dirty=0.100; latency=0.052"})
+        self.assertTrue(getOverloadReason(app, DN_URL) is not None)
+        updateDataNodeLoad(app, req, {LOAD_HEADER: "queue=2; dirty=0.950; latency=0.052"})
+        self.assertTrue(getOverloadReason(app, DN_URL) is not None)
+        try:
+            checkDataNodeLoad(app, req)
+            self.assertTrue(False)
+        except HTTPServiceUnavailable:
+            pass  # expected
+        self.assertEqual(app["req_count"]["dn_busy"], 1)
+
+        # other DNs aren't affected
+        self.assertEqual(getOverloadReason(app, "http://10.0.0.3:6101"), None)
+
+        # stale reports are dropped
+        report_time, load = app["dn_load"][DN_URL]
+        app["dn_load"][DN_URL] = (time.time() - 60, load)
+        self.assertEqual(getOverloadReason(app, DN_URL), None)
+        self.assertFalse(DN_URL in app["dn_load"])
+
+        # responses without a load header leave things as is
+        updateDataNodeLoad(app, req, {})
+        self.assertFalse(DN_URL in app["dn_load"])
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
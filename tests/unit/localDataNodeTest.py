@@ -0,0 +1,110 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+from aiohttp.web_exceptions import HTTPNotFound
+
+sys.path.append('../..')
+from hsds import config
+from hsds.util.lruCache import LruCache
+from hsds.chunk_sn import read_chunk_hyperslab, write_chunk_hyperslab
+
+BUCKET = "local_dn_test"
+DN_URL = "http://localhost:6101"
+DSET_ID = "d-12345678-1234-1234-1234-1234567890ab"
+CHUNK_ID = "c-12345678-1234-1234-1234-1234567890ab_0"
+DSET_JSON = {
+    "id": DSET_ID,
+    "type": {"class": "H5T_INTEGER", "base": "H5T_STD_I32LE"},
+    "shape": {"class": "H5S_SIMPLE", "dims": [10]},
+    "layout": {"class": "H5D_CHUNKED", "dims": [10]},
+    "creationProperties": {"fillValue": 42}
+}
+
+
+class LocalDataNodeTest(unittest.TestCase):
+    """ SN chunk reads and writes to a DN in the same process, as with the
+    standalone app """
+    def __init__(self, *args, **kwargs):
+        super(LocalDataNodeTest, self).__init__(*args, **kwargs)
+        # main
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.mkdir(os.path.join(self.tmp_dir.name, BUCKET))
+        os.environ["ROOT_DIR"] = self.tmp_dir.name
+        config.cfg.clear()
+
+    def tearDown(self):
+        del os.environ["ROOT_DIR"]
+        config.cfg.clear()
+        self.tmp_dir.cleanup()
+
+    def getApps(self):
+        dn_app = {"node_state": "READY", "node_number": 0, "node_count": 1}
+        dn_app["dn_urls"] = {0: DN_URL}
+        dn_app["req_count"] = {"GET": 0, "PUT": 0}
+        dn_app["bucket_name"] = BUCKET
+        dn_app["deleted_ids"] = set()
+        dn_app["meta_cache"] = LruCache(chunk_cache=False)
+        dn_app["meta_cache"][DSET_ID] = DSET_JSON
+        dn_app["chunk_cache"] = LruCache()
+        dn_app["pending_s3_read"] = {}
+        dn_app["dirty_ids"] = {}
+        dn_app["chunk_replicas"] = {}
+        sn_app = {"node_state": "READY", "dn_urls": {0: DN_URL}, "local_dn": dn_app}
+        return (sn_app, dn_app)
+
+    def testReadWrite(self):
+        sn_app, dn_app = self.getApps()
+        slices = (slice(2, 8, 1),)
+
+        async def run():
+            # chunk hasn't been written, so we get the fill value
+            arr = np.zeros((6,), dtype="i4")
+            await read_chunk_hyperslab(sn_app, CHUNK_ID, DSET_JSON, slices, arr, bucket=BUCKET)
+            self.assertEqual(arr.tolist(), [42]*6)
+            self.assertEqual(dn_app["req_count"]["GET"], 1)
+
+            await write_chunk_hyperslab(sn_app, CHUNK_ID, DSET_JSON, slices, None, np.arange(6, dtype="i4"), bucket=BUCKET)
+            self.assertEqual(dn_app["req_count"]["PUT"], 1)
+            self.assertTrue(CHUNK_ID in dn_app["dirty_ids"])
+
+            arr = np.zeros((10,), dtype="i4")
+            await read_chunk_hyperslab(sn_app, CHUNK_ID, DSET_JSON, (slice(0, 10, 1),), arr, bucket=BUCKET)
+            self.assertEqual(arr.tolist(), [42, 42, 0, 1, 2, 3, 4, 5, 42, 42])
+
+        asyncio.run(run())
+
+    def testMissingS3Path(self):
+        sn_app, dn_app = self.getApps()
+        chunk_map = {CHUNK_ID: {"s3path": f"{BUCKET}/missing.h5", "s3offset": 1024, "s3size": 40}}
+
+        async def run():
+            arr = np.zeros((10,), dtype="i4")
+            try:
+                await read_chunk_hyperslab(sn_app, CHUNK_ID, DSET_JSON, (slice(0, 10, 1),), arr, chunk_map=chunk_map, bucket=BUCKET)
+                self.assertTrue(False)
+            except HTTPNotFound:
+                pass  # expected, linked chunks should exist
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
@@ -0,0 +1,105 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+
+sys.path.append('../..')
+from hsds.util.sharedChunkCache import SharedChunkCache
+
+CHUNK_ID = "c-12345678-1234-1234-1234-1234567890ab_{}_0"
+
+
+class SharedChunkCacheTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(SharedChunkCacheTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testSharedCache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = SharedChunkCache(tmp_dir, mem_target=1024*1024)
+            other = SharedChunkCache(tmp_dir, mem_target=1024*1024)  # as in another process
+            chunk_id = CHUNK_ID.format(0)
+            self.assertFalse(chunk_id in cache)
+            arr = np.arange(100, dtype='i4').reshape((10, 10))
+            cache[chunk_id] = arr
+            # available in this process before it's written
+            self.assertTrue(chunk_id in cache)
+            self.assertTrue(np.array_equal(cache[chunk_id], arr))
+            cache.waitForWrites()
+            self.assertEqual(len(cache), 1)
+            self.assertTrue(chunk_id in other)
+            cached = other[chunk_id]
+            self.assertEqual(cached.shape, (10, 10))
+            self.assertEqual(cached.dtype, np.dtype('i4'))
+            self.assertTrue(np.array_equal(cached, arr))
+            # read-only view of the shared data
+            self.assertFalse(cached.flags.writeable)
+
+            # first writer wins
+            other[chunk_id] = np.zeros((10, 10), dtype='i4')
+            other.waitForWrites()
+            self.assertTrue(np.array_equal(cache[chunk_id], arr))
+            self.assertEqual(len(other), 1)
+            self.assertEqual(cache.memDirty, 0)
+            self.assertEqual(cache.dirtyCount, 0)
+
+            # variable length types aren't cached
+            vlen_id = CHUNK_ID.format(1)
+            cache[vlen_id] = np.array(["abc", "de"], dtype=object)
+            self.assertFalse(vlen_id in cache)
+            self.assertEqual(cache.memUsed, 528)  # 400 bytes + header
+
+            try:
+                cache["c-../secret"]
+                self.assertTrue(False)
+            except ValueError:
+                pass  # expected
+
+            cache.clearCache()
+            self.assertEqual(len(cache), 0)
+            # arrays already handed out stay valid
+            self.assertTrue(np.array_equal(cached, arr))
+            self.assertEqual(os.listdir(tmp_dir), [".lock"])
+
+    def testEviction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            arr = np.zeros((1000,), dtype='i8')  # 8000 bytes + header
+            cache = SharedChunkCache(tmp_dir, mem_target=4*8200)
+            other = SharedChunkCache(tmp_dir, mem_target=4*8200)
+            for i in range(5):
+                cache[CHUNK_ID.format(i)] = arr
+                cache.waitForWrites()
+                time.sleep(0.01)
+            self.assertEqual(len(cache), 4)
+            self.assertTrue(cache.memUsed <= cache.memTarget)
+            self.assertFalse(CHUNK_ID.format(0) in cache)
+            # reading chunk 1 makes chunk 2 the least recently used
+            self.assertTrue(CHUNK_ID.format(1) in other)
+            time.sleep(0.01)
+            other[CHUNK_ID.format(5)] = arr
+            other.waitForWrites()
+            # the running total is shared by both processes
+            self.assertEqual(other.memUsed, 4*8128)
+            self.assertTrue(CHUNK_ID.format(1) in cache)
+            self.assertFalse(CHUNK_ID.format(2) in cache)
+            self.assertTrue(CHUNK_ID.format(5) in cache)
+            self.assertEqual(len(cache), 4)
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()
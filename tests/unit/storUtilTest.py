@@ -12,16 +12,18 @@
 import asyncio
 import random
 import time
+import zlib
 import numpy as np
 from aiobotocore import get_session
 import unittest
 import sys
-from aiohttp.web_exceptions import HTTPNotFound
+from aiohttp.web_exceptions import HTTPNotFound, HTTPInternalServerError
 
 sys.path.append('../..')
 import hsds.config as config
 from hsds.util.storUtil import getStorJSONObj, putStorJSONObj, putStorBytes, getStorBytes, isStorObj
 from hsds.util.storUtil import getStorObjStats, getStorKeys, releaseStorageClient, getStorageDriverName
+from hsds.util.storUtil import encodeStorBytes, decodeStorBytes, isDeflated, splitS3Path
 
 
 class StorUtilTest(unittest.TestCase):
@@ -212,6 +214,46 @@ class StorUtilTest(unittest.TestCase):
 
 
 
+    def testEncodeStorBytes(self):
+        data = np.arange(1000, dtype='i4').tobytes()
+        self.assertEqual(encodeStorBytes(data), data)
+        zip_data = encodeStorBytes(data, deflate_level=6)
+        self.assertTrue(len(zip_data) < len(data))
+        self.assertEqual(zlib.decompress(zip_data), data)
+        self.assertEqual(decodeStorBytes(zip_data, deflate_level=6), data)
+        shuffled = encodeStorBytes(data, shuffle=4)
+        self.assertEqual(len(shuffled), len(data))
+        self.assertNotEqual(shuffled, data)
+        self.assertEqual(decodeStorBytes(shuffled, shuffle=4), data)
+        encoded = encodeStorBytes(data, shuffle=4, deflate_level=6)
+        self.assertEqual(decodeStorBytes(encoded, shuffle=4, deflate_level=6), data)
+
+    def testIsDeflated(self):
+        data = np.arange(1000, dtype='i4').tobytes()
+        self.assertFalse(isDeflated(data))
+        self.assertFalse(isDeflated(b''))
+        self.assertFalse(isDeflated(b'\x78'))
+        for level in (1, 6, 9):
+            self.assertTrue(isDeflated(encodeStorBytes(data, deflate_level=level)))
+        # uncompressed chunk that starts with a valid zlib header
+        arr = np.zeros((100,), dtype='<u2')
+        arr[0] = 0x9c78
+        chunk = arr.tobytes()
+        self.assertEqual(chunk[:2], b'\x78\x9c')
+        self.assertFalse(isDeflated(chunk))
+        arr[1:] = np.arange(99)
+        self.assertFalse(isDeflated(arr.tobytes()))
+
+    def testSplitS3Path(self):
+        self.assertEqual(splitS3Path("s3://mybucket/data/file.h5"), ("mybucket", "data/file.h5"))
+        self.assertEqual(splitS3Path("mybucket/file.h5"), ("mybucket", "file.h5"))
+        for s3path in ("s3://mybucket", "/file.h5", "s3:///file.h5"):
+            try:
+                splitS3Path(s3path)
+                self.assertTrue(False)
+            except HTTPInternalServerError:
+                pass  # expected
+
     def testStorUtil(self):
 
         cors_domain = config.get("cors_domain")
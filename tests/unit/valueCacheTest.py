@@ -0,0 +1,163 @@
+##############################################################################
+# Copyright by The HDF Group.                                                #
+# All rights reserved.                                                       #
+#                                                                            #
+# This file is part of HSDS (HDF5 Scalable Data Service), Libraries and      #
+# Utilities.  The full HSDS copyright notice, including                      #
+# terms governing use, modification, and redistribution, is contained in     #
+# the file COPYING, which can be found at the root of the source code        #
+# distribution tree.  If you do not have access to this file, you may        #
+# request a copy from help@hdfgroup.org.                                     #
+##############################################################################
+import unittest
+import asyncio
+import sys
+import numpy as np
+
+sys.path.append('../..')
+from hsds.util.valueCache import ValueCache
+
+DSET_ID = "d-12345678-1234-1234-1234-1234567890ab"
+
+
+class ValueCacheTest(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(ValueCacheTest, self).__init__(*args, **kwargs)
+        # main
+
+    def testSingleFlight(self):
+        cache = ValueCache(ttl=0)
+        reads = []
+
+        async def read():
+            reads.append(1)
+            await asyncio.sleep(0.01)
+            return np.arange(10)
+
+        async def run():
+            key = ("mybucket", ((0, 10, 1),))
+            results = await asyncio.gather(*[cache.get(DSET_ID, key, read) for i in range(5)])
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(len(reads), 1)
+        for arr in results:
+            self.assertEqual(list(arr), list(range(10)))
+        stats = cache.stats
+        self.assertEqual(stats["miss_count"], 1)
+        self.assertEqual(stats["coalesce_count"], 4)
+        self.assertEqual(stats["inflight_count"], 0)
+        # nothing kept with ttl of 0
+        self.assertEqual(len(cache), 0)
+
+    def testTtl(self):
+        cache = ValueCache(ttl=0.05, mem_target=1000)
+        reads = []
+
+        async def read():
+            reads.append(1)
+            return np.zeros((10,), dtype='i8')
+
+        async def run():
+            key = ("mybucket", ((0, 10, 1),))
+            await cache.get(DSET_ID, key, read)
+            await cache.get(DSET_ID, key, read)
+            self.assertEqual(len(reads), 1)
+            self.assertEqual(cache.stats["hit_count"], 1)
+            self.assertEqual(cache.memUsed, 80)
+            await asyncio.sleep(0.06)
+            await cache.get(DSET_ID, key, read)  # expired
+            self.assertEqual(len(reads), 2)
+
+            # different selection is a different key
+            await cache.get(DSET_ID, ("mybucket", ((0, 5, 1),)), read)
+            self.assertEqual(len(reads), 3)
+
+            # invalidate drops entries for the dataset
+            cache.invalidate(DSET_ID)
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(cache.memUsed, 0)
+            await cache.get(DSET_ID, key, read)
+            self.assertEqual(len(reads), 4)
+
+            # entries are evicted to stay under mem_target
+            for i in range(20):
+                await cache.get(DSET_ID, ("mybucket", ((i, i+10, 1),)), read)
+            self.assertTrue(cache.memUsed <= 1000)
+
+        asyncio.run(run())
+
+    def testInvalidateInFlight(self):
+        cache = ValueCache(ttl=10)
+        reads = []
+
+        async def read():
+            reads.append(1)
+            await asyncio.sleep(0.01)
+            return np.arange(10)
+
+        async def run():
+            key = ("mybucket", ((0, 10, 1),))
+            task = asyncio.ensure_future(cache.get(DSET_ID, key, read))
+            await asyncio.sleep(0)
+            # write while read is in flight - new reads don't join the old one
+            cache.invalidate(DSET_ID)
+            await cache.get(DSET_ID, key, read)
+            await task
+            self.assertEqual(len(reads), 2)
+            # and the stale result isn't cached
+            self.assertEqual(len(cache), 1)
+
+        asyncio.run(run())
+
+    def testInvalidateMany(self):
+        # invalidations don't leave state behind for each dataset
+        cache = ValueCache(ttl=10)
+
+        async def read():
+            await asyncio.sleep(0.001)
+            return np.arange(10)
+
+        async def run():
+            key = ("mybucket", ((0, 10, 1),))
+            for i in range(100):
+                dset_id = f"d-12345678-1234-1234-1234-{i:012d}"
+                cache.invalidate(dset_id)
+                await cache.get(dset_id, key, read)
+                cache.invalidate(dset_id)
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(cache._generation, {})
+
+            # the generation is kept while a stale read is in flight
+            task = asyncio.ensure_future(cache.get(DSET_ID, key, read))
+            await asyncio.sleep(0)
+            cache.invalidate(DSET_ID)
+            self.assertEqual(cache._generation, {DSET_ID: 1})
+            await task
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(cache._generation, {})
+
+        asyncio.run(run())
+
+    def testException(self):
+        cache = ValueCache(ttl=10)
+
+        async def read():
+            await asyncio.sleep(0.001)
+            raise KeyError("read failed")
+
+        async def run():
+            key = ("mybucket", ((0, 10, 1),))
+            results = await asyncio.gather(cache.get(DSET_ID, key, read),
+                cache.get(DSET_ID, key, read), return_exceptions=True)
+            for result in results:
+                self.assertTrue(isinstance(result, KeyError))
+            self.assertEqual(len(cache), 0)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    #setup test files
+
+    unittest.main()